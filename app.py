@@ -33,13 +33,12 @@ Edge Cases
 	x.	Prevent Duplicates:
 	•	x If I try to add a task with the same title as an existing one, I see a message indicating that duplicate tasks are not allowed.
 Stretch Goals
-	1.	Filter Tasks:
-	•	I can filter the task list to show only completed or pending tasks.
-	2.	Edit Tasks:
-	•	I can edit the title of an existing task.
+	x.	x Filter Tasks:
+	•	x I can filter the task list to show only completed or pending tasks.
+	x.	x Edit Tasks:
+	•	x I can edit the title of an existing task.
 """
 
-from PySide6.QtWidgets import QListWidgetItem
 
 """
 Acceptance Criteria (ACs)
@@ -83,74 +82,207 @@ Stretch Goals
 	•	I can edit the title of an existing task.
 """
 
-import json
+import itertools
 import logging
-from pathlib import Path
+import time
+from typing import TYPE_CHECKING
+
+# the startup report counts the imports below
+_IMPORTS_STARTED = time.perf_counter()
 
 from PySide6 import QtWidgets, QtCore, QtGui
-from PySide6.QtGui import QKeyEvent
 
+import instrumentation
+from instrumentation import timed
+from logging_config import INSTRUMENTATION_INTERVAL
+from search_index import TaskSearchIndex
 from task import Task
+from task_manager import TaskManager, TaskError, DuplicateTitleError, JSON_FILE_PATH, STORE_BACKEND
+import theme
+
+if TYPE_CHECKING:
+    from task_model import TaskListModel
+
+# task_model and task_delegate are imported by App.setup_task_lists, after the first paint
+_IMPORTS_FINISHED = time.perf_counter()
 
-# Paths
-CUR_DIR = Path(__file__).parent
-DATA_FILE_PATH = CUR_DIR / "data"
-JSON_FILE_PATH = DATA_FILE_PATH / "tasks.json"
+# Lists keep this many rows loaded past the last visible one
+PREFETCH_ROWS = 1000
+# Rows the lists lay out per step: row heights vary with the titles, and a list with many rows
+# loaded lays them out over several event loop steps instead of blocking a resize
+LAYOUT_BATCH_SIZE = 250
+
+# Search: milliseconds of typing pause before a query runs, tasks indexed per idle step
+SEARCH_DELAY_MS = 150
+INDEX_CHUNK_SIZE = 5000
+
+# Milliseconds without further writes to the tasks files before they are read again
+RELOAD_DELAY_MS = 300
+
+# Status filter choices
+STATUS_ALL = "All tasks"
+STATUS_PENDING = "Pending"
+STATUS_COMPLETED = "Completed"
 
 
 class App(QtWidgets.QWidget):
+    # emitted on the save thread with what other programs changed in the tasks files
+    external_changes_read = QtCore.Signal(object)
+
     def __init__(self):
         super().__init__()
+        self._mark_phase("application", _IMPORTS_FINISHED)
         self.completed_tasks = []
         self.pending_tasks = []
-        self.tasks = []
-        self.load_tasks(is_completed=True)
-        self.load_tasks(is_completed=False)
+        self.manager = None
+        self.is_started = False
+        self.is_closed = False
         self.setup_ui_2()
         self.setWindowTitle("Task manager")
+        # one stylesheet for the whole window, parsed once
+        self.setStyleSheet(theme.APP_STYLESHEET)
         self.setMinimumSize(QtCore.QSize(1080, 720))
         # self.setup_connections()
-        self.populate_tasks()
+
+        # the shell is shown first; tasks are loaded and the lists built by start_up(), which
+        # runs one step per event loop turn after the first paint
+        self._startup_steps = None
+        self.startup_timer = QtCore.QTimer(self)
+        self.startup_timer.setInterval(0)
+        self.startup_timer.timeout.connect(self._startup_step)
+        for widget in (self.btn_add_task, self.le_input_field, self.qframe_search):
+            widget.setEnabled(False)
+        self.text_header_pending.setText("Pending tasks (loading...)")
+        self.text_header_completed.setText("Completed Tasks (loading...)")
+
+        self.populate_timer = QtCore.QTimer(self)
+        self.populate_timer.setInterval(0)
+        self.populate_timer.timeout.connect(self._populate_step)
+
+        # the search index is built in idle steps after the lists are shown; stores that read
+        # tasks on demand (SQLite, mmap) wait for the first search, so startup reads only one page
+        self.search_index = TaskSearchIndex()
+        self._unindexed_tasks = None
+        self.index_timer = QtCore.QTimer(self)
+        self.index_timer.setInterval(0)
+        self.index_timer.timeout.connect(self._index_step)
+
+        if instrumentation.ENABLED and INSTRUMENTATION_INTERVAL > 0:
+            self.summary_timer = QtCore.QTimer(self)
+            self.summary_timer.setInterval(int(INSTRUMENTATION_INTERVAL * 1000))
+            self.summary_timer.timeout.connect(instrumentation.log_summary)
+            self.summary_timer.start()
+
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.apply_search)
+
+        # other programs writing the tasks files: read them again once the writes stop for a moment
+        self.file_watcher = QtCore.QFileSystemWatcher(self)
+        self.reload_timer = QtCore.QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(RELOAD_DELAY_MS)
+        self.reload_timer.timeout.connect(self._read_external_changes)
+        self.file_watcher.fileChanged.connect(lambda: self.reload_timer.start())
+        self.file_watcher.directoryChanged.connect(lambda: self.reload_timer.start())
+        self.external_changes_read.connect(self._apply_external_changes)
 
         # connect
         self.btn_add_task.clicked.connect(self.add_task)
         self.le_input_field.returnPressed.connect(self.add_task)
+        self.le_search_field.textChanged.connect(lambda: self.search_timer.start())
+        self.cb_status_filter.currentTextChanged.connect(self.apply_status_filter)
 
-        self.lw_pending.itemClicked.connect(self.set_focus_to_card)
-        self.lw_pending.installEventFilter(self)
-        self.lw_pending.setFocusPolicy(QtCore.Qt.FocusPolicy.ClickFocus)
-
-        self.lw_completed.itemClicked.connect(self.set_focus_to_card)
-        self.lw_completed.installEventFilter(self)
-        self.lw_completed.setFocusPolicy(QtCore.Qt.FocusPolicy.ClickFocus)
+        self._mark_phase("shell")
 
         # testing
 
-    def load_tasks(self, all_tasks: bool = True, is_completed: bool = False):
+    def start_up(self):
         """
-        Creates list of Task objects
-        Returns: list of task objects
-
+        Loads the tasks, builds the task lists and shows their first pages, one step per
+        event loop turn. Runs after the first paint of the window; call it to start without
+        showing the window.
         """
+        if self._startup_steps is None:
+            self._startup_steps = self._run_startup()
+            self.startup_timer.start()
+
+    def _run_startup(self):
         try:
-            with open(JSON_FILE_PATH, 'r') as json_file:
-                content = json.load(json_file)
-        except json.JSONDecodeError:
-            with open(JSON_FILE_PATH, 'w') as json_file:
-                json.dump([], json_file)
-            return []
-
-        if not is_completed:
-            self.pending_tasks = [Task.from_dict(item) for item in content if
-                                  Task.from_dict(item).is_completed is False]
-            print(f"uncompleted: {self.pending_tasks}")
-        if is_completed:
-            self.completed_tasks = [Task.from_dict(item) for item in content if
-                                    Task.from_dict(item).is_completed is True]
-            print(f"completed: {self.completed_tasks}")
-
-        self.tasks = self.pending_tasks + self.completed_tasks
-        print(f"all: {self.tasks}")
+            self.load_tasks()
+        except TaskError as error:
+            # e.g. the memory-mapped tasks file is open in another program
+            logging.error(error)
+            QtWidgets.QMessageBox.critical(self, "Task Manager", str(error))
+            # nothing was loaded, so there is nothing to save on close
+            self.manager = None
+            self.close()
+            return
+        self._mark_phase("load")
+        yield
+        self.setup_task_lists()
+        self._mark_phase("lists")
+        yield
+        self.populate_tasks()
+        self._mark_phase("populate")
+
+        self._unindexed_tasks = self._tasks_to_index()
+        if isinstance(self.pending_tasks, list):
+            self.index_timer.start()
+        for widget in (self.btn_add_task, self.le_input_field, self.qframe_search):
+            widget.setEnabled(True)
+        self._watch_task_files()
+        self.is_started = True
+        self._log_startup_report()
+
+    def _startup_step(self):
+        if next(self._startup_steps, StopIteration) is StopIteration:
+            self.startup_timer.stop()
+
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        super().paintEvent(event)
+        if self._startup_steps is None:
+            self._mark_phase("first paint")
+            self.start_up()
+
+    def _mark_phase(self, name: str, started: float = None):
+        """
+        Records the time since the previous startup phase ended
+        Args:
+            name: phase that just ended
+            started: when the phase started, for the first phase of the window
+
+        """
+        now = time.perf_counter()
+        if started is not None:
+            self._startup_phases = [("imports", _IMPORTS_FINISHED - _IMPORTS_STARTED)]
+            self._phase_ended = started
+        self._startup_phases.append((name, now - self._phase_ended))
+        self._phase_ended = now
+
+    def _log_startup_report(self):
+        # laid out like python -X importtime: one line per phase, cumulative from the first import
+        logging.info("Startup: self [ms] | cumulative [ms] | phase")
+        cumulative = 0.0
+        for name, seconds in self._startup_phases:
+            cumulative += seconds
+            logging.info("Startup: %9.1f | %15.1f | %s", seconds * 1000, cumulative * 1000, name)
+            if instrumentation.ENABLED:
+                instrumentation.histogram(f"startup.{name}").add(seconds)
+
+    @timed("app.load")
+    def load_tasks(self):
+        """
+        Creates the lists of pending and completed Task objects from the JSON file
+        Returns: (pending tasks, completed tasks)
+
+        """
+        if self.manager is None:
+            self.manager = TaskManager(JSON_FILE_PATH, STORE_BACKEND, background_saves=True)
+        self.pending_tasks, self.completed_tasks = self.manager.load()
+
+        return self.pending_tasks, self.completed_tasks
 
     def setup_ui_2(self):
         self.layout = QtWidgets.QVBoxLayout(self)
@@ -166,26 +298,12 @@ class App(QtWidgets.QWidget):
 
         # QLabel for title
         self.qlabel_title = QtWidgets.QLabel("Task Manager")
-        self.qlabel_title.setStyleSheet("""
-        QLabel {
-        font-size: 24px;
-        font-weight: 700;
-        color: #E0E0E0;
-        }
-        """)
+        self.qlabel_title.setObjectName("qlabel_title")
 
         # QPushButton to add task
         self.btn_add_task = QtWidgets.QPushButton("+")
         self.btn_add_task.setFixedSize(40, 40)
-        self.btn_add_task.setStyleSheet("""
-        QPushButton {
-        background-color: #BB86FC;
-        border-radius: 20px;
-        font-size: 24px;
-        text-align: center;
-        color: #E0E0E0 
-        }
-        """)
+        self.btn_add_task.setObjectName("btn_add_task")
 
         # add widgets to sub-layout
         self.layout_navigation_bar.addWidget(self.qlabel_title)
@@ -195,27 +313,35 @@ class App(QtWidgets.QWidget):
         self.le_input_field = QtWidgets.QLineEdit()
         self.le_input_field.setFixedHeight(40)
         self.le_input_field.setPlaceholderText("Enter new task...")
-        self.le_input_field.setStyleSheet("""
-        QLineEdit {
-        border-radius: 8px;
-        padding: 8px;
-        font-size: 16px;
-        font-weight 400;
-        color: #E0E0E0;
-        background-color: #1E1E1E
-        }
-        """)
+        self.le_input_field.setObjectName("le_input_field")
+
+        # ---------------------------SEARCH SECTION---------------------------#
+        self.qframe_search = QtWidgets.QFrame()
+
+        # horizontal layout
+        self.layout_search = QtWidgets.QHBoxLayout(self.qframe_search)
+        self.layout_search.setContentsMargins(0, 8, 0, 0)
+
+        # QLineEdit for search
+        self.le_search_field = QtWidgets.QLineEdit()
+        self.le_search_field.setFixedHeight(40)
+        self.le_search_field.setPlaceholderText("Search tasks...")
+        self.le_search_field.setClearButtonEnabled(True)
+        self.le_search_field.setObjectName("le_search_field")
+
+        # QComboBox to show pending tasks, completed tasks or both
+        self.cb_status_filter = QtWidgets.QComboBox()
+        self.cb_status_filter.setFixedHeight(40)
+        self.cb_status_filter.addItems([STATUS_ALL, STATUS_PENDING, STATUS_COMPLETED])
+        self.cb_status_filter.setObjectName("cb_status_filter")
+
+        # add widgets to sub-layout
+        self.layout_search.addWidget(self.le_search_field)
+        self.layout_search.addWidget(self.cb_status_filter)
 
         # ---------------------------TASK-HEADERS-SECTION---------------------------#
         self.qframe_list_headers = QtWidgets.QFrame()
-        self.qframe_list_headers.setStyleSheet("""
-        QFrame {
-        font-size: 18px;
-        font-weight: 700;
-        margin-top: 24px;
-        color: #E0E0E0 
-        }
-        """)
+        self.qframe_list_headers.setObjectName("qframe_list_headers")
 
         # horizontal layout
         self.layout_list_headers = QtWidgets.QHBoxLayout(self.qframe_list_headers)
@@ -238,305 +364,268 @@ class App(QtWidgets.QWidget):
         self.layout_list_widgets = QtWidgets.QHBoxLayout(self.qframe_list_widgets)
         self.layout_list_widgets.setContentsMargins(0, 0, 0, 0)
 
-        # QListWidget for pending tasks
-        self.lw_pending = QtWidgets.QListWidget()
-        self.lw_pending.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection)
-        self.lw_pending.setObjectName("lw_pending")
-        self.lw_pending.setStyleSheet("""
-        QListWidget {
-        background-color: #121212;
-        border: 0px solid;
-        }2
-        QListWidget::item {
-        margin-bottom: 10px;
-        }
-        QListWidget::item:selected {
-        #background-color: rgba(0, 0, 0, 0)
-        }
-        """)
-
-        # QListWidget for completed tasks
-        self.lw_completed = QtWidgets.QListWidget()
-        self.lw_completed.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection)
-        self.lw_completed.setObjectName("lw_completed")
-        self.lw_completed.setStyleSheet("""
-        QListWidget {
-        background-color: #121212;
-        border: 0px solid;
-        }
-        QListWidget::item:selected {
-        background-color: rgba(0, 0, 0, 0)
-        }
-        """)
-
-        # add widgets to sub-layout
-        self.layout_list_widgets.addWidget(self.lw_pending)
-        self.layout_list_widgets.addWidget(self.lw_completed)
+        # the list views are added by setup_task_lists once the window is shown
 
         # ---------------------------Add widgets to main-layout---------------------------
         self.layout.addWidget(self.qframe_navigation_bar)
         self.layout.addWidget(self.le_input_field)
+        self.layout.addWidget(self.qframe_search)
         self.layout.addWidget(self.qframe_list_headers)
         self.layout.addWidget(self.qframe_list_widgets)
 
-    def setup_task_card(self, title: str, is_completed: bool = False, selected: bool = False):
-        self.qframe_task_card = QtWidgets.QFrame()
-        # self.qframe_task_card.setFixedHeight(60)  # Need to expand according to size change. 100% of container
-        self.qframe_task_card.setContentsMargins(0, 0, 0, 0)
-        self.qframe_task_card.setStyleSheet("""
-        QFrame {
-        color: #E0E0E0;
-        border-radius: 12px;
-        background-color: #1E1E1E;
-        border: 2px solid #333333;
-        }
-        """)
-
-        if selected:
-            self.qframe_task_card.setStyleSheet("""
-            QFrame {
-            color: #E0E0E0;
-            border-radius: 12px;
-            background-color: #2A2A2A;
-            border: 2px solid #BB86FC;
-            }
-            """)
-
-        self.layout_task_card = QtWidgets.QHBoxLayout(self.qframe_task_card)
-
-        # QLabel card title
-        self.qlabel_task_card_title = QtWidgets.QLabel(title)
-        self.qlabel_task_card_title.setMaximumWidth(420)
-        self.qlabel_task_card_title.setWordWrap(True)
-        self.qlabel_task_card_title.setStyleSheet("""
-        QLabel {
-        font-size: 16px;
-        font-weight: 500;
-        border: 0px solid rgba(0, 0, 0, 0);
-        }
-        """)
-
-        # QPushButton mark as complete
-        self.btn_change_completion_status = QtWidgets.QPushButton("DONE" if is_completed is False else "UN-DONE")
-        self.btn_change_completion_status.setFixedSize(75, 30)
-        if is_completed is False:
-            self.btn_change_completion_status.setStyleSheet("""
-            QPushButton {
-            background-color: #4CAF50;
-            border: 1px solid #66BB6A;
-            border-radius: 15px;
-            color: #FFFFFF;
-            }
-            QPushButton::hover {
-            background-color: #388E3C;
-            }
-            """)
-
-        elif is_completed is True:
-            self.btn_change_completion_status.setStyleSheet("""
-            QPushButton {
-            background-color: rgba(0, 0, 0, 0);
-            border: 1px solid #66BB6A;
-            border-radius: 15px;
-            color: #4CAF50;
-            }
-            QPushButton::hover {
-            background-color: #2A2A2A;
-            }
-            """)
-        self.btn_change_completion_status.clicked.connect(self.change_completion_status)
-
-        # QPushButton edit task title
-        self.btn_edit_task = QtWidgets.QPushButton("EDIT")
-        self.btn_edit_task.setFixedSize(75, 30)
-        self.btn_edit_task.setStyleSheet("""
-        QPushButton {
-        background-color: #FFC107;
-        border: 1px solid #FFCA28;
-        border-radius: 15px;
-        color: #FFFFFF;
-        }
-        QPushButton::hover {
-        background-color: #FFB300;
-        }
-        """)
-
-        # QPushButton delete task
-        self.btn_delete_task = QtWidgets.QPushButton("DELETE")
-        self.btn_delete_task.setFixedSize(75, 30)
-        self.btn_delete_task.setStyleSheet("""
-        QPushButton {
-        background-color: #D32F2F;
-        border: 1px solid #FF5252;
-        border-radius: 15px;
-        color: #FFFFFF
-        }
-        QPushButton::hover {
-        background-color: #B71C1C;
-        }
-        """)
-
-        self.btn_delete_task.clicked.connect(self.delete_task)
+    def setup_task_lists(self):
+        """
+        Builds the two task list views. The model and delegate modules are imported here,
+        so the shell window is painted before they are loaded.
+        """
+        from task_delegate import TaskCardDelegate
+        from task_model import TaskListModel
+
+        # one delegate paints the task cards of both lists
+        self.task_card_delegate = TaskCardDelegate(self)
+
+        # QListView for pending tasks
+        self.model_pending = TaskListModel(parent=self)
+        self.lw_pending = self._setup_task_list_view(self.model_pending, "lw_pending")
+
+        # QListView for completed tasks
+        self.model_completed = TaskListModel(parent=self)
+        self.lw_completed = self._setup_task_list_view(self.model_completed, "lw_completed")
 
         # add widgets to sub-layout
-        self.layout_task_card.addWidget(self.qlabel_task_card_title)
-        self.layout_task_card.addWidget(self.btn_change_completion_status)
-        self.layout_task_card.addWidget(self.btn_edit_task)
-        self.layout_task_card.addWidget(self.btn_delete_task)
+        self.layout_list_widgets.addWidget(self.lw_pending)
+        self.layout_list_widgets.addWidget(self.lw_completed)
 
-        return self.qframe_task_card
+        # connect
+        self.lw_pending.selectionModel().selectionChanged.connect(self.set_focus_to_card)
+        self.lw_pending.installEventFilter(self)
+        self.lw_pending.setFocusPolicy(QtCore.Qt.FocusPolicy.ClickFocus)
 
-    def setup_connections(self):
-        self.btn_change_completion_status.clicked.connect(self.change_completion_status)
+        self.lw_completed.selectionModel().selectionChanged.connect(self.set_focus_to_card)
+        self.lw_completed.installEventFilter(self)
+        self.lw_completed.setFocusPolicy(QtCore.Qt.FocusPolicy.ClickFocus)
 
-        logging.info("Connections completed")
-        return True
+        self.task_card_delegate.button_clicked.connect(self._on_card_button_clicked)
+        self.model_pending.tasks_dropped.connect(lambda task_ids, row: self.drop_tasks(self.lw_pending, task_ids, row))
+        self.model_completed.tasks_dropped.connect(
+            lambda task_ids, row: self.drop_tasks(self.lw_completed, task_ids, row))
 
-    def populate_tasks(self):
-        for task in self.pending_tasks:
-            self._to_lw_item(task, self.lw_pending)
+        for list_view in (self.lw_pending, self.lw_completed):
+            list_view.verticalScrollBar().valueChanged.connect(self._schedule_population)
+            list_view.model().rowsInserted.connect(self._schedule_population)
+            list_view.model().rowsRemoved.connect(self._schedule_population)
+            list_view.model().modelReset.connect(self._schedule_population)
 
-        for task in self.completed_tasks:
-            self._to_lw_item(task, self.lw_completed)
+    def populate_tasks(self):
+        """
+        Shows the first page of each list now; the idle timer loads the following
+        pages in chunks as the lists are scrolled
+        """
+        self.model_pending.set_tasks(self.pending_tasks)
+        self.model_completed.set_tasks(self.completed_tasks)
+        self._populate_step()
+        self._schedule_population()
 
         # if not self.tasks:
         #     self._show_no_tasks(True)
 
-        logging.info("LIST WIDGET - Tasks populated")
+        logging.info("LIST VIEW - Tasks populated")
 
         return True
 
-    def set_focus_to_card(self, lw_item: QListWidgetItem):
-        # reset previous items selected
-        self.reset_focus_to_cards(lw_item.listWidget())
-
-        # for each item selected: change their appearance
-        for item in lw_item.listWidget().selectedItems():
-            item_data = item.data(QtCore.Qt.ItemDataRole.UserRole)
-            item.listWidget().setItemWidget(item, self.setup_task_card(item_data.title, item_data.is_completed, True))
-            print(item_data.title)
-
-    def reset_focus_to_cards(self, list_widget: QtWidgets.QListWidget):
-        for index in range(list_widget.count()):
-            item = list_widget.item(index)
-            item_class_object = item.data(QtCore.Qt.ItemDataRole.UserRole)
-            list_widget.setItemWidget(item,
-                                      self.setup_task_card(item_class_object.title, item_class_object.is_completed))
-
-    def change_completion_status(self):
-        # get which lw has focus
-        if self.lw_pending.hasFocus():
-            list_widget_a = self.lw_pending
-            list_widget_b = self.lw_completed
+    @timed("app.selection")
+    def set_focus_to_card(self, selected: QtCore.QItemSelection, deselected: QtCore.QItemSelection):
+        """
+        Changes the appearance of the cards whose selected state changed
+        Args:
+            selected: ranges of rows that became selected
+            deselected: ranges of rows that are no longer selected
+
+        """
+        for selection, is_selected in ((deselected, False), (selected, True)):
+            for selection_range in selection:
+                selection_range.model().set_selected_range(selection_range.top(), selection_range.bottom(),
+                                                           is_selected)
+
+    def reset_focus_to_cards(self, list_view: QtWidgets.QListView):
+        # deselected rows are reset through set_focus_to_card
+        list_view.selectionModel().clearSelection()
+
+    def change_completion_status(self, list_view: QtWidgets.QListView = None):
+        # get which list view has focus (or was clicked)
+        list_view = list_view or self._focused_list_view()
+        if list_view is self.lw_pending:
+            list_view_a = self.lw_pending
+            list_view_b = self.lw_completed
             change_completion_status_to = True
-        elif self.lw_completed.hasFocus():
-            list_widget_a = self.lw_completed
-            list_widget_b = self.lw_pending
+        elif list_view is self.lw_completed:
+            list_view_a = self.lw_completed
+            list_view_b = self.lw_pending
             change_completion_status_to = False
         else:
             logging.warning("Completion status change - failed")
             return False
 
-        lw_items = list_widget_a.selectedItems()
+        model_a: TaskListModel = list_view_a.model()
+        model_b: TaskListModel = list_view_b.model()
 
-        for item in lw_items:
-            class_item: Task = item.data(QtCore.Qt.ItemDataRole.UserRole)
+        rows = self._selected_rows(list_view_a)
 
-            # delete item from list A
-            row = list_widget_a.row(item)
-            list_widget_a.takeItem(row)
-            logging.info(f"Deleted item from {list_widget_a.objectName()}")
+        # delete items from list A, change their completion status, add them on top of list B
+        class_items = model_a.remove_rows(rows)
+        self.manager.move_tasks(class_items, change_completion_status_to)
+        model_b.insert_sorted(class_items)
+        logging.info("Moved %d tasks from %s to %s", len(class_items), list_view_a.objectName(), list_view_b.objectName())
 
-            # change completion status
-            logging.debug(f"class item is_completed: {class_item.is_completed}")
-            class_item.change_completion_status(change_completion_status_to)
-            logging.debug(f"class item is_completed: {class_item.is_completed}")
+        return True
 
-            # add item to list B
-            list_widget_b.insertItem(0, item)
-            logging.info(f"Added: {class_item.title} to {list_widget_b.objectName()}")
+    def drop_tasks(self, list_view: QtWidgets.QListView, task_ids: list[str], row: int):
+        """
+        Moves tasks dragged from either list above the task at a row of list_view, or to the
+        bottom of it. Each task gets one new position, so only the moved tasks are saved.
+        Args:
+            list_view: list the tasks were dropped on
+            task_ids: ids of the dragged tasks
+            row: row they were dropped above; the row count for below the last row
 
-            # apply card to lw_item
-            list_widget_b.setItemWidget(item, self.setup_task_card(class_item.title, class_item.is_completed))
+        """
+        model: TaskListModel = list_view.model()
+        dragged = set(task_ids)
+        # the dragged tasks leave their rows: the tasks go above the first task below the drop that stays
+        while True:
+            while row < model.rowCount() and model.task(row).id in dragged:
+                row += 1
+            if row < model.rowCount() or not model.canFetchMore():
+                break
+            model.fetchMore()
+        before = model.task(row) if row < model.rowCount() else None
+
+        tasks = []
+        for source_model in (self.model_pending, self.model_completed):
+            tasks += source_model.remove_rows(source_model.rows_of_ids(dragged))
+        if not tasks:
+            return False
+        self.manager.reorder(tasks, list_view is self.lw_completed, before)
+        model.insert_sorted(tasks)
+        logging.info("Dropped %d tasks on %s", len(tasks), list_view.objectName())
 
-        self.save_tasks()
         return True
 
     def add_task(self):
-        task = Task(self.le_input_field.text())
-        task_titles = [task.title for task in self.tasks]
-        if task.title in task_titles:
-            logging.warning("Cannot have two tasks with the same title.")
-            # come back: error
-            self._show_le_error(True, "Cannot have two tasks with the same title")
-            self.le_input_field.setText("")
-            return False
-        if not task.check_task_title_length():
-            logging.warning("Task title must not be empty")
-            # come back: error
-            self._show_le_error(True, "Task title must not be empty")
+        try:
+            task = self.manager.add(self.le_input_field.text())
+        except TaskError as error:
+            logging.warning(error)
+            self._show_le_error(True, str(error))
+            if isinstance(error, DuplicateTitleError):
+                self.le_input_field.setText("")
             return False
 
         self._show_le_error(False)
 
-        self.tasks.append(task)
-
-        lw_task = self._to_lw_item(task, self.lw_pending)
-        self.lw_pending.addItem(lw_task)
-        self.lw_pending.setItemWidget(lw_task, self.setup_task_card(task.title, task.is_completed))
+        self.search_index.add(task.id, task.title)
+        self.model_pending.append_task(task)
+        self._refresh_search()
 
         # self._show_no_tasks(False)
         self.le_input_field.setText("")
-        self.save_tasks()
-
-        logging.info("Added task")
 
         return True
 
-    def delete_task(self):
-        print("deelete task function")
-        if self.lw_pending.hasFocus():
-            list_widget = self.lw_pending
-            class_object_list = [task.data(QtCore.Qt.UserRole) for task in list_widget.selectedItems()]
-        elif self.lw_completed.hasFocus():
-            list_widget = self.lw_completed
-            class_object_list = [task.data(QtCore.Qt.UserRole) for task in list_widget.selectedItems()]
-        else:
+    def delete_task(self, list_view: QtWidgets.QListView = None):
+        logging.debug("Delete task - key or button")
+        list_view = list_view or self._focused_list_view()
+        if list_view is None:
             return False
 
-        list_widget_item_list = list_widget.selectedItems()
-
-        # remove task from app tasks list
-        for class_object in class_object_list:
-            print(class_object.title)
-            self.tasks.remove(class_object)
-            logging.info(f"Removed {class_object.title} - self.tasks")
+        model: TaskListModel = list_view.model()
+        rows = self._selected_rows(list_view)
 
-        # remove task from list widget
-        for list_widget_item in list_widget_item_list:
-            row = list_widget.row(list_widget_item)
-            list_widget.takeItem(row)
-            logging.info(f"Removed {list_widget_item.text()} - list widget")
-
-        self.save_tasks()
-        logging.info("Deleted task")
+        # remove tasks from the list view, then from the store
+        class_objects = model.remove_rows(rows)
+        self.manager.delete_tasks(class_objects)
+        for class_object in class_objects:
+            self.search_index.remove(class_object.id, class_object.title)
+        logging.info("Removed %d tasks - list view and store", len(class_objects))
 
         # if not self.tasks:
         #     self._show_no_tasks(True)
 
         return True
 
-    def save_tasks(self):
-        # take tasks attribute info | convert to dict | overwrite json file
-        task_dict_list = [Task.to_dict(task_object) for task_object in self.tasks]
+    def edit_task(self, list_view: QtWidgets.QListView = None):
+        list_view = list_view or self._focused_list_view()
+        if list_view is None:
+            return False
+
+        selected_rows = list_view.selectionModel().selectedRows()
+        if len(selected_rows) != 1:
+            logging.warning("Select exactly one task to edit")
+            return False
 
-        with open(JSON_FILE_PATH, 'w') as json_file:
-            json.dump(task_dict_list, json_file, indent=4)
-            logging.info("JSON - Tasks saved")
+        row = selected_rows[0].row()
+        task = list_view.model().task(row)
+        new_title, accepted = QtWidgets.QInputDialog.getText(self, "Edit task", "Task title:", text=task.title)
+        if not accepted:
+            return False
+
+        old_title = task.title
+        try:
+            self.manager.rename(task, new_title)
+        except TaskError as error:
+            logging.warning(error)
+            self._show_le_error(True, str(error))
+            return False
+
+        self._show_le_error(False)
+        self.search_index.rename(task.id, old_title, task.title)
+        list_view.model().update_task(row)
+        self._refresh_search()
+        logging.info("Edited task")
 
         return True
 
-    def eventFilter(self, watched, event: QKeyEvent):
+    def apply_search(self):
+        """
+        Filters both lists to the tasks matching the search bar, or shows every task again
+        when it is empty. Waits for the search index if it is still being built.
+        """
+        query = self.le_search_field.text().strip()
+        if query and self._unindexed_tasks is not None:
+            # _index_step searches once the index is complete
+            self.index_timer.start()
+            self._update_list_headers()
+            return False
+
+        task_ids = self.search_index.search(query) if query else None
+        self.model_pending.set_filter(task_ids)
+        self.model_completed.set_filter(task_ids)
+        self._populate_step()
+        logging.info("Search - %s tasks match", len(task_ids) if task_ids is not None else "all")
+
+        return True
+
+    def apply_status_filter(self, status: str):
+        show_pending = status in (STATUS_ALL, STATUS_PENDING)
+        show_completed = status in (STATUS_ALL, STATUS_COMPLETED)
+        self.text_header_pending.setVisible(show_pending)
+        self.lw_pending.setVisible(show_pending)
+        self.text_header_completed.setVisible(show_completed)
+        self.lw_completed.setVisible(show_completed)
+
+    def closeEvent(self, event: QtGui.QCloseEvent):
+        self.startup_timer.stop()
+        # the files are still written after this (the manager saves on close): stop watching them
+        self.file_watcher.blockSignals(True)
+        self.reload_timer.stop()
+        self.is_closed = True
+        if self.manager is not None:
+            self.manager.close()
+        instrumentation.log_summary()
+        super().closeEvent(event)
+
+    @timed("app.event_filter")
+    def eventFilter(self, watched, event: QtGui.QKeyEvent):
         """
         Change keybindings in-app
         Args:
@@ -547,7 +636,7 @@ class App(QtWidgets.QWidget):
 
         """
         if watched in [self.lw_pending, self.lw_completed]:
-            watched: QtWidgets.QListWidget
+            watched: QtWidgets.QListView
             if event.type() == QtCore.QEvent.KeyPress:
                 if event.key() == QtCore.Qt.Key_Backspace:
                     self.delete_task()
@@ -556,7 +645,7 @@ class App(QtWidgets.QWidget):
                 #     self.change_completion_status()
                 #     return True
             if event.type() == QtCore.QEvent.Type.FocusOut:
-                print('focus out')
+                logging.debug("Focus out - %s", watched.objectName())
                 self.reset_focus_to_cards(watched)
                 watched.clearFocus()
                 return True
@@ -566,67 +655,211 @@ class App(QtWidgets.QWidget):
     def _show_le_error(self, show: bool, error_reason: str = ""):
         if show:
             self.le_input_field.setPlaceholderText(error_reason)
-            self.le_input_field.setStyleSheet("""
-                QLineEdit {
-                border-radius: 8px;
-                padding: 8px;
-                font-size: 16px;
-                font-weight 400;
-                color: #757575;
-                background-color: #1E1E1E;
-                border: 1px solid #FF5252;
-                }
-                """)
         if not show:
             self.le_input_field.setPlaceholderText("Enter the task name here")
-            self.le_input_field.setStyleSheet("""
-                QLineEdit {
-                border-radius: 8px;
-                padding: 8px;
-                font-size: 16px;
-                font-weight 400;
-                color: #E0E0E0;
-                background-color: #1E1E1E
-                }
-                """)
+        theme.set_style_state(self.le_input_field, "error", show)
+
+    def _setup_task_list_view(self, model: "TaskListModel", object_name: str) -> QtWidgets.QListView:
+        list_view = QtWidgets.QListView()
+        list_view.setModel(model)
+        list_view.setItemDelegate(self.task_card_delegate)
+        list_view.setLayoutMode(QtWidgets.QListView.LayoutMode.Batched)
+        list_view.setBatchSize(LAYOUT_BATCH_SIZE)
+        list_view.setMouseTracking(True)
+        list_view.setResizeMode(QtWidgets.QListView.ResizeMode.Adjust)
+        list_view.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        list_view.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection)
+        if self.manager.can_reorder:
+            # cards are dragged within and between the lists; TaskListModel.tasks_dropped moves them
+            list_view.setDragDropMode(QtWidgets.QAbstractItemView.DragDropMode.DragDrop)
+            list_view.setDefaultDropAction(QtCore.Qt.DropAction.MoveAction)
+            list_view.setDropIndicatorShown(True)
+        list_view.setObjectName(object_name)
+        return list_view
+
+    @staticmethod
+    def _selected_rows(list_view: QtWidgets.QListView) -> list[int]:
+        # read the selection ranges directly: selectedRows() is quadratic in the number of ranges
+        return [row for selection_range in list_view.selectionModel().selection()
+                for row in range(selection_range.top(), selection_range.bottom() + 1)]
+
+    def _refresh_search(self):
+        # a new or renamed task may start or stop matching the search
+        if self.le_search_field.text().strip():
+            self.search_timer.start()
+
+    def _tasks_to_index(self):
+        # a copy of the lists, taken at the first step: tasks added, moved or deleted while the
+        # chunks are indexed would shift the lists under them and some tasks would be skipped
+        yield from list(self.manager.tasks())
+
+    def _index_step(self):
+        tasks = list(itertools.islice(self._unindexed_tasks, INDEX_CHUNK_SIZE))
+        if tasks:
+            self.search_index.add_tasks(tasks)
+            return
+
+        self.index_timer.stop()
+        self._unindexed_tasks = None
+        logging.info("Search - Indexed %d words", len(self.search_index))
+        if self.le_search_field.text().strip():
+            self.apply_search()
+
+    def _watch_task_files(self):
+        # a file replaced by a rename is no longer watched: watch it again (and its
+        # directory, to see files created after startup)
+        paths = {str(path) for path in self.manager.watch_paths if path.exists()}
+        paths.update(str(path.parent) for path in self.manager.watch_paths)
+        paths.difference_update(self.file_watcher.files())
+        paths.difference_update(self.file_watcher.directories())
+        if paths:
+            self.file_watcher.addPaths(sorted(paths))
+
+    def _read_external_changes(self):
+        self._watch_task_files()
+        # the store checks sizes and modification times first, so this app's own saves are not read back
+        self.manager.read_changes(self.external_changes_read.emit)
+
+    @timed("app.external_changes")
+    def _apply_external_changes(self, changes):
+        """
+        Shows what another program changed in the tasks files without rebuilding the lists:
+        removed, moved and reordered tasks leave their list, then moved, reordered and added
+        tasks are inserted where their positions sort them. Runs on the GUI thread.
+        Args:
+            changes: TaskChanges from the store, or None if the files did not change
 
-    def _to_lw_item(self, task: Task, task_list: QtWidgets.QListWidget) -> QtWidgets.QListWidgetItem:
-        lw_item = QtWidgets.QListWidgetItem()
-        lw_item.setData(QtCore.Qt.UserRole, task)
-        task_list.addItem(lw_item)
+        """
+        if changes is None or self.is_closed:
+            return
+        if not self.manager.apply_changes(changes):
+            # tasks were changed here while the files were read
+            self.reload_timer.start()
+            return
+        if not changes:
+            return
+
+        moved_pending = [task for task in changes.moved if not task.is_completed]
+        moved_completed = [task for task in changes.moved if task.is_completed]
+        added_pending = [task for task in changes.added if not task.is_completed]
+        added_completed = [task for task in changes.added if task.is_completed]
+        renamed = {task for task, _, _ in changes.renamed}
+        moved = set(changes.moved)
+        reordered_pending = [task for task, _, _ in changes.reordered if task not in moved and not task.is_completed]
+        reordered_completed = [task for task, _, _ in changes.reordered if task not in moved and task.is_completed]
+
+        if not self.model_pending.is_filtered():
+            # moved tasks are already in their new list: they left the other one
+            for model, removed, moved_in, moved_out, reordered, added in (
+                    (self.model_pending, [task for task in changes.removed if not task.is_completed],
+                     moved_pending, moved_completed, reordered_pending, added_pending),
+                    (self.model_completed, [task for task in changes.removed if task.is_completed],
+                     moved_completed, moved_pending, reordered_completed, added_completed)):
+                model.remove_tasks(set(removed) | set(moved_out) | set(reordered))
+                model.insert_sorted(moved_in + reordered + added)
+                for row in model.rows_of(renamed):
+                    model.update_task(row)
+
+        for task in changes.removed:
+            self.search_index.remove(task.id, task.title)
+        for task, old_title, title in changes.renamed:
+            self.search_index.rename(task.id, old_title, title)
+        self.search_index.add_tasks(changes.added)
+
+        if self.model_pending.is_filtered():
+            # the changed tasks may start or stop matching: run the search again
+            self.apply_search()
+        self._update_list_headers()
+        logging.info("External change - %d added, %d removed, %d moved, %d renamed, %d reordered", len(changes.added),
+                     len(changes.removed), len(changes.moved), len(changes.renamed), len(changes.reordered))
+
+    def _schedule_population(self):
+        if not self.populate_timer.isActive():
+            self.populate_timer.start()
+
+    @timed("app.populate")
+    def _populate_step(self):
+        """
+        Loads one more page into each list that has fewer than PREFETCH_ROWS rows loaded
+        past its last visible row. Stops the idle timer once both lists are far enough ahead.
+        """
+        needs_more = False
+        for list_view in (self.lw_pending, self.lw_completed):
+            model: TaskListModel = list_view.model()
+            target_rows = self._last_visible_row(list_view) + PREFETCH_ROWS
+            if model.canFetchMore() and model.rowCount() < target_rows:
+                model.fetchMore()
+            needs_more = needs_more or (model.canFetchMore() and model.rowCount() < target_rows)
+
+        self._update_list_headers()
+        if not needs_more:
+            self.populate_timer.stop()
+
+    @staticmethod
+    def _last_visible_row(list_view: QtWidgets.QListView) -> int:
+        # the lists scroll per item, so the scroll bar value is the first visible row, and no row is
+        # lower than a card; indexAt would find nothing while a batched layout is still running
+        from task_delegate import CARD_SIZE
+
+        return list_view.verticalScrollBar().value() + list_view.viewport().height() // CARD_SIZE.height()
+
+    def _update_list_headers(self):
+        # shows how much of each list is loaded while more rows are waiting
+        waiting_for_index = bool(self.le_search_field.text().strip()) and self._unindexed_tasks is not None
+        for label, title, model in ((self.text_header_pending, "Pending tasks", self.model_pending),
+                                    (self.text_header_completed, "Completed Tasks", self.model_completed)):
+            if waiting_for_index:
+                label.setText(f"{title} (indexing...)")
+            elif model.is_filtered() and model.canFetchMore():
+                label.setText(f"{title} ({model.rowCount():,} found, searching...)")
+            elif model.is_filtered():
+                label.setText(f"{title} ({model.rowCount():,} found)")
+            elif model.canFetchMore():
+                label.setText(f"{title} ({model.rowCount():,} of {model.total_count():,} loaded)")
+            else:
+                label.setText(title)
+
+    def _list_view_for_model(self, model: QtCore.QAbstractItemModel) -> QtWidgets.QListView:
+        return self.lw_pending if model is self.model_pending else self.lw_completed
+
+    def _focused_list_view(self):
+        if self.lw_pending.hasFocus():
+            return self.lw_pending
+        if self.lw_completed.hasFocus():
+            return self.lw_completed
+        return None
+
+    def _on_card_button_clicked(self, index: QtCore.QPersistentModelIndex, action: str):
+        """
+        Runs the action of a DONE/EDIT/DELETE area clicked on a card
+        Args:
+            index: row of the card that was clicked
+            action: which button area was clicked
 
-        task_card = self.setup_task_card(task.title, task.is_completed)
-        task_list.setItemWidget(lw_item, task_card)
+        """
+        if not index.isValid():
+            return
 
-        lw_item.setSizeHint(QtCore.QSize(600, 76))
+        list_view = self._list_view_for_model(index.model())
+        selection_model = list_view.selectionModel()
+        model_index = list_view.model().index(index.row())
 
-        return lw_item
+        # a button acts on the whole selection only when its own card is part of it
+        if not selection_model.isSelected(model_index):
+            selection_model.select(model_index, QtCore.QItemSelectionModel.SelectionFlag.ClearAndSelect)
 
-    def _convert_selected_items_to_class_object_list(self, is_completed: bool) -> list[Task]:
-        if not is_completed:
-            pending_selected_tasks = self.lw_pending.selectedItems()
-            return [task.data(QtCore.Qt.UserRole) for task in pending_selected_tasks]
-
-        completed_selected_tasks = self.lw_completed.selectedItems()
-        return [task.data(QtCore.Qt.UserRole) for task in completed_selected_tasks]
-
-    def _change_task_display(self, task: QListWidgetItem, complete: bool):
-        # change font
-        task.setFont(task.font())
-        # change colour
-        if complete:
-            task.setForeground(QtGui.QColor(60, 60, 60, 100))
-        else:
-            task.setForeground(QtGui.QColor(60, 60, 60, 255))  # check if not overwritten by add task
+        from task_delegate import ACTION_DONE, ACTION_EDIT, ACTION_DELETE
 
-        # send lw_item to bottom
-        self.lw_task_list.takeItem(self.lw_task_list.row(task))  # take task item out of list
-        len_completed_tasks = len([task for task in self.tasks if task.is_completed is False])
-        self.lw_task_list.insertItem(len_completed_tasks if complete else 0,
-                                     task)  # inserts item above completed tasks,
-        # below uncompleted
+        if action == ACTION_DONE:
+            self.change_completion_status(list_view)
+        elif action == ACTION_EDIT:
+            self.edit_task(list_view)
+        elif action == ACTION_DELETE:
+            self.delete_task(list_view)
 
-        return True
+    def _convert_selected_items_to_class_object_list(self, is_completed: bool) -> list[Task]:
+        list_view = self.lw_completed if is_completed else self.lw_pending
+        return [index.data(list_view.model().TaskRole) for index in list_view.selectionModel().selectedRows()]
 
     def _show_no_tasks(self, status: bool):
         if status:  # if True
@@ -641,7 +874,7 @@ class App(QtWidgets.QWidget):
         # qframe
         self.qframe_no_tasks = QtWidgets.QFrame()
         self.qframe_no_tasks.setMinimumHeight(100)
-        self.qframe_no_tasks.setStyleSheet("background-color: rgba(255, 223, 186, 1); border-radius: 10px")
+        self.qframe_no_tasks.setObjectName("qframe_no_tasks")
 
         # qframe layout
         self.qframe_layout = QtWidgets.QVBoxLayout(self.qframe_no_tasks)
@@ -650,20 +883,12 @@ class App(QtWidgets.QWidget):
 
         # customize qlabel
         self.qframe_layout.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-        label.setStyleSheet("""
-            font-family: 'Quicksand';
-            color: rgba(255, 87, 34, 1);
-            font-size: 16px;
-            """)
+        label.setObjectName("qlabel_no_tasks")
 
 
 if __name__ == "__main__":
     app = QtWidgets.QApplication([])
     win = App()
-    win.setStyleSheet("""
-    background-color: #121212;
-    font-family: 'Roboto';
-    """)
     win.show()
     app.exec()
     pass
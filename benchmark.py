@@ -0,0 +1,266 @@
+"""
+Benchmarks the task operations on synthetic task lists.
+Usage:
+    python benchmark.py                                  (1k and 100k tasks)
+    python benchmark.py --sizes 1k 100k 1M --repeat 1
+    python benchmark.py --save-baseline baseline.json    (keep the results to compare with later)
+    python benchmark.py --baseline baseline.json         (exit code 1 when a result got worse than --threshold)
+Every benchmark is timed --repeat times (best time kept) and run once more under tracemalloc
+for its peak memory. Qt benchmarks use the offscreen platform unless QT_QPA_PLATFORM is set.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import task_codec
+from task import Task
+from task_manager import TaskManager, DuplicateTitleError
+from task_store import TaskStore
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+# a benchmark that changes or checks "some" tasks works on this share of them
+SAMPLE_SHARE = 0.1
+# results closer to the baseline than this are noise, whatever the threshold
+MIN_TIME_CHANGE = 0.005
+MIN_MEMORY_CHANGE_MB = 1.0
+
+WORDS = ("call", "buy", "fix", "plumber", "milk", "kitchen", "sink", "report", "review", "email", "book",
+         "flight", "pay", "rent", "clean", "garage", "plan", "trip", "read", "chapter", "water", "plants")
+
+
+def make_tasks(count: int, seed: int = 0) -> list[Task]:
+    """
+    Creates the same synthetic tasks for the same count and seed
+    Args:
+        count: number of tasks
+        seed: seed of the word choice
+
+    Returns: tasks with unique titles of 3 to 8 words; about a third are completed
+
+    """
+    generator = random.Random(seed)
+    ids = Task.new_ids(count)
+    return [Task(f"{' '.join(generator.choices(WORDS, k=generator.randint(3, 8)))} {number}",
+                 generator.random() < 1 / 3, ids[number])
+            for number in range(count)]
+
+
+def _copies(tasks: list[Task]) -> list[Task]:
+    # stores keep the Task objects they are given: every run starts from fresh ones
+    return [Task(task.title, task.is_completed, task.id) for task in tasks]
+
+
+def _write_store(path: Path, tasks: list[Task], file_format: str = task_codec.FORMAT_JSON):
+    store = TaskStore(path, file_format)
+    store.add_many(_copies(tasks))
+    store.close()
+
+
+def _saved_manager(tasks: list[Task], directory: Path) -> TaskManager:
+    path = directory / "tasks.json"
+    _write_store(path, tasks)
+    manager = TaskManager(path)
+    manager.load()
+    return manager
+
+
+# Every benchmark takes (tasks, directory), does its setup and returns the function to time
+
+def bench_save(file_format: str):
+    def setup(tasks: list[Task], directory: Path):
+        path = directory / f"save_{file_format}.json"
+        # a store saving over an earlier run's files would merge them first
+        for stale_path in (path, path.with_suffix(".journal")):
+            stale_path.unlink(missing_ok=True)
+        store = TaskStore(path, file_format)
+        store.add_many(_copies(tasks))
+        return store.compact
+    return setup
+
+
+def bench_load(file_format: str):
+    def setup(tasks: list[Task], directory: Path):
+        path = directory / f"load_{file_format}.json"
+        if not path.exists():
+            _write_store(path, tasks, file_format)
+        return lambda: TaskStore(path).load()
+    return setup
+
+
+def bench_check_titles(tasks: list[Task], directory: Path):
+    # what typing titles into the input field costs: half of them are taken
+    manager = _saved_manager(tasks, directory)
+    count = max(1, int(len(tasks) * SAMPLE_SHARE))
+    titles = [task.title for task in tasks[:count // 2]] + [f"new task {number}" for number in range(count // 2)]
+
+    def run():
+        for title in titles:
+            try:
+                manager.check_title(title)
+            except DuplicateTitleError:
+                pass
+    return run
+
+
+def bench_import(tasks: list[Task], directory: Path):
+    # a bulk import where half of the records are already in the store
+    manager = _saved_manager(tasks[:len(tasks) // 2], directory)
+    records = [(number, {"title": task.title, "is_completed": task.is_completed})
+               for number, task in enumerate(tasks, start=1)]
+    return lambda: manager.import_tasks(records)
+
+
+def bench_toggle(tasks: list[Task], directory: Path):
+    manager = _saved_manager(tasks, directory)
+    selected = manager.pending[:max(1, int(len(manager.pending) * SAMPLE_SHARE))]
+    return lambda: manager.move_tasks(selected, True)
+
+
+def bench_delete(tasks: list[Task], directory: Path):
+    manager = _saved_manager(tasks, directory)
+    selected = manager.completed[::max(1, int(1 / SAMPLE_SHARE))]
+    return lambda: manager.delete_tasks(selected)
+
+
+def bench_window(tasks: list[Task], directory: Path):
+    # the app from start to both lists populated ahead of the viewport, then closed
+    from PySide6 import QtWidgets
+    import app
+
+    qt_app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    path = directory / "window.json"
+    if not path.exists():
+        _write_store(path, tasks)
+
+    def run():
+        app.JSON_FILE_PATH = path
+        window = app.App()
+        window.show()
+        qt_app.processEvents()
+        while not window.is_started or window.populate_timer.isActive():
+            qt_app.processEvents()
+            # the search index is built in idle steps after startup: not part of this benchmark
+            window.index_timer.stop()
+        window.close()
+    return run
+
+
+BENCHMARKS = {
+    **{f"save_{file_format}": bench_save(file_format) for file_format in task_codec.FORMATS},
+    **{f"load_{file_format}": bench_load(file_format) for file_format in task_codec.FORMATS},
+    "check_titles": bench_check_titles,
+    "import": bench_import,
+    "toggle": bench_toggle,
+    "delete": bench_delete,
+    "window": bench_window,
+}
+
+
+def run_benchmark(setup, tasks: list[Task], directory: Path, repeat: int) -> dict:
+    """
+    Times a benchmark and measures its peak memory
+    Args:
+        setup: benchmark function from BENCHMARKS
+        tasks: synthetic tasks
+        directory: empty directory for the benchmark's files
+        repeat: number of timed runs
+
+    Returns: {"seconds": best time, "peak_mb": peak of the memory allocated by one run}
+
+    """
+    times = []
+    for _ in range(repeat):
+        run = setup(tasks, directory)
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+
+    # separate from the timed runs: tracing makes every allocation slower
+    run = setup(tasks, directory)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(times), "peak_mb": peak / 1_000_000}
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Compares results with a saved baseline
+    Args:
+        results: {"name[size]": result} of this run
+        baseline: the same for an earlier run
+        threshold: allowed slowdown or memory growth, as a share of the baseline (0.25 = 25%)
+
+    Returns: one line per result that got worse than the threshold
+
+    """
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        for field, unit, min_change in (("seconds", "s", MIN_TIME_CHANGE), ("peak_mb", "MB", MIN_MEMORY_CHANGE_MB)):
+            change = result[field] - before[field]
+            if change > min_change and change > before[field] * threshold:
+                growth = f" (+{change / before[field]:.0%})" if before[field] else ""
+                regressions.append(f"{key}: {field} {before[field]:.3f}{unit} -> {result[field]:.3f}{unit}{growth}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the task operations on synthetic task lists")
+    parser.add_argument("--sizes", nargs="+", default=["1k", "100k"], choices=SIZES, help="task list sizes")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark (default: %(default)s)")
+    parser.add_argument("--baseline", type=Path, help="results file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown or memory growth against the baseline (default: %(default)s)")
+    parser.add_argument("--save-baseline", type=Path, help="file to write this run's results to")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {}
+    print(f"{'benchmark':<16} {'tasks':>9} {'best s':>9} {'peak MB':>9}")
+    for size in args.sizes:
+        tasks = make_tasks(SIZES[size])
+        for name in args.only or BENCHMARKS:
+            with tempfile.TemporaryDirectory() as directory:
+                result = run_benchmark(BENCHMARKS[name], tasks, Path(directory), args.repeat)
+            results[f"{name}[{size}]"] = result
+            print(f"{name:<16} {SIZES[size]:>9,} {result['seconds']:>9.3f} {result['peak_mb']:>9.1f}")
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "json_library": task_codec.json_library(),
+            "results": results,
+        }, indent=4))
+        print(f"Saved the results to {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())["results"]
+        regressions = find_regressions(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"Regression: {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+"""
+Shared pytest fixtures. Being at the top of the repository, this file also puts the modules
+on the import path of the tests in tests/
+"""
+import logging
+import os
+
+import pytest
+
+# the model and delegate tests need no screen
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(autouse=True)
+def quiet_logging():
+    # the stores log every load and save at INFO level
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def tasks_path(tmp_path):
+    return tmp_path / "tasks.json"
+
+
+@pytest.fixture(scope="session")
+def qt_app():
+    from PySide6 import QtWidgets
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
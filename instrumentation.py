@@ -0,0 +1,143 @@
+"""
+Contains the timing spans: counts and latency histograms of the hot paths (load, save, populate,
+card painting, selection repaints, event filtering).
+Spans are recorded only when logging_config.INSTRUMENTATION is on (TASK_INSTRUMENTATION=1).
+When it is off, timed() returns the function itself and span() a shared empty context, so the
+hot paths run as if they were not instrumented.
+Usage:
+    @timed("store.load")
+    def load(self): ...
+
+    with span("app.populate"):
+        ...
+
+    log_summary()    (one line per span through logging_config.INSTRUMENTATION_LOGGER)
+"""
+import contextlib
+import functools
+import logging
+import time
+
+import logging_config
+
+ENABLED = logging_config.INSTRUMENTATION
+
+_histograms = {}
+_disabled_span = contextlib.nullcontext()
+
+
+class Histogram:
+    """
+    Latency histogram with power-of-two microsecond buckets: bucket b counts the durations
+    below 2**b microseconds (and at least 2**(b - 1)). Updated from any thread without a lock,
+    so a count may be lost when two threads finish the same span at the same moment.
+    """
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket = int(seconds * 1_000_000).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, share: float) -> float:
+        """
+        Args:
+            share: 0.5 for the median, 0.95 for the 95th percentile
+
+        Returns: upper bound in seconds of the bucket holding the percentile
+
+        """
+        target = share * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                return min(2 ** bucket / 1_000_000, self.max)
+        return self.max
+
+
+def histogram(name: str) -> Histogram:
+    hist = _histograms.get(name)
+    if hist is None:
+        hist = _histograms[name] = Histogram()
+    return hist
+
+
+def timed(name: str):
+    """
+    Decorator recording every call of a function as a span
+    Args:
+        name: span name, e.g. "store.load"
+
+    """
+    def decorate(function):
+        if not ENABLED:
+            return function
+        hist = histogram(name)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                hist.add(time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+@contextlib.contextmanager
+def _span(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram(name).add(time.perf_counter() - started)
+
+
+def span(name: str):
+    """
+    Context manager recording the time spent in its block
+    Args:
+        name: span name, e.g. "app.populate"
+
+    """
+    return _span(name) if ENABLED else _disabled_span
+
+
+def summary() -> list[str]:
+    """
+    Returns: one line per recorded span, slowest total first
+
+    """
+    lines = []
+    for name, hist in sorted(_histograms.items(), key=lambda item: item[1].total, reverse=True):
+        if not hist.count:
+            continue
+        lines.append(f"{name}: {hist.count} calls, {hist.total:.3f}s total, "
+                     f"{hist.total / hist.count * 1000:.3f}ms mean, p50 < {hist.percentile(0.5) * 1000:.3f}ms, "
+                     f"p95 < {hist.percentile(0.95) * 1000:.3f}ms, max {hist.max * 1000:.3f}ms")
+    return lines
+
+
+def log_summary(level: int = logging.INFO):
+    logger = logging.getLogger(logging_config.INSTRUMENTATION_LOGGER)
+    if not ENABLED or not logger.isEnabledFor(level):
+        return
+    for line in summary():
+        logger.log(level, "%s", line)
+
+
+def reset():
+    # decorated functions keep their histogram: empty them instead of dropping them
+    for hist in _histograms.values():
+        hist.__init__()
@@ -0,0 +1,175 @@
+"""
+Load-tests the task server: starts it on a new tasks file and keeps it busy from many pipelining
+keep-alive connections at once, mixing list and lookup requests with adds and toggles.
+Usage:
+    python load_test.py                                 (1, 16 and 64 connections, 5 seconds each)
+    python load_test.py --connections 32 --depth 16 --writes 0.5 --seconds 10
+    python load_test.py --tasks 100000                  (tasks in the file before the first request)
+Every connection sends --depth requests in one write, reads their answers and starts over.
+Latency runs from that write to each answer. Exit code 1 when a request failed.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark import make_tasks
+from task_store import TaskStore
+
+# Share of the writes that add tasks; the others toggle a task the connection added
+ADD_SHARE = 0.5
+# Tasks per page of the list requests
+LIST_LIMIT = 20
+SERVER_START_TIMEOUT = 30.0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(method: str, target: str, body: dict = None) -> bytes:
+    data = json.dumps(body).encode("utf-8") if body is not None else b""
+    return f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n".encode("ascii") + data
+
+
+async def _read_answer(reader: asyncio.StreamReader) -> tuple[int, bytes]:
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def run_connection(port: int, number: int, depth: int, writes: float, task_ids: list[str],
+                         deadline: float, latencies: list, counts: dict):
+    """
+    Sends batches of pipelined requests until deadline
+    Args:
+        port: server port
+        number: connection number, part of the titles it adds
+        depth: requests per batch
+        writes: share of the requests that change tasks
+        task_ids: ids of the tasks in the file at the start, for lookups
+        deadline: time.perf_counter() value to stop at
+        latencies: gets the latency of every answer, in seconds
+        counts: "requests" and "failed" are increased
+
+    """
+    generator = random.Random(number)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    own_ids = []
+    added = 0
+    try:
+        while time.perf_counter() < deadline:
+            batch = []
+            for _ in range(depth):
+                if generator.random() < writes:
+                    if own_ids and generator.random() >= ADD_SHARE:
+                        batch.append(_request("POST", f"/tasks/{generator.choice(own_ids)}/toggle"))
+                    else:
+                        batch.append(_request("POST", "/tasks", {"title": f"load {number} task {added}"}))
+                        added += 1
+                elif generator.random() < 0.5 and task_ids:
+                    batch.append(_request("GET", f"/tasks/{generator.choice(task_ids)}"))
+                else:
+                    offset = generator.randrange(max(len(task_ids), 1))
+                    batch.append(_request("GET", f"/tasks?limit={LIST_LIMIT}&offset={offset}"))
+
+            started = time.perf_counter()
+            writer.write(b"".join(batch))
+            for request in batch:
+                status, body = await _read_answer(reader)
+                latencies.append(time.perf_counter() - started)
+                counts["requests"] += 1
+                if status >= 300:
+                    counts["failed"] += 1
+                elif status == 201:
+                    own_ids.append(json.loads(body)["id"])
+    finally:
+        writer.close()
+
+
+async def run_load(port: int, connections: int, depth: int, writes: float, seconds: float,
+                   task_ids: list[str]) -> dict:
+    latencies = []
+    counts = {"requests": 0, "failed": 0}
+    started = time.perf_counter()
+    await asyncio.gather(*(run_connection(port, number, depth, writes, task_ids, started + seconds, latencies, counts)
+                           for number in range(connections)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def percentile(share: float) -> float:
+        return latencies[min(int(share * len(latencies)), len(latencies) - 1)] if latencies else float("nan")
+
+    return {"requests": counts["requests"], "failed": counts["failed"], "seconds": elapsed,
+            "p50": percentile(0.5), "p99": percentile(0.99)}
+
+
+def start_server(path: Path, port: int) -> subprocess.Popen:
+    # a process of its own, as other programs would use it; only warnings are logged
+    environment = {**os.environ, "TASK_LOG_LEVEL": "WARNING"}
+    server = subprocess.Popen([sys.executable, "-m", "task_server", "--file", str(path), "--port", str(port)],
+                              cwd=Path(__file__).parent, env=environment)
+    deadline = time.perf_counter() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            if server.poll() is not None or time.perf_counter() > deadline:
+                server.kill()
+                raise RuntimeError("The task server did not start")
+            time.sleep(0.05)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load-test the task server")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 16, 64], help="connection counts to run")
+    parser.add_argument("--depth", type=int, default=8, help="pipelined requests per batch (default: %(default)s)")
+    parser.add_argument("--writes", type=float, default=0.2,
+                        help="share of the requests that add or toggle tasks (default: %(default)s)")
+    parser.add_argument("--seconds", type=float, default=5.0, help="length of each run (default: %(default)s)")
+    parser.add_argument("--tasks", type=int, default=10_000, help="tasks in the file at the start (default: %(default)s)")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    failed = False
+    print(f"{'connections':>11} {'requests':>9} {'requests/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'failed':>7}")
+    for connections in args.connections:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "tasks.json"
+            tasks = make_tasks(args.tasks)
+            store = TaskStore(path)
+            store.add_many(tasks)
+            store.close()
+
+            port = _free_port()
+            server = start_server(path, port)
+            try:
+                result = asyncio.run(run_load(port, connections, args.depth, args.writes, args.seconds,
+                                              [task.id for task in tasks]))
+            finally:
+                server.terminate()
+                server.wait()
+        failed = failed or result["failed"] > 0
+        print(f"{connections:>11} {result['requests']:>9,} {result['requests'] / result['seconds']:>11,.0f} "
+              f"{result['p50'] * 1000:>8.2f} {result['p99'] * 1000:>8.2f} {result['failed']:>7}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
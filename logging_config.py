@@ -1,5 +1,22 @@
+"""
+Configures logging for the app and the command line from the environment:
+    TASK_LOG_LEVEL                  root log level (default: INFO)
+    TASK_INSTRUMENTATION            1 to record timing spans (see instrumentation.py)
+    TASK_INSTRUMENTATION_INTERVAL   seconds between span summaries while the app runs (default: 60,
+                                    0 for a summary on exit only)
+"""
 import logging
+import os
+
+LOG_LEVEL = os.environ.get("TASK_LOG_LEVEL", "INFO").upper()
+INSTRUMENTATION = os.environ.get("TASK_INSTRUMENTATION", "") not in ("", "0")
+INSTRUMENTATION_INTERVAL = float(os.environ.get("TASK_INSTRUMENTATION_INTERVAL", "60"))
+# span summaries are logged through this logger, so they can be routed or silenced on their own
+INSTRUMENTATION_LOGGER = "tasks.instrumentation"
 
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=LOG_LEVEL,
 )
+if INSTRUMENTATION:
+    # summaries are shown even when the root level hides other INFO records
+    logging.getLogger(INSTRUMENTATION_LOGGER).setLevel(logging.INFO)
@@ -0,0 +1,648 @@
+"""
+Contains the memory-mapped task store: one binary file opened with mmap, so a task is only
+read from disk when a view asks for it
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Sequence
+from pathlib import Path
+
+from instrumentation import timed
+from task import Task, TaskError
+from task_codec import CorruptTasksFile
+
+try:
+    import fcntl
+except ImportError:
+    # no advisory locks (Windows): nothing stops a second program from opening the file
+    fcntl = None
+
+# File layout:
+#   header          HEADER, padded to HEADER_SIZE bytes
+#   status table    one byte per slot: STATUS_PENDING, STATUS_COMPLETED or STATUS_DELETED, with
+#                   the MOVED bit set for tasks moved to the top of their list
+#   offset table    one OFFSET per slot: where the slot's record starts
+#   position table  one POSITION per slot: the task's order key in its list
+#   records         RECORD (id and title lengths) followed by the UTF-8 id and title; new tasks
+#                   and new titles are appended at the tail, after the last record
+# The tasks of a list without the MOVED bit are in file order, with ascending positions: the
+# file is written in list order and new tasks get the next position. Moved tasks have positions
+# below every other task of their list.
+MAGIC = b"TASKMAP1"
+VERSION = 2
+# files without a position table, rewritten when opened
+VERSION_1 = 1
+# magic, version, capacity (slots in the tables), slots in use, pending, completed, end of the records
+HEADER = struct.Struct("<8sIQQQQQ")
+HEADER_SIZE = 64
+OFFSET = struct.Struct("<Q")
+POSITION = struct.Struct("<d")
+RECORD = struct.Struct("<HI")
+
+STATUS_PENDING = 0
+STATUS_COMPLETED = 1
+STATUS_DELETED = 2
+MOVED = 0x80
+
+
+class MappedTaskList(Sequence):
+    """
+    Read-only view of the pending or completed tasks of a MappedTaskStore: the tasks moved to
+    the list (newest first), then the others in file order, which is also position order.
+    The status table is scanned only as far as the requested index, so the first page of
+    a huge file is read without touching the rest of it.
+    """
+    # status bytes read per scan step
+    SCAN_SIZE = 16_384
+    # tasks read per step when iterating
+    PAGE_SIZE = 1000
+
+    def __init__(self, store: "MappedTaskStore", status: int):
+        self._store = store
+        self._status = status
+        self._status_byte = bytes([status])
+        # slots moved to this list, newest first
+        self._top = store.moved_slots(status)
+        self._top_set = set(self._top)
+        # slots found by the scan in file order, without the moved ones
+        self._slots = []
+        self._scanned = 0
+
+    def __len__(self) -> int:
+        return self._store.count(self._status)
+
+    def __getitem__(self, index):
+        with self._store.lock:
+            if isinstance(index, slice):
+                if index.step not in (None, 1):
+                    raise ValueError("MappedTaskList slices do not support a step")
+                start, stop, _ = index.indices(len(self))
+                return [self._store.read_task(slot, self._status) for slot in self._slot_range(start, stop)]
+
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError("task index out of range")
+            return self._store.read_task(self._slot_range(index, index + 1)[0], self._status)
+
+    def __iter__(self):
+        start = 0
+        while True:
+            page = self[start:start + self.PAGE_SIZE]
+            if not page:
+                return
+            yield from page
+            start += len(page)
+
+    def first_position(self) -> float:
+        slots = self._slot_range(0, 1)
+        return self._store.read_position(slots[0]) if slots else None
+
+    def slots(self) -> list[int]:
+        # every slot of the list, in list order
+        return self._slot_range(0, len(self))
+
+    def remove(self, slot: int):
+        if slot in self._top_set:
+            self._top_set.discard(slot)
+            self._top.remove(slot)
+            return
+        position = bisect_left(self._slots, slot)
+        if position < len(self._slots) and self._slots[position] == slot:
+            del self._slots[position]
+
+    def move_to_top(self, slots: list[int]):
+        self._top[:0] = slots
+        self._top_set.update(slots)
+
+    def reset(self):
+        # the file was rewritten in list order, without MOVED bits: every slot number changed
+        self._top = []
+        self._top_set = set()
+        self._slots = []
+        self._scanned = 0
+
+    def _slot_range(self, start: int, stop: int) -> list[int]:
+        slots = self._top[start:stop]
+        if stop > len(self._top):
+            first = max(start - len(self._top), 0)
+            last = stop - len(self._top)
+            self._scan_to(last)
+            slots += self._slots[first:last]
+        return slots
+
+    def _scan_to(self, count: int):
+        store = self._store
+        while len(self._slots) < count and self._scanned < store.slot_count:
+            end = min(self._scanned + self.SCAN_SIZE, store.slot_count)
+            statuses = store.read_statuses(self._scanned, end)
+            position = statuses.find(self._status_byte)
+            while position != -1:
+                # moved slots have the MOVED bit and are not found
+                self._slots.append(self._scanned + position)
+                position = statuses.find(self._status_byte, position + 1)
+            self._scanned = end
+
+
+class MappedTaskStore:
+    """
+    Task store backed by one memory-mapped file (layout above), created from the JSON tasks
+    file on first run. Has the same interface as TaskStore, but its pending and completed
+    lists are MappedTaskList views, so opening the file reads only its header and searches
+    its status table for moved tasks.
+    Changes are written into the mapping as they are made: a status change or a delete
+    flips one status byte, a move also writes the task's position, new tasks and renamed
+    titles are appended at the tail, and flush() syncs the mapping to disk. The file is
+    rewritten in list order by compact(), when the slot tables are full, and on close when
+    most slots are deleted.
+    Moved tasks go to the top of their new list and stay there when the file is opened
+    again. Tasks cannot be put anywhere else (can_reorder is False): the others keep their
+    order in the file.
+    Ids and titles are looked up in dictionaries filled as tasks are read; looking up one
+    that was not read yet (e.g. checking a new title) indexes the whole file once.
+    The header, the lists and the indexes are kept in memory and written back from there,
+    so only one program may have the file open: a second one is refused with TaskError
+    (through an advisory lock on tasks.taskmap.lock, held until close()).
+    """
+    MIN_CAPACITY = 1024
+    # the file grows by at least this many bytes when records are appended
+    GROW_SIZE = 1 << 20
+    # close() rewrites the file when more slots than this (and than live tasks) are deleted
+    COMPACT_THRESHOLD = 1000
+    # only the moved tasks may be out of file order
+    can_reorder = False
+
+    def __init__(self, path: Path, json_path: Path = None):
+        self.path = Path(path)
+        self.json_path = Path(json_path) if json_path else None
+        self.lock_path = self.path.with_suffix(".taskmap.lock")
+        self._lock_file = None
+        self.pending = None
+        self.completed = None
+        self.capacity = 0
+        self.slot_count = 0
+        self._counts = [0, 0]
+        self._data_end = 0
+        self._file = None
+        self._map = None
+        self._slot_by_id = {}
+        self._slot_by_title = {}
+        self._indexed = False
+        self._dirty = False
+        # the position of the last task of each list, found when a task is first added
+        self._last_positions = None
+        # flush() may sync the mapping from a worker thread
+        self.lock = threading.RLock()
+
+    @property
+    def tasks(self):
+        yield from self.pending
+        yield from self.completed
+
+    @timed("store.load")
+    def load(self) -> tuple[MappedTaskList, MappedTaskList]:
+        """
+        Maps the tasks file, creating it from the JSON tasks file on first run
+        Returns: (pending tasks, completed tasks) as lazy views
+
+        """
+        started = time.perf_counter()
+        self._lock_out_other_programs()
+        if not self.path.exists():
+            self._create_from_json()
+        try:
+            self._open()
+        except CorruptTasksFile:
+            corrupt_path = self.path.with_suffix(".taskmap.corrupt")
+            os.replace(self.path, corrupt_path)
+            logging.error("MMAP - Tasks file is not valid, moved it to %s", corrupt_path.name)
+            self._write_file([], 0)
+            self._open()
+
+        self.pending = MappedTaskList(self, STATUS_PENDING)
+        self.completed = MappedTaskList(self, STATUS_COMPLETED)
+        logging.info("MMAP - Opened %s with %d pending and %d completed tasks in %.3fs", self.path.name,
+                     self._counts[STATUS_PENDING], self._counts[STATUS_COMPLETED], time.perf_counter() - started)
+        return self.pending, self.completed
+
+    def count(self, status: int) -> int:
+        return self._counts[status]
+
+    def read_statuses(self, start: int, stop: int) -> bytes:
+        return self._map[HEADER_SIZE + start:HEADER_SIZE + stop]
+
+    def read_position(self, slot: int) -> float:
+        return POSITION.unpack_from(self._map, self._position_offset(slot))[0]
+
+    def moved_slots(self, status: int) -> list[int]:
+        """
+        Finds the tasks moved to the top of a list
+        Args:
+            status: STATUS_PENDING or STATUS_COMPLETED
+
+        Returns: their slots in list order
+
+        """
+        moved_byte = bytes([status | MOVED])
+        slots = []
+        position = self._map.find(moved_byte, HEADER_SIZE, HEADER_SIZE + self.slot_count)
+        while position != -1:
+            slots.append(position - HEADER_SIZE)
+            position = self._map.find(moved_byte, position + 1, HEADER_SIZE + self.slot_count)
+        return sorted(slots, key=self.read_position)
+
+    def read_task(self, slot: int, status: int) -> Task:
+        task_id, title = self._read_record(slot)
+        self._slot_by_id[task_id] = slot
+        self._slot_by_title[title] = slot
+        return Task(title, status == STATUS_COMPLETED, task_id, self.read_position(slot))
+
+    def get(self, task_id: str) -> Task:
+        with self.lock:
+            slot = self._find_slot(self._slot_by_id, task_id)
+            return self.read_task(slot, self._status(slot)) if slot is not None else None
+
+    def get_by_title(self, title: str) -> Task:
+        with self.lock:
+            slot = self._find_slot(self._slot_by_title, Task.normalize_title(title))
+            return self.read_task(slot, self._status(slot)) if slot is not None else None
+
+    def contains_title(self, title: str) -> bool:
+        with self.lock:
+            return self._find_slot(self._slot_by_title, Task.normalize_title(title)) is not None
+
+    def taken_titles(self, titles) -> set[str]:
+        """
+        Checks many normalized titles against the title index
+        Returns: the titles a task already has
+
+        """
+        with self.lock:
+            self._index_all()
+            return {title for title in titles if title in self._slot_by_title}
+
+    def taken_ids(self, task_ids) -> set[str]:
+        with self.lock:
+            self._index_all()
+            return {task_id for task_id in task_ids if task_id in self._slot_by_id}
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def add(self, task: Task):
+        self.add_many([task])
+
+    def add_many(self, tasks):
+        """
+        Appends tasks at the end of their lists, rewriting the file first if its slot tables
+        are too small for them, and gives them their positions
+        Args:
+            tasks: iterable of Task objects with titles and ids no other task has
+
+        """
+        tasks = list(tasks)
+        with self.lock:
+            if self.slot_count + len(tasks) > self.capacity:
+                self._rewrite(len(tasks))
+            if self._last_positions is None:
+                self._last_positions = [self._last_position(STATUS_PENDING), self._last_position(STATUS_COMPLETED)]
+            for task in tasks:
+                slot = self.slot_count
+                status = STATUS_COMPLETED if task.is_completed else STATUS_PENDING
+                self._last_positions[status] += 1
+                task.position = self._last_positions[status]
+                # record, offset, position and status first: until the header counts the slot, a crash loses only the slot
+                OFFSET.pack_into(self._map, HEADER_SIZE + self.capacity + OFFSET.size * slot,
+                                 self._append_record(task.id, task.title))
+                POSITION.pack_into(self._map, self._position_offset(slot), task.position)
+                self._map[HEADER_SIZE + slot] = status
+                self.slot_count += 1
+                self._counts[status] += 1
+                self._slot_by_id[task.id] = slot
+                self._slot_by_title[task.title] = slot
+            self._write_header()
+
+    def delete(self, task_id: str):
+        self.delete_tasks([task_id])
+
+    def delete_tasks(self, task_ids: list[str]):
+        with self.lock:
+            for task_id in dict.fromkeys(task_ids):
+                slot = self._find_slot(self._slot_by_id, task_id)
+                status = self._status(slot)
+                self._lists()[status].remove(slot)
+                self._map[HEADER_SIZE + slot] = STATUS_DELETED
+                self._counts[status] -= 1
+                del self._slot_by_id[task_id]
+                self._slot_by_title.pop(self._read_record(slot)[1], None)
+            self._write_header()
+
+    def set_completed(self, task_id: str, status: bool):
+        """
+        Changes the completion status of a task and moves it to the top of its new list
+        Args:
+            task_id: id of the task to change
+            status: new completion status
+
+        """
+        self.move_tasks([task_id], status)
+
+    def move_tasks(self, task_ids: list[str], completed: bool) -> list[float]:
+        """
+        Changes the completion status of many tasks in place, one status byte and one
+        position each, and puts them, in the given order, at the top of their new list
+        Args:
+            task_ids: ids of the tasks to move
+            completed: new completion status
+
+        Returns: the positions of the tasks
+
+        """
+        new_status = STATUS_COMPLETED if completed else STATUS_PENDING
+        with self.lock:
+            slots = [self._find_slot(self._slot_by_id, task_id) for task_id in dict.fromkeys(task_ids)]
+            for slot in slots:
+                status = self._status(slot)
+                self._lists()[status].remove(slot)
+                # the MOVED bit also keeps the list's scan from finding the slot in file order
+                self._map[HEADER_SIZE + slot] = new_status | MOVED
+                self._counts[status] -= 1
+                self._counts[new_status] += 1
+            positions = Task.positions_between(None, self._lists()[new_status].first_position(), len(slots))
+            for slot, position in zip(slots, positions):
+                POSITION.pack_into(self._map, self._position_offset(slot), position)
+            self._lists()[new_status].move_to_top(slots)
+            self._write_header()
+            return positions
+
+    def reorder(self, task_ids: list[str], completed: bool, before_id: str = None) -> list[float]:
+        # only the top of a list is free (can_reorder is False), as TaskManager.reorder tells the caller
+        raise TaskError("Tasks cannot be reordered in this task store")
+
+    def rename(self, task_id: str, title: str):
+        with self.lock:
+            slot = self._find_slot(self._slot_by_id, task_id)
+            title = Task.normalize_title(title)
+            old_title = self._read_record(slot)[1]
+            offset = self._append_record(task_id, title)
+            self._write_header()
+            OFFSET.pack_into(self._map, HEADER_SIZE + self.capacity + OFFSET.size * slot, offset)
+            self._slot_by_title.pop(old_title, None)
+            self._slot_by_title[title] = slot
+
+    @timed("store.flush")
+    def flush(self, compact: bool = False):
+        """
+        Syncs the changed pages of the mapping to disk
+        Args:
+            compact: True to first rewrite the file without deleted slots and old titles
+
+        """
+        with self.lock:
+            if compact:
+                self._rewrite()
+            self._map.flush()
+            self._dirty = False
+        logging.info("MMAP - Tasks saved")
+
+    def compact(self):
+        self.flush(compact=True)
+
+    # other programs' changes to the mapped file are not reloaded: there are no files to watch
+    watch_paths = ()
+
+    def read_changes(self):
+        return None
+
+    def apply_changes(self, changes) -> bool:
+        return True
+
+    def close(self):
+        if self._map is not None:
+            live = self._counts[STATUS_PENDING] + self._counts[STATUS_COMPLETED]
+            self.flush(compact=self.slot_count - live > max(self.COMPACT_THRESHOLD, live))
+            self._close_map()
+        if self._lock_file is not None:
+            # closing the file releases the lock
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _lock_out_other_programs(self):
+        # another program writing the file from its own copy of the header would overwrite this one's tasks
+        if fcntl is None or self._lock_file is not None:
+            return
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise TaskError(f"{self.path.name} is open in another program")
+        self._lock_file = lock_file
+
+    def _lists(self) -> tuple[MappedTaskList, MappedTaskList]:
+        return self.pending, self.completed
+
+    def _status(self, slot: int) -> int:
+        return self._map[HEADER_SIZE + slot] & ~MOVED
+
+    def _read_record(self, slot: int) -> tuple[str, str]:
+        return _read_record(self._map, self.capacity, slot)
+
+    def _position_offset(self, slot: int) -> int:
+        return HEADER_SIZE + self.capacity * (1 + OFFSET.size) + POSITION.size * slot
+
+    def _last_position(self, status: int) -> float:
+        # the last task in file order is the last of its list, unless every task of the list was moved
+        slot = self._map.rfind(bytes([status]), HEADER_SIZE, HEADER_SIZE + self.slot_count)
+        if slot != -1:
+            return self.read_position(slot - HEADER_SIZE)
+        moved = self.moved_slots(status)
+        return self.read_position(moved[-1]) if moved else 0.0
+
+    def _append_record(self, task_id: str, title: str) -> int:
+        id_bytes = task_id.encode()
+        title_bytes = title.encode()
+        offset = self._data_end
+        end = offset + RECORD.size + len(id_bytes) + len(title_bytes)
+        if end > len(self._map):
+            self._map.resize(max(end, len(self._map) + max(self.GROW_SIZE, len(self._map) // 8)))
+        RECORD.pack_into(self._map, offset, len(id_bytes), len(title_bytes))
+        self._map[offset + RECORD.size:end] = id_bytes + title_bytes
+        self._data_end = end
+        self._dirty = True
+        return offset
+
+    def _find_slot(self, index: dict, key: str):
+        slot = index.get(key)
+        if slot is None and not self._indexed:
+            self._index_all()
+            slot = index.get(key)
+        return slot
+
+    def _index_all(self):
+        if self._indexed:
+            return
+        started = time.perf_counter()
+        statuses = self.read_statuses(0, self.slot_count)
+        for slot, status in enumerate(statuses):
+            if status != STATUS_DELETED:
+                task_id, title = self._read_record(slot)
+                self._slot_by_id[task_id] = slot
+                self._slot_by_title[title] = slot
+        self._indexed = True
+        logging.info("MMAP - Indexed %d tasks in %.3fs", len(self._slot_by_id), time.perf_counter() - started)
+
+    def _write_header(self):
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, self.capacity, self.slot_count,
+                         self._counts[STATUS_PENDING], self._counts[STATUS_COMPLETED], self._data_end)
+        self._dirty = True
+
+    def _open(self):
+        self._file = open(self.path, 'r+b')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        except ValueError:
+            # an empty file cannot be mapped
+            self._file.close()
+            raise CorruptTasksFile(f"{self.path.name} is empty")
+
+        header = HEADER.unpack_from(self._map, 0) if len(self._map) >= HEADER_SIZE else None
+        if header is not None and header[0] == MAGIC and header[1] == VERSION_1:
+            self._close_map()
+            self._upgrade_from_version_1()
+            self._open()
+            return
+        if header is None or header[0] != MAGIC or header[1] != VERSION:
+            self._close_map()
+            raise CorruptTasksFile(f"{self.path.name} is not a memory-mapped tasks file")
+        _, _, self.capacity, self.slot_count, pending, completed, self._data_end = header
+        if (self.slot_count > self.capacity or self._data_end > len(self._map)
+                or HEADER_SIZE + self.capacity * (1 + OFFSET.size + POSITION.size) > self._data_end):
+            self._close_map()
+            raise CorruptTasksFile(f"{self.path.name} has an invalid header")
+        self._counts = [pending, completed]
+        self._slot_by_id = {}
+        self._slot_by_title = {}
+        self._indexed = False
+        self._last_positions = None
+
+    def _close_map(self):
+        self._map.close()
+        self._file.close()
+        self._map = None
+        self._file = None
+
+    def _create_from_json(self):
+        # imported here: task_store imports this module to open the mmap backend
+        from task_store import TaskStore, read_tasks
+
+        tasks = []
+        if self.json_path is not None and TaskStore(self.json_path).exists:
+            # read only: another program may still use the JSON files
+            try:
+                pending, completed = read_tasks(self.json_path)
+            except CorruptTasksFile:
+                logging.error("MMAP - %s is not valid, left it as it is and started empty", self.json_path.name)
+            else:
+                tasks = pending + completed
+                logging.info("MMAP - Migrating %d tasks from %s", len(tasks), self.json_path.name)
+        self._write_file(((task.id, task.title, task.is_completed, task.position) for task in tasks), len(tasks))
+
+    def _upgrade_from_version_1(self):
+        # version 1 files have no position table: their tasks are in file order, moved ones too
+        started = time.perf_counter()
+        with open(self.path, 'rb') as old_file, mmap.mmap(old_file.fileno(), 0, access=mmap.ACCESS_READ) as old_map:
+            try:
+                _, _, capacity, slot_count, _, _, _ = HEADER.unpack_from(old_map, 0)
+                last_positions = [0.0, 0.0]
+                rows = []
+                for slot, status in enumerate(old_map[HEADER_SIZE:HEADER_SIZE + slot_count]):
+                    if status != STATUS_DELETED:
+                        last_positions[status] += 1
+                        rows.append((*_read_record(old_map, capacity, slot), status == STATUS_COMPLETED,
+                                     last_positions[status]))
+            except (struct.error, IndexError, UnicodeDecodeError) as error:
+                raise CorruptTasksFile(f"{self.path.name} has an invalid task: {error}") from error
+        self._write_file(rows, len(rows))
+        logging.info("MMAP - Upgraded %s with %d tasks to version %d in %.3fs", self.path.name, len(rows), VERSION,
+                     time.perf_counter() - started)
+
+    def _rewrite(self, extra: int = 0):
+        """
+        Writes the tasks to a new file in list order, with room for extra more tasks, and
+        maps it in place of the old one
+        """
+        started = time.perf_counter()
+        slots = self.pending.slots() + self.completed.slots()
+
+        def rows():
+            # the tasks keep their positions: moved ones are below the others already
+            for slot in slots:
+                task_id, title = self._read_record(slot)
+                yield task_id, title, self._status(slot) == STATUS_COMPLETED, self.read_position(slot)
+
+        self._write_file(rows(), len(slots) + extra)
+        self._close_map()
+        self._open()
+        self.pending.reset()
+        self.completed.reset()
+        logging.info("MMAP - Rewrote %d tasks in %.3fs", len(slots), time.perf_counter() - started)
+
+    def _write_file(self, rows, count: int):
+        """
+        Writes a new tasks file through a temporary file, so a crash never leaves a
+        half-written one
+        Args:
+            rows: iterable of (id, title, is_completed, position) tuples, in list order
+            count: number of rows, plus the room to leave for new tasks
+
+        """
+        capacity = max(self.MIN_CAPACITY, count + count // 2)
+        data_start = HEADER_SIZE + capacity * (1 + OFFSET.size + POSITION.size)
+        statuses = bytearray(capacity)
+        offsets = bytearray(OFFSET.size * capacity)
+        positions = bytearray(POSITION.size * capacity)
+        counts = [0, 0]
+        offset = data_start
+        slot = 0
+
+        temp_path = self.path.with_suffix(".taskmap.tmp")
+        with open(temp_path, 'wb') as tasks_file:
+            tasks_file.seek(data_start)
+            for task_id, title, is_completed, position in rows:
+                id_bytes = task_id.encode()
+                title_bytes = title.encode()
+                tasks_file.write(RECORD.pack(len(id_bytes), len(title_bytes)) + id_bytes + title_bytes)
+                OFFSET.pack_into(offsets, OFFSET.size * slot, offset)
+                POSITION.pack_into(positions, POSITION.size * slot, position)
+                status = STATUS_COMPLETED if is_completed else STATUS_PENDING
+                statuses[slot] = status
+                counts[status] += 1
+                offset += RECORD.size + len(id_bytes) + len(title_bytes)
+                slot += 1
+
+            header = bytearray(HEADER_SIZE)
+            HEADER.pack_into(header, 0, MAGIC, VERSION, capacity, slot, counts[STATUS_PENDING],
+                             counts[STATUS_COMPLETED], offset)
+            tasks_file.seek(0)
+            tasks_file.write(header)
+            tasks_file.write(statuses)
+            tasks_file.write(offsets)
+            tasks_file.write(positions)
+            tasks_file.flush()
+            os.fsync(tasks_file.fileno())
+        os.replace(temp_path, self.path)
+
+
+def _read_record(buffer, capacity: int, slot: int) -> tuple[str, str]:
+    # (id, title) of a slot of a mapped file with capacity slots
+    offset, = OFFSET.unpack_from(buffer, HEADER_SIZE + capacity + OFFSET.size * slot)
+    id_length, title_length = RECORD.unpack_from(buffer, offset)
+    start = offset + RECORD.size
+    return buffer[start:start + id_length].decode(), buffer[start + id_length:start + id_length + title_length].decode()
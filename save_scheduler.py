@@ -0,0 +1,73 @@
+"""
+Contains the save scheduler: writes task changes in the background, a batch at a time
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Changes made within this many seconds of each other are saved together
+SAVE_DELAY = 0.25
+
+
+class SaveScheduler:
+    """
+    Coalesces store changes and flushes them on a worker thread.
+    mark_dirty() is all a change costs the caller: the first call starts a timer, calls
+    made before it fires join the same save, and the flush itself runs on a single
+    worker thread so saves never overlap.
+    """
+
+    def __init__(self, store, delay: float = SAVE_DELAY):
+        self.store = store
+        self.delay = delay
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-save")
+        self._timer = None
+        self._future = None
+        self._lock = threading.Lock()
+
+    def mark_dirty(self):
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.delay, self._submit)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """
+        Saves every pending change now, on the calling thread
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            future = self._future
+
+        # let a save that is already running finish first
+        if future is not None:
+            future.exception()
+        self.store.flush()
+
+    def run(self, function, callback):
+        """
+        Calls function on the save thread, after the saves already submitted, so it never
+        overlaps a save, and passes its result to callback there
+        """
+        with self._lock:
+            future = self._executor.submit(lambda: callback(function()))
+        future.add_done_callback(self._log_failure)
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    def _submit(self):
+        with self._lock:
+            self._timer = None
+            self._future = self._executor.submit(self.store.flush)
+            self._future.add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(future: Future):
+        if future.exception() is not None:
+            logging.error("Saving tasks failed", exc_info=future.exception())
@@ -0,0 +1,103 @@
+"""
+Contains the search index: finds tasks by the words of their titles without reading every title
+"""
+import bisect
+import re
+
+# Title words are runs of letters, digits and underscores, compared in lower case
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> set[str]:
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+
+class TaskSearchIndex:
+    """
+    Inverted index from title words to task ids.
+    Every query word matches the title words it is a prefix of, so results show up while
+    a word is still being typed. Prefixes are looked up with bisect in the sorted list of
+    known words instead of being stored, so the index holds each word once.
+    """
+
+    def __init__(self):
+        self._ids_by_token = {}
+        # every key of _ids_by_token, sorted for prefix lookups; None until the next search
+        self._tokens = []
+
+    def __len__(self) -> int:
+        return len(self._ids_by_token)
+
+    def add_tasks(self, tasks):
+        """
+        Indexes many tasks at once. The words are sorted again by the next search, not per word.
+        Args:
+            tasks: iterable of Task objects
+
+        """
+        ids_by_token = self._ids_by_token
+        for task in tasks:
+            for token in tokenize(task.title):
+                task_ids = ids_by_token.get(token)
+                if task_ids is None:
+                    ids_by_token[token] = {task.id}
+                else:
+                    task_ids.add(task.id)
+        self._tokens = None
+
+    def add(self, task_id: str, title: str):
+        for token in tokenize(title):
+            task_ids = self._ids_by_token.get(token)
+            if task_ids is None:
+                self._ids_by_token[token] = {task_id}
+                if self._tokens is not None:
+                    bisect.insort(self._tokens, token)
+            else:
+                task_ids.add(task_id)
+
+    def remove(self, task_id: str, title: str):
+        for token in tokenize(title):
+            task_ids = self._ids_by_token.get(token)
+            if task_ids is None:
+                continue
+            task_ids.discard(task_id)
+            if not task_ids:
+                del self._ids_by_token[token]
+                if self._tokens is not None:
+                    del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def rename(self, task_id: str, old_title: str, new_title: str):
+        self.remove(task_id, old_title)
+        self.add(task_id, new_title)
+
+    def search(self, query: str) -> set[str]:
+        """
+        Finds the tasks whose titles have a word starting with each word of the query
+        Args:
+            query: text typed into the search bar
+
+        Returns: ids of the matching tasks (all of them are matched by every query word)
+
+        """
+        words = tokenize(query)
+        if not words:
+            return set()
+
+        # intersect the smallest candidate sets first
+        candidates = sorted((self._prefix_ids(word) for word in words), key=len)
+        result = set(candidates[0])
+        for task_ids in candidates[1:]:
+            if not result:
+                break
+            result.intersection_update(task_ids)
+        return result
+
+    def _prefix_ids(self, prefix: str) -> set[str]:
+        if self._tokens is None:
+            self._tokens = sorted(self._ids_by_token)
+        first = bisect.bisect_left(self._tokens, prefix)
+        # every word starting with prefix sorts before prefix + the highest code point
+        last = bisect.bisect_left(self._tokens, prefix + "\U0010ffff", first)
+        if last - first == 1:
+            return self._ids_by_token[self._tokens[first]]
+        return set().union(*map(self._ids_by_token.__getitem__, self._tokens[first:last]))
@@ -0,0 +1,373 @@
+"""
+Contains the SQLite task store, for task lists too large to keep in memory
+"""
+import logging
+import sqlite3
+import threading
+from collections.abc import Sequence
+from pathlib import Path
+
+from instrumentation import timed
+from task import Task
+from task_codec import CorruptTasksFile
+
+# Task titles are already normalized by Task, so the unique index on title is the dedup rule
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    task_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    is_completed INTEGER NOT NULL,
+    position REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_task_id ON tasks (task_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_title ON tasks (title);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_position ON tasks (is_completed, position);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class SqliteTaskList(Sequence):
+    """
+    Read-only view of the pending or completed tasks in the database.
+    Slices are read with LIMIT/OFFSET, so only the requested page is loaded.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, is_completed: bool):
+        self._connection = connection
+        self._is_completed = int(is_completed)
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM tasks WHERE is_completed = ?",
+                                        (self._is_completed,)).fetchone()[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                raise ValueError("SqliteTaskList slices do not support a step")
+            start, stop = index.start or 0, index.stop
+            if start < 0 or stop is None or stop < 0:
+                start, stop, _ = index.indices(len(self))
+            return self._page(limit=max(stop - start, 0), offset=start)
+
+        if index < 0:
+            index += len(self)
+        page = self._page(limit=1, offset=index) if index >= 0 else []
+        if not page:
+            raise IndexError("task index out of range")
+        return page[0]
+
+    def __iter__(self):
+        cursor = self._connection.execute(
+            "SELECT task_id, title, is_completed, position FROM tasks WHERE is_completed = ? ORDER BY position",
+            (self._is_completed,))
+        for task_id, title, is_completed, position in cursor:
+            yield Task(title, bool(is_completed), task_id, position)
+
+    def _page(self, limit: int, offset: int) -> list[Task]:
+        rows = self._connection.execute(
+            "SELECT task_id, title, is_completed, position FROM tasks WHERE is_completed = ? "
+            "ORDER BY position LIMIT ? OFFSET ?",
+            (self._is_completed, limit, offset)).fetchall()
+        return [Task(title, bool(is_completed), task_id, position) for task_id, title, is_completed, position in rows]
+
+
+class SqliteTaskStore:
+    """
+    Task store backed by a SQLite database in WAL mode.
+    Has the same interface as TaskStore, but its pending and completed lists are
+    SqliteTaskList views, so tasks are only read when a view asks for them.
+    Changes stay in an open transaction until flush() commits them.
+    Tasks are ordered by their position column: a moved task gets a position between its new
+    neighbours', found through the (is_completed, position) index, so a move updates one row.
+    """
+    BATCH_SIZE = 10_000
+    # values per IN (...) query, below SQLite's limit on query parameters
+    QUERY_CHUNK_SIZE = 500
+    # tasks can be put anywhere in their lists with reorder()
+    can_reorder = True
+
+    def __init__(self, path: Path, json_path: Path = None):
+        self.path = Path(path)
+        self.json_path = Path(json_path) if json_path else None
+        self.connection = None
+        self.pending = None
+        self.completed = None
+        # flush() may commit from a worker thread
+        self._lock = threading.RLock()
+
+    @property
+    def tasks(self):
+        yield from self.pending
+        yield from self.completed
+
+    @timed("store.load")
+    def load(self) -> tuple[SqliteTaskList, SqliteTaskList]:
+        """
+        Opens the database, creating it from the JSON tasks file on first run
+        Returns: (pending tasks, completed tasks) as lazy views
+
+        """
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._upgrade_schema()
+        self.connection.executescript(SCHEMA)
+
+        self.pending = SqliteTaskList(self.connection, False)
+        self.completed = SqliteTaskList(self.connection, True)
+
+        if self._needs_migration():
+            self._migrate_from_json()
+
+        logging.info("SQLITE - Opened %s", self.path.name)
+        return self.pending, self.completed
+
+    def get(self, task_id: str) -> Task:
+        row = self.connection.execute("SELECT task_id, title, is_completed, position FROM tasks WHERE task_id = ?",
+                                      (task_id,)).fetchone()
+        return Task(row[1], bool(row[2]), row[0], row[3]) if row else None
+
+    def get_by_title(self, title: str) -> Task:
+        row = self.connection.execute("SELECT task_id, title, is_completed, position FROM tasks WHERE title = ?",
+                                      (Task.normalize_title(title),)).fetchone()
+        return Task(row[1], bool(row[2]), row[0], row[3]) if row else None
+
+    def contains_title(self, title: str) -> bool:
+        row = self.connection.execute("SELECT 1 FROM tasks WHERE title = ?",
+                                      (Task.normalize_title(title),)).fetchone()
+        return row is not None
+
+    def taken_titles(self, titles) -> set[str]:
+        """
+        Checks many normalized titles with a few IN queries
+        Returns: the titles a task already has
+
+        """
+        return self._existing_values("title", titles)
+
+    def taken_ids(self, task_ids) -> set[str]:
+        return self._existing_values("task_id", task_ids)
+
+    @property
+    def dirty(self) -> bool:
+        return self.connection is not None and self.connection.in_transaction
+
+    def add(self, task: Task):
+        with self._lock:
+            task.position = self._last_position(task.is_completed) + 1
+            self.connection.execute(
+                "INSERT INTO tasks (task_id, title, is_completed, position) VALUES (?, ?, ?, ?)",
+                (task.id, task.title, int(task.is_completed), task.position))
+
+    def add_many(self, tasks):
+        """
+        Adds tasks at the end of their lists, committing once per BATCH_SIZE tasks
+        Args:
+            tasks: iterable of Task objects
+
+        """
+        positions = {False: self._last_position(False), True: self._last_position(True)}
+
+        def rows():
+            for task in tasks:
+                positions[task.is_completed] += 1
+                task.position = positions[task.is_completed]
+                yield task.id, task.title, int(task.is_completed), task.position
+
+        batch = []
+        for row in rows():
+            batch.append(row)
+            if len(batch) >= self.BATCH_SIZE:
+                self._insert_batch(batch)
+                batch = []
+        if batch:
+            self._insert_batch(batch)
+
+    def delete(self, task_id: str):
+        self.delete_tasks([task_id])
+
+    def delete_tasks(self, task_ids: list[str]):
+        with self._lock:
+            self.connection.executemany("DELETE FROM tasks WHERE task_id = ?",
+                                        ((task_id,) for task_id in dict.fromkeys(task_ids)))
+
+    def set_completed(self, task_id: str, status: bool):
+        """
+        Changes the completion status of a task and moves it to the top of its new list
+        Args:
+            task_id: id of the task to change
+            status: new completion status
+
+        """
+        self.move_tasks([task_id], status)
+
+    def move_tasks(self, task_ids: list[str], completed: bool) -> list[float]:
+        """
+        Changes the completion status of many tasks and moves them, in the given order,
+        to the top of their new list with one statement
+        Args:
+            task_ids: ids of the tasks to move
+            completed: new completion status
+
+        Returns: the new positions of the tasks
+
+        """
+        task_ids = list(dict.fromkeys(task_ids))
+        with self._lock:
+            positions = Task.positions_between(None, self._first_position(completed), len(task_ids))
+            self._set_positions(task_ids, completed, positions)
+            return positions
+
+    def reorder(self, task_ids: list[str], completed: bool, before_id: str = None) -> list[float]:
+        """
+        Moves tasks, in the given order, to a place in the pending or completed list, changing
+        their status if they come from the other one. Only the moved rows are updated, unless
+        the neighbours' positions are too close: then the list is renumbered first.
+        Args:
+            task_ids: ids of the tasks to move
+            completed: status of the list to move them to
+            before_id: id of the task to put them above, not one of the moved tasks; None for the bottom
+
+        Returns: the new positions of the tasks
+
+        """
+        task_ids = list(dict.fromkeys(task_ids))
+        with self._lock:
+            if before_id in task_ids:
+                raise ValueError("The tasks can only be put above another task of the list they move to")
+            positions = Task.positions_between(*self._neighbour_positions(completed, before_id), len(task_ids))
+            if positions is None:
+                self._renumber(completed)
+                positions = Task.positions_between(*self._neighbour_positions(completed, before_id), len(task_ids))
+            self._set_positions(task_ids, completed, positions)
+            return positions
+
+    def rename(self, task_id: str, title: str):
+        with self._lock:
+            self.connection.execute("UPDATE tasks SET title = ? WHERE task_id = ?",
+                                    (Task.normalize_title(title), task_id))
+
+    @timed("store.flush")
+    def flush(self, compact: bool = False):
+        """
+        Commits the changes made since the last flush in one transaction
+        Args:
+            compact: True to also fold the write-ahead log back into the database file
+
+        """
+        with self._lock:
+            self.connection.commit()
+            if compact:
+                self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        logging.info("SQLITE - Tasks saved")
+
+    def compact(self):
+        self.flush(compact=True)
+
+    # other programs' changes to the database are not reloaded: there are no files to watch
+    watch_paths = ()
+
+    def read_changes(self):
+        return None
+
+    def apply_changes(self, changes) -> bool:
+        return True
+
+    def close(self):
+        if self.connection is not None:
+            self.compact()
+            self.connection.close()
+            self.connection = None
+
+    def _insert_batch(self, rows: list):
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO tasks (task_id, title, is_completed, position) VALUES (?, ?, ?, ?)", rows)
+
+    def _existing_values(self, column: str, values) -> set[str]:
+        values = list(values)
+        found = set()
+        for start in range(0, len(values), self.QUERY_CHUNK_SIZE):
+            chunk = values[start:start + self.QUERY_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self.connection.execute(f"SELECT {column} FROM tasks WHERE {column} IN ({placeholders})", chunk)
+            found.update(value for value, in rows)
+        return found
+
+    def _first_position(self, is_completed: bool) -> float:
+        position = self.connection.execute("SELECT MIN(position) FROM tasks WHERE is_completed = ?",
+                                           (int(is_completed),)).fetchone()[0]
+        return position if position is not None else 0.0
+
+    def _neighbour_positions(self, is_completed: bool, before_id: str) -> tuple[float, float]:
+        # (position of the task above the place, or None at the top; of the task before_id, or None at the bottom)
+        if before_id is None:
+            position = self.connection.execute("SELECT MAX(position) FROM tasks WHERE is_completed = ?",
+                                               (int(is_completed),)).fetchone()[0]
+            return position, None
+        row = self.connection.execute("SELECT is_completed, position FROM tasks WHERE task_id = ?",
+                                      (before_id,)).fetchone()
+        if row is None or bool(row[0]) != is_completed:
+            raise ValueError("The tasks can only be put above another task of the list they move to")
+        previous = self.connection.execute("SELECT MAX(position) FROM tasks WHERE is_completed = ? AND position < ?",
+                                           (int(is_completed), row[1])).fetchone()[0]
+        return previous, row[1]
+
+    def _set_positions(self, task_ids: list[str], is_completed: bool, positions: list[float]):
+        self.connection.executemany("UPDATE tasks SET is_completed = ?, position = ? WHERE task_id = ?",
+                                    ((int(is_completed), position, task_id)
+                                     for task_id, position in zip(task_ids, positions)))
+
+    def _renumber(self, is_completed: bool):
+        # spaces the positions of a list evenly again, keeping its order; committed by the next flush
+        rows = self.connection.execute("SELECT id FROM tasks WHERE is_completed = ? ORDER BY position",
+                                       (int(is_completed),)).fetchall()
+        self.connection.executemany("UPDATE tasks SET position = ? WHERE id = ?",
+                                    ((float(number), row_id) for number, (row_id,) in enumerate(rows, 1)))
+        logging.info("SQLITE - Renumbered the positions of %d tasks", len(rows))
+
+    def _last_position(self, is_completed: bool) -> float:
+        position = self.connection.execute("SELECT MAX(position) FROM tasks WHERE is_completed = ?",
+                                           (int(is_completed),)).fetchone()[0]
+        return position if position is not None else 0.0
+
+    def _upgrade_schema(self):
+        # databases created before tasks had ids get a task_id column filled with new ids
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(tasks)")]
+        if not columns or "task_id" in columns:
+            return
+        with self.connection:
+            self.connection.execute("ALTER TABLE tasks ADD COLUMN task_id TEXT NOT NULL DEFAULT ''")
+            rows = self.connection.execute("SELECT id FROM tasks").fetchall()
+            self.connection.executemany("UPDATE tasks SET task_id = ? WHERE id = ?",
+                                        ((Task.new_id(), row_id) for row_id, in rows))
+        logging.info("SQLITE - Gave ids to %d tasks", len(rows))
+
+    def _needs_migration(self) -> bool:
+        # imported here: task_store imports this module to open the SQLite backend
+        from task_store import TaskStore
+
+        if self.json_path is None or not TaskStore(self.json_path).exists:
+            return False
+        migrated = self.connection.execute("SELECT value FROM meta WHERE key = 'migrated_from'").fetchone()
+        return migrated is None
+
+    def _migrate_from_json(self):
+        # imported here: task_store imports this module to open the SQLite backend
+        from task_store import read_tasks
+
+        # read only: another program may still use the JSON files
+        try:
+            pending, completed = read_tasks(self.json_path)
+        except CorruptTasksFile:
+            logging.error("SQLITE - %s is not valid, left it as it is and started empty", self.json_path.name)
+            pending, completed = [], []
+        self.add_many(pending + completed)
+        with self.connection:
+            self.connection.execute("INSERT INTO meta (key, value) VALUES ('migrated_from', ?)",
+                                    (self.json_path.name,))
+        logging.info("SQLITE - Migrated %d tasks from %s", len(pending) + len(completed), self.json_path.name)
@@ -0,0 +1,117 @@
+"""
+Stress-tests several processes sharing one tasks file: each adds and toggles tasks through its
+own TaskManager at the same time as the others, saving after every change like the command line.
+Usage:
+    python stress.py                                 (1, 2, 4 and 8 processes, 2000 changes each)
+    python stress.py --processes 4 --operations 5000
+Every process adds tasks with titles of its own and toggles one of them at random after every
+TOGGLE_EVERY changes. Once all processes are closed the file is loaded again: every task has
+to be there, with the status its process gave it last. Exit code 1 when an update was lost.
+"""
+import argparse
+import logging
+import multiprocessing
+import queue
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from task_manager import TaskManager
+from task_store import BACKEND_JSON, TaskStore
+
+# every this many changes, a process toggles one of its tasks instead of adding one
+TOGGLE_EVERY = 3
+
+
+def run_process(path: Path, number: int, operations: int, start, results):
+    """
+    Adds and toggles tasks, then sends (number, {task id: expected status}, seconds) to results
+    Args:
+        path: tasks file shared by every process
+        number: process number, part of the titles
+        operations: changes to make
+        start: barrier the processes start at together
+        results: queue for the outcome
+
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+    manager = TaskManager(path, BACKEND_JSON)
+    manager.load()
+    generator = random.Random(number)
+    tasks = []
+    expected = {}
+
+    start.wait()
+    started = time.perf_counter()
+    for operation in range(operations):
+        if tasks and operation % TOGGLE_EVERY == 0:
+            task = generator.choice(tasks)
+            manager.move_tasks([task], not task.is_completed)
+        else:
+            task = manager.add(f"process {number} task {operation}")
+            tasks.append(task)
+        expected[task.id] = task.is_completed
+    manager.close()
+    results.put((number, expected, time.perf_counter() - started))
+
+
+def run_stress(processes: int, operations: int, directory: Path) -> dict:
+    """
+    Runs processes at the same time on one new tasks file and checks the file afterwards
+    Returns: {"seconds": time until the last process closed, "operations": changes made,
+        "lost": updates missing from the file}
+
+    """
+    path = directory / f"stress_{processes}.json"
+    start = multiprocessing.Barrier(processes)
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=run_process, args=(path, number, operations, start, results))
+               for number in range(processes)]
+    for worker in workers:
+        worker.start()
+    outcomes = []
+    while len(outcomes) < len(workers):
+        try:
+            outcomes.append(results.get(timeout=1))
+        except queue.Empty:
+            if all(worker.exitcode is not None for worker in workers):
+                # a process failed before sending its outcome: all its changes count as lost
+                break
+    for worker in workers:
+        worker.join()
+    failed_processes = len(workers) - len(outcomes)
+
+    store = TaskStore(path)
+    store.load()
+    lost = failed_processes * operations
+    for _, expected, _ in outcomes:
+        for task_id, is_completed in expected.items():
+            task = store.get(task_id)
+            if task is None or task.is_completed != is_completed:
+                lost += 1
+    seconds = max((seconds for _, _, seconds in outcomes), default=float("nan"))
+    return {"seconds": seconds, "operations": processes * operations, "lost": lost}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Stress-test processes sharing one tasks file")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8], help="process counts to run")
+    parser.add_argument("--operations", type=int, default=2000, help="changes per process (default: %(default)s)")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    failed = False
+    print(f"{'processes':>9} {'changes':>9} {'seconds':>9} {'changes/s':>10} {'lost':>6}")
+    for processes in args.processes:
+        with tempfile.TemporaryDirectory() as directory:
+            result = run_stress(processes, args.operations, Path(directory))
+        failed = failed or result["lost"] > 0
+        print(f"{processes:>9} {result['operations']:>9,} {result['seconds']:>9.2f} "
+              f"{result['operations'] / result['seconds']:>10,.0f} {result['lost']:>6}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,38 +2,118 @@
 Contains the app's main logic
 """
 import logging
+import os
 
 # noinspection PyUnresolvedReferences
 import logging_config
 
+# Positions between two neighbours closer than this (relative to their size) would soon stop
+# being representable as floats: the list is renumbered instead
+POSITION_PRECISION = 2 ** -32
+
+
+class TaskError(ValueError):
+    """
+    A task change was refused; the message can be shown to the user as it is
+    """
+
 
 class Task:
-    def __init__(self, title: str, is_completed: bool = False):
-        self.title = title.strip().capitalize()
+    # no per-instance __dict__: large task lists are mostly Task objects
+    __slots__ = ("id", "title", "is_completed", "position")
+
+    def __init__(self, title: str, is_completed: bool = False, task_id: str = None, position: float = 0.0):
+        self.id = task_id or Task.new_id()
+        self.title = Task.normalize_title(title)
         self.is_completed = is_completed
+        # order key within the task's list: lists are sorted by position, lowest first
+        self.position = position
 
     def __str__(self):
         return self.title
 
+    @staticmethod
+    def new_id() -> str:
+        """
+        Creates a task id: 16 random hex digits, so tasks created by different
+        processes do not collide
+        Returns: new task id
+
+        """
+        # what secrets.token_hex does, without importing secrets (and hashlib) on every start
+        return os.urandom(8).hex()
+
+    @staticmethod
+    def new_ids(count: int) -> list[str]:
+        """
+        Creates many task ids from one call to the random source
+        Args:
+            count: number of ids
+
+        Returns: list of new task ids
+
+        """
+        digits = os.urandom(8 * count).hex()
+        return [digits[start:start + 16] for start in range(0, len(digits), 16)]
+
+    @staticmethod
+    def normalize_title(title: str) -> str:
+        """
+        Applies the rule every task title goes through, so titles can be compared for duplicates
+        Args:
+            title: title as typed
+
+        Returns: normalized title
+
+        """
+        return title.strip().capitalize()
+
+    @staticmethod
+    def positions_between(previous: float, following: float, count: int) -> list[float]:
+        """
+        Gives count tasks order keys between two neighbours, so they can be placed without
+        changing any other task
+        Args:
+            previous: position of the task above, or None at the top of the list
+            following: position of the task below, or None at the bottom of the list
+            count: number of positions
+
+        Returns: ascending positions, or None when the neighbours are too close (renumber the list first)
+
+        """
+        if previous is None and following is None:
+            return [float(number) for number in range(1, count + 1)]
+        if previous is None:
+            return [following - count + number for number in range(count)]
+        if following is None:
+            return [previous + 1 + number for number in range(count)]
+        step = (following - previous) / (count + 1)
+        if step < POSITION_PRECISION * max(1.0, abs(previous), abs(following)):
+            return None
+        return [previous + step * number for number in range(1, count + 1)]
+
     def change_completion_status(self, status: bool):
         self.is_completed = status
-        logging.info("Marked as completed")
+        logging.debug("Task %s - completion status set to %s", self.id, status)
 
     def to_dict(self):
         """
         Converts Task instances to dictionaries
-        Returns: Dictionary with title and is_completed keys
+        Returns: Dictionary with id, title, is_completed and position keys
 
         """
         return {
+            "id": self.id,
             "title": self.title,
-            "is_completed": self.is_completed
+            "is_completed": self.is_completed,
+            "position": self.position
         }
 
     @staticmethod
     def from_dict(data: dict):
         """
-        Converts dictionary data to Task class instance with title and completion status
+        Converts dictionary data to Task class instance with id, title, completion status and position.
+        Records saved before tasks had ids get a new one.
         Args:
             data: list containing dictionaries
 
@@ -42,7 +122,9 @@ class Task:
         """
         return Task(
             title=data.get("title"),
-            is_completed=data.get("is_completed")
+            is_completed=data.get("is_completed"),
+            task_id=data.get("id"),
+            position=data.get("position", 0.0)
         )
 
     def check_task_title_length(self):
@@ -0,0 +1,212 @@
+"""
+Contains the command line interface: changes the tasks without starting the GUI (PySide6 is never imported).
+Usage:
+    python -m task_cli add "Buy milk"            (no titles: one title per stdin line)
+    python -m task_cli done <id or title>...     (--undo moves tasks back to pending)
+    python -m task_cli rm <id or title>...
+    python -m task_cli mv <id or title>... --before <id or title>   (no --before: to the bottom of their lists)
+    python -m task_cli ls --status pending
+    python -m task_cli import tasks.ndjson       (no file or "-": stdin; --format json, ndjson or csv)
+    python -m task_cli export backup.csv         (no file or "-": stdout; the format follows the suffix)
+"""
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+import instrumentation
+import task_io
+from task_codec import FORMATS as STORE_FORMATS
+from task_manager import (TaskManager, TaskError, JSON_FILE_PATH, STORE_BACKEND, STORE_FORMAT,
+                          STATUS_ALL, STATUS_PENDING, STATUS_COMPLETED)
+from task_store import BACKENDS
+
+
+def _read_arguments_or_stdin(values: list[str]):
+    # no values (or "-") means one value per line of stdin, so commands can be piped together
+    if values and values != ["-"]:
+        yield from values
+        return
+    for line in sys.stdin:
+        line = line.rstrip("\n")
+        if line.strip():
+            yield line
+
+
+def _find_tasks(manager: TaskManager, references) -> tuple[list, int]:
+    # by id, so a task given twice (or by id and by title) is changed once
+    tasks = {}
+    missing = 0
+    for reference in references:
+        # ls prints "id<TAB>status<TAB>title": accept its lines as they are
+        task = manager.find(reference.split("\t", 1)[0])
+        if task is None:
+            print(f"No task {reference!r}", file=sys.stderr)
+            missing += 1
+        else:
+            tasks.setdefault(task.id, task)
+    return list(tasks.values()), missing
+
+
+def command_add(manager: TaskManager, args: argparse.Namespace) -> int:
+    failed = 0
+    for title in _read_arguments_or_stdin(args.titles):
+        try:
+            task = manager.add(title)
+        except TaskError as error:
+            print(f"{error}: {title!r}", file=sys.stderr)
+            failed += 1
+            continue
+        print(f"{task.id}\t{task.title}")
+    return 1 if failed else 0
+
+
+def command_done(manager: TaskManager, args: argparse.Namespace) -> int:
+    tasks, missing = _find_tasks(manager, _read_arguments_or_stdin(args.tasks))
+    manager.move_tasks(tasks, not args.undo)
+    return 1 if missing else 0
+
+
+def command_rm(manager: TaskManager, args: argparse.Namespace) -> int:
+    tasks, missing = _find_tasks(manager, _read_arguments_or_stdin(args.tasks))
+    manager.delete_tasks(tasks)
+    return 1 if missing else 0
+
+
+def command_mv(manager: TaskManager, args: argparse.Namespace) -> int:
+    tasks, missing = _find_tasks(manager, _read_arguments_or_stdin(args.tasks))
+    before = None
+    if args.before is not None:
+        before = manager.find(args.before)
+        if before is None:
+            print(f"No task {args.before!r}", file=sys.stderr)
+            return 1
+        tasks = [task for task in tasks if task.id != before.id]
+    try:
+        if before is not None:
+            # the tasks join the list of the task they are put above
+            manager.reorder(tasks, before.is_completed, before)
+        else:
+            for completed in (False, True):
+                manager.reorder([task for task in tasks if task.is_completed == completed], completed)
+    except TaskError as error:
+        print(error, file=sys.stderr)
+        return 1
+    return 1 if missing else 0
+
+
+def command_ls(manager: TaskManager, args: argparse.Namespace) -> int:
+    write = sys.stdout.write
+    for task in manager.tasks(args.status):
+        write(f"{task.id}\t{STATUS_COMPLETED if task.is_completed else STATUS_PENDING}\t{task.title}\n")
+    return 0
+
+
+def _report_reject(number: int, reason: str):
+    print(f"Rejected record {number}: {reason}", file=sys.stderr)
+
+
+def _report_progress(read: int, added: int, rejected: int):
+    if sys.stderr.isatty():
+        print(f"\r{read:,} records read, {added:,} added, {rejected:,} rejected", end="", file=sys.stderr)
+
+
+def command_import(manager: TaskManager, args: argparse.Namespace) -> int:
+    file_format = args.format or task_io.format_for_path(args.source)
+    read_records = task_io.READERS[file_format]
+    if args.source == "-":
+        sys.stdin.reconfigure(newline="")
+        added, rejected = manager.import_tasks(read_records(sys.stdin), _report_reject, _report_progress)
+    else:
+        with open(args.source, 'r', newline="") as file:
+            added, rejected = manager.import_tasks(read_records(file), _report_reject, _report_progress)
+    if sys.stderr.isatty():
+        print(file=sys.stderr)
+    print(f"Imported {added} tasks, rejected {rejected}", file=sys.stderr)
+    return 1 if rejected else 0
+
+
+def command_export(manager: TaskManager, args: argparse.Namespace) -> int:
+    file_format = args.format or task_io.format_for_path(args.destination)
+    if args.destination == "-":
+        sys.stdout.reconfigure(newline="")
+        manager.export_tasks(sys.stdout, args.status, file_format)
+        if file_format == task_io.FORMAT_JSON:
+            sys.stdout.write("\n")
+    else:
+        with open(args.destination, 'w', newline="") as file:
+            manager.export_tasks(file, args.status, file_format)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m task_cli", description="Manage tasks without the GUI")
+    parser.add_argument("--file", type=Path, default=JSON_FILE_PATH, help="JSON tasks file (default: %(default)s)")
+    parser.add_argument("--backend", default=STORE_BACKEND, choices=BACKENDS,
+                        help="task store backend (default: %(default)s)")
+    parser.add_argument("--store-format", default=STORE_FORMAT, choices=STORE_FORMATS,
+                        help="format the json backend saves in; files load in any format (default: %(default)s)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log what the store does")
+    commands = parser.add_subparsers(dest="command_name", required=True)
+
+    add = commands.add_parser("add", help="add pending tasks")
+    add.add_argument("titles", nargs="*", help="task titles (default: one per stdin line)")
+    add.set_defaults(command=command_add)
+
+    done = commands.add_parser("done", help="mark tasks as completed")
+    done.add_argument("tasks", nargs="*", help="task ids or titles (default: one per stdin line)")
+    done.add_argument("--undo", action="store_true", help="mark the tasks as pending instead")
+    done.set_defaults(command=command_done)
+
+    rm = commands.add_parser("rm", help="delete tasks")
+    rm.add_argument("tasks", nargs="*", help="task ids or titles (default: one per stdin line)")
+    rm.set_defaults(command=command_rm)
+
+    mv = commands.add_parser("mv", help="move tasks above another task, or to the bottom of their lists")
+    mv.add_argument("tasks", nargs="*", help="task ids or titles (default: one per stdin line)")
+    mv.add_argument("--before", help="id or title of the task to put them above; tasks from its other list change status")
+    mv.set_defaults(command=command_mv)
+
+    for name, help_text in (("ls", "list tasks as id<TAB>status<TAB>title lines"),
+                            ("export", "write tasks as JSON, NDJSON or CSV")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--status", default=STATUS_ALL, choices=[STATUS_ALL, STATUS_PENDING, STATUS_COMPLETED])
+        if name == "ls":
+            command.set_defaults(command=command_ls)
+        else:
+            command.add_argument("destination", nargs="?", default="-", help="file to write (default: stdout)")
+            command.add_argument("--format", choices=task_io.FORMATS, help="default: from the file suffix, else json")
+            command.set_defaults(command=command_export)
+
+    import_ = commands.add_parser("import", help="add tasks from JSON, NDJSON or CSV, skipping invalid records")
+    import_.add_argument("source", nargs="?", default="-", help="file to read (default: stdin)")
+    import_.add_argument("--format", choices=task_io.FORMATS, help="default: from the file suffix, else json")
+    import_.set_defaults(command=command_import)
+
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+
+    manager = TaskManager(args.file, args.backend, file_format=args.store_format)
+    try:
+        manager.load()
+    except TaskError as error:
+        print(error, file=sys.stderr)
+        return 1
+    try:
+        return args.command(manager, args)
+    except BrokenPipeError:
+        # the reader (e.g. head) stopped early: drop the rest of the output, still save below
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    finally:
+        manager.close()
+        instrumentation.log_summary()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,403 @@
+"""
+Contains the task file codecs: how the task store encodes its snapshot, and how the format
+of a tasks file is recognized when it is read back.
+Formats:
+    json     the original layout of json.dump(..., indent=4)
+    compact  a JSON array without indentation, COMPACT_BATCH_SIZE tasks per line, encoded and
+             decoded with orjson or msgspec when one of them is installed
+    binary   BINARY_MAGIC, then one length-prefixed record per task
+Every reader yields (id, title, is_completed, position) tuples; id is None for tasks saved before
+tasks had ids, and position for tasks saved before tasks had positions. Writers take the same tuples.
+"""
+import io
+import itertools
+import json
+import struct
+
+# Optional faster JSON libraries for the compact format
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+FORMAT_JSON = "json"
+FORMAT_COMPACT = "compact"
+FORMAT_BINARY = "binary"
+FORMATS = (FORMAT_JSON, FORMAT_COMPACT, FORMAT_BINARY)
+
+# Size of the pieces the tasks file is read in
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(json_file, chunk_size: int = CHUNK_SIZE):
+    """
+    Yields the items of a top-level JSON array one at a time, without decoding the whole file
+    Args:
+        json_file: text file opened for reading
+        chunk_size: number of characters read at a time
+
+    Returns: generator of decoded items
+
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    end_of_file = False
+
+    def read_more() -> bool:
+        nonlocal buffer, position, end_of_file
+        chunk = json_file.read(chunk_size)
+        if not chunk:
+            end_of_file = True
+            return False
+        # drop what was already decoded so only one item is held in memory
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def skip_whitespace() -> bool:
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer):
+                return True
+            if not read_more():
+                return False
+
+    if not skip_whitespace() or buffer[position] != "[":
+        raise json.JSONDecodeError("Expecting '['", buffer, position)
+    position += 1
+
+    expecting_item = True
+    item_count = 0
+    while True:
+        if not skip_whitespace():
+            raise json.JSONDecodeError("Unterminated array", buffer, position)
+
+        character = buffer[position]
+        if character == "]":
+            if expecting_item and item_count:
+                raise json.JSONDecodeError("Expecting value", buffer, position)
+            return
+        if character == ",":
+            if expecting_item:
+                raise json.JSONDecodeError("Expecting value", buffer, position)
+            expecting_item = True
+            position += 1
+            continue
+        if not expecting_item:
+            raise json.JSONDecodeError("Expecting ',' delimiter", buffer, position)
+
+        # decode one item, reading more of the file while it is incomplete
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if end_of_file or not read_more():
+                    raise
+                continue
+            if end == len(buffer) and not end_of_file and read_more():
+                # a number or literal may continue in the next chunk
+                continue
+            break
+
+        position = end
+        expecting_item = False
+        item_count += 1
+        yield item
+
+
+_encode_string = json.JSONEncoder().encode
+
+
+def write_tasks_json(json_file, rows):
+    """
+    Writes tasks in the layout of json.dump(..., indent=4) without building a dict per task
+    Args:
+        json_file: text file opened for writing
+        rows: iterable of (id, title, is_completed, position) tuples, or of (id, title, is_completed)
+            tuples to leave the positions out (exports)
+
+    """
+    rows = iter(rows)
+    first_row = next(rows, None)
+    if first_row is None:
+        json_file.write("[]")
+        return
+
+    # one write per task: the loop is picked once instead of checking every row for a position
+    write = json_file.write
+    separator = "[\n    {\n"
+    if len(first_row) == 4:
+        for task_id, title, is_completed, position in itertools.chain([first_row], rows):
+            write(f'{separator}        "id": {_encode_string(task_id)},\n'
+                  f'        "title": {_encode_string(title)},\n'
+                  f'        "is_completed": {"true" if is_completed else "false"},\n'
+                  f'        "position": {position!r}\n'
+                  f'    }}')
+            separator = ",\n    {\n"
+    else:
+        for task_id, title, is_completed in itertools.chain([first_row], rows):
+            write(f'{separator}        "id": {_encode_string(task_id)},\n'
+                  f'        "title": {_encode_string(title)},\n'
+                  f'        "is_completed": {"true" if is_completed else "false"}\n'
+                  f'    }}')
+            separator = ",\n    {\n"
+    write("\n]")
+
+# Tasks per line of a compact file
+COMPACT_BATCH_SIZE = 10_000
+# A compact file starts with "[", a newline and the first task as its encoder writes it; JSON
+# files may start so too, so read_compact falls back to read_json
+COMPACT_START = b'[\n{"id":'
+COMPACT_EMPTY = b"[\n]"
+
+# Binary files start with BINARY_MAGIC; each task is a BINARY_RECORD header
+# (completed flag, id length, title length, position) followed by the UTF-8 id and title
+BINARY_MAGIC = b"TASKBIN2"
+BINARY_RECORD = struct.Struct("<BHId")
+# Files written before tasks had positions: the same records without the position
+BINARY_MAGIC_V1 = b"TASKBIN1"
+BINARY_RECORD_V1 = struct.Struct("<BHI")
+# Number of bytes read at a time from a binary file
+BINARY_CHUNK_SIZE = 1024 * 1024
+
+
+class CorruptTasksFile(ValueError):
+    """
+    A tasks file could not be decoded
+    """
+
+
+if msgspec is not None:
+    _DECODE_ERRORS = (ValueError, msgspec.DecodeError)
+else:
+    _DECODE_ERRORS = (ValueError,)
+
+
+def json_library() -> str:
+    # the library the compact format is encoded and decoded with
+    if orjson is not None:
+        return "orjson"
+    if msgspec is not None:
+        return "msgspec"
+    return "json"
+
+
+def _encode_json(items: list) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(items)
+    if msgspec is not None:
+        return msgspec.json.encode(items)
+    return json.dumps(items, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_json(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+def _batches(rows, size: int):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+def _task_tuple(item) -> tuple:
+    if not isinstance(item, dict):
+        raise CorruptTasksFile("A task in the tasks file is not an object")
+    title = item.get("title")
+    if type(title) is not str:
+        raise CorruptTasksFile("A task in the tasks file has no title")
+    task_id = item.get("id")
+    if type(task_id) is not str:
+        # read like a task saved before tasks had ids: it gets a new one
+        task_id = None
+    position = item.get("position")
+    if type(position) not in (int, float):
+        position = None
+    return task_id, title, bool(item.get("is_completed")), position
+
+
+def detect_format(file) -> str:
+    """
+    Recognizes the format of a tasks file from its first bytes, and rewinds it
+    Args:
+        file: binary file opened for reading
+
+    Returns: FORMAT_JSON, FORMAT_COMPACT or FORMAT_BINARY
+
+    """
+    head = file.read(max(len(BINARY_MAGIC), len(COMPACT_START)))
+    file.seek(0)
+    if head.startswith(BINARY_MAGIC) or head.startswith(BINARY_MAGIC_V1):
+        return FORMAT_BINARY
+    if head.startswith(COMPACT_START) or head.startswith(COMPACT_EMPTY):
+        return FORMAT_COMPACT
+    # anything else is read as JSON, so hand-edited files still load
+    return FORMAT_JSON
+
+
+def read_json(file):
+    """
+    Streams the tasks of a JSON array of any layout
+    Args:
+        file: binary file opened for reading
+
+    Returns: generator of (id, title, is_completed, position) tuples
+
+    """
+    text_file = io.TextIOWrapper(file, encoding="utf-8")
+    try:
+        for item in iter_json_array(text_file):
+            yield _task_tuple(item)
+    except json.JSONDecodeError as error:
+        raise CorruptTasksFile(str(error)) from error
+    finally:
+        # leave the binary file open for the caller
+        text_file.detach()
+
+
+def write_json(file, rows):
+    text_file = io.TextIOWrapper(file, encoding="utf-8")
+    write_tasks_json(text_file, rows)
+    text_file.flush()
+    text_file.detach()
+
+
+def read_compact(file):
+    """
+    Reads a compact file one line, so COMPACT_BATCH_SIZE tasks, at a time. A line that is
+    not a batch of tasks means a JSON file that only starts like a compact one, such as a
+    hand-edited one: the rest is read by read_json, which tells whether it is corrupt.
+    Args:
+        file: binary file opened for reading
+
+    Returns: generator of (id, title, is_completed, position) tuples
+
+    """
+    start = file.tell()
+    if file.readline() != b"[\n":
+        raise CorruptTasksFile("Expecting '[' on the first line")
+    count = 0
+    for line in file:
+        if line.startswith(b"]"):
+            return
+        try:
+            items = _decode_json(b"[" + line.rstrip(b",\n") + b"]")
+        except _DECODE_ERRORS:
+            file.seek(start)
+            yield from itertools.islice(read_json(file), count, None)
+            return
+        for item in items:
+            yield _task_tuple(item)
+        count += len(items)
+    raise CorruptTasksFile("Unterminated array")
+
+
+def write_compact(file, rows):
+    """
+    Writes tasks as a JSON array with one line of COMPACT_BATCH_SIZE tasks after another
+    Args:
+        file: binary file opened for writing
+        rows: iterable of (id, title, is_completed, position) tuples
+
+    """
+    separator = b"[\n"
+    for batch in _batches(rows, COMPACT_BATCH_SIZE):
+        encoded = _encode_json([{"id": task_id, "title": title, "is_completed": bool(is_completed),
+                                 "position": float(position)}
+                                for task_id, title, is_completed, position in batch])
+        # drop the brackets of the batch's own array
+        file.write(separator + encoded[1:-1])
+        separator = b",\n"
+    file.write(b"[\n]\n" if separator == b"[\n" else b"\n]\n")
+
+
+def read_binary(file):
+    """
+    Streams the length-prefixed records of a binary file, with or without positions
+    Args:
+        file: binary file opened for reading
+
+    Returns: generator of (id, title, is_completed, position) tuples
+
+    """
+    magic = file.read(len(BINARY_MAGIC))
+    if magic == BINARY_MAGIC:
+        record = BINARY_RECORD
+    elif magic == BINARY_MAGIC_V1:
+        record = BINARY_RECORD_V1
+    else:
+        raise CorruptTasksFile("Not a binary tasks file")
+
+    unpack_from = record.unpack_from
+    header_size = record.size
+    has_position = record is BINARY_RECORD
+    buffer = b""
+    position = 0
+    while chunk := file.read(BINARY_CHUNK_SIZE):
+        # keep the incomplete record at the end of the last chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+        end = len(buffer)
+        while position + header_size <= end:
+            # completed flag, id length, title length and, in new files, the task's position
+            fields = unpack_from(buffer, position)
+            id_start = position + header_size
+            title_start = id_start + fields[1]
+            record_end = title_start + fields[2]
+            if record_end > end:
+                break
+            try:
+                yield (buffer[id_start:title_start].decode("utf-8"), buffer[title_start:record_end].decode("utf-8"),
+                       bool(fields[0]), fields[3] if has_position else None)
+            except UnicodeDecodeError as error:
+                raise CorruptTasksFile(str(error)) from error
+            position = record_end
+
+    if position != len(buffer):
+        raise CorruptTasksFile("The tasks file ends inside a task")
+
+
+def write_binary(file, rows):
+    """
+    Writes BINARY_MAGIC and one length-prefixed record per task
+    Args:
+        file: binary file opened for writing
+        rows: iterable of (id, title, is_completed, position) tuples
+
+    """
+    pack = BINARY_RECORD.pack
+    file.write(BINARY_MAGIC)
+    for batch in _batches(rows, COMPACT_BATCH_SIZE):
+        parts = []
+        for task_id, title, is_completed, position in batch:
+            id_bytes = task_id.encode("utf-8")
+            title_bytes = title.encode("utf-8")
+            parts += (pack(bool(is_completed), len(id_bytes), len(title_bytes), position), id_bytes, title_bytes)
+        file.write(b"".join(parts))
+
+
+def read_tasks(file):
+    """
+    Reads a tasks file in whichever format it was written
+    Args:
+        file: binary file opened for reading
+
+    Returns: generator of (id, title, is_completed, position) tuples
+
+    """
+    return READERS[detect_format(file)](file)
+
+
+READERS = {FORMAT_JSON: read_json, FORMAT_COMPACT: read_compact, FORMAT_BINARY: read_binary}
+WRITERS = {FORMAT_JSON: write_json, FORMAT_COMPACT: write_compact, FORMAT_BINARY: write_binary}
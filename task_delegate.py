@@ -0,0 +1,212 @@
+"""
+Contains the delegate that paints a task card for each row of a task view
+"""
+from collections import OrderedDict
+
+from PySide6 import QtCore, QtGui, QtWidgets
+
+from instrumentation import timed
+from task_model import TaskListModel
+import theme
+
+ACTION_DONE = "done"
+ACTION_EDIT = "edit"
+ACTION_DELETE = "delete"
+
+CARD_SIZE = QtCore.QSize(600, 76)
+CARD_SPACING = 10
+CARD_MARGIN = 11
+BUTTON_SIZE = QtCore.QSize(75, 30)
+BUTTON_SPACING = 6
+TITLE_MAX_WIDTH = 420
+# space above and below a title that wraps over more lines than fit the card height
+TITLE_PADDING = 12
+# titles are measured at their width rounded down to this many pixels, so resizing the window
+# only measures them again when the width moves into another bucket
+TITLE_WIDTH_BUCKET = 20
+# row heights kept, least recently used dropped first, keyed by (title, width bucket, font)
+ROW_HEIGHT_CACHE_SIZE = 20_000
+
+
+class TaskCardDelegate(QtWidgets.QStyledItemDelegate):
+    button_clicked = QtCore.Signal(QtCore.QModelIndex, str)
+
+    def __init__(self, parent: QtCore.QObject = None):
+        super().__init__(parent)
+        self._title_font = QtGui.QFont()
+        self._title_font.setPixelSize(16)
+        self._title_font.setWeight(QtGui.QFont.Weight.Medium)
+        self._button_font = QtGui.QFont()
+        self._title_metrics = QtGui.QFontMetrics(self._title_font)
+        self._title_font_key = self._title_font.key()
+        self._row_heights = OrderedDict()
+        # title width bucket for the last row width asked for: all rows of a view share it
+        self._row_width = None
+        self._title_width_bucket = 0
+        self._is_relayout_due = False
+
+    def sizeHint(self, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex) -> QtCore.QSize:
+        """
+        Cards stretch over the whole width of the list and grow with titles that wrap over more
+        lines than fit CARD_SIZE. The view asks for every fetched row on each layout, so titles
+        are only measured when painted: rows that were not painted in this width bucket yet get
+        the card height, and paint() lays the views out again when a title turns out taller
+        (or, after a resize or an edit, shorter).
+        """
+        if option.widget is None:
+            return CARD_SIZE
+        width = option.widget.viewport().width()
+        # straight from the model: index.data() costs a round trip through Qt for every row
+        model = index.model()
+        if not isinstance(model, TaskListModel):
+            return QtCore.QSize(width, CARD_SIZE.height())
+
+        key = (model.task(index.row()).title, self._bucket_for(width), self._title_font_key)
+        height = self._row_heights.get(key)
+        if height is None:
+            return QtCore.QSize(width, CARD_SIZE.height())
+        self._row_heights.move_to_end(key)
+        return QtCore.QSize(width, height)
+
+    @timed("delegate.paint")
+    def paint(self, painter: QtGui.QPainter, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex):
+        task = index.data(TaskListModel.TaskRole)
+        if task is None:
+            return
+        selected = bool(index.data(TaskListModel.SelectedRole))
+        if option.widget is not None:
+            self._measure_painted_row(task.title, option)
+
+        painter.save()
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+
+        # card
+        card_rect = self._card_rect(option.rect)
+        painter.setPen(QtGui.QPen(theme.CARD_BORDER[selected], 2))
+        painter.setBrush(theme.CARD_BACKGROUND[selected])
+        painter.drawRoundedRect(card_rect, 12, 12)
+
+        # title
+        buttons = self._button_rects(option.rect)
+        title_rect = self._title_rect(option.rect)
+        painter.setFont(self._title_font)
+        painter.setPen(theme.CARD_TEXT)
+        painter.setClipRect(title_rect)
+        painter.drawText(title_rect,
+                         QtCore.Qt.AlignmentFlag.AlignVCenter | QtCore.Qt.TextFlag.TextWordWrap,
+                         task.title)
+        painter.setClipping(False)
+
+        # buttons
+        hovered = self._hovered_action(option, buttons)
+        painter.setFont(self._button_font)
+        for action, rect in buttons.items():
+            self._paint_button(painter, rect, action, task.is_completed, action == hovered)
+
+        painter.restore()
+
+    def editorEvent(self, event: QtCore.QEvent, model: QtCore.QAbstractItemModel,
+                    option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex) -> bool:
+        """
+        Turns clicks on the painted DONE/EDIT/DELETE areas into button_clicked signals
+        Returns: True if the click landed on a button, so the view does not change the selection
+
+        """
+        if event.type() not in (QtCore.QEvent.Type.MouseButtonPress,
+                                QtCore.QEvent.Type.MouseButtonRelease,
+                                QtCore.QEvent.Type.MouseButtonDblClick):
+            return super().editorEvent(event, model, option, index)
+        if event.button() != QtCore.Qt.MouseButton.LeftButton:
+            return super().editorEvent(event, model, option, index)
+
+        action = self.action_at(option.rect, event.position().toPoint())
+        if action is None:
+            return super().editorEvent(event, model, option, index)
+
+        if event.type() == QtCore.QEvent.Type.MouseButtonRelease:
+            self.button_clicked.emit(QtCore.QPersistentModelIndex(index), action)
+        return True
+
+    def action_at(self, rect: QtCore.QRect, pos: QtCore.QPoint):
+        """
+        Finds which button of the card painted in rect is under pos
+        Returns: ACTION_DONE, ACTION_EDIT, ACTION_DELETE or None
+
+        """
+        for action, button_rect in self._button_rects(rect).items():
+            if button_rect.contains(pos):
+                return action
+        return None
+
+    @staticmethod
+    def _card_rect(rect: QtCore.QRect) -> QtCore.QRect:
+        return rect.adjusted(1, 1, -1, -CARD_SPACING - 1)
+
+    def _title_rect(self, rect: QtCore.QRect) -> QtCore.QRect:
+        title_rect = self._card_rect(rect).adjusted(CARD_MARGIN, 0, 0, 0)
+        title_rect.setRight(min(title_rect.left() + TITLE_MAX_WIDTH,
+                                self._button_rects(rect)[ACTION_DONE].left() - BUTTON_SPACING))
+        return title_rect
+
+    def _measure_painted_row(self, title: str, option: QtWidgets.QStyleOptionViewItem):
+        # the first time a title is painted at a width, it is measured; a row laid out with the
+        # wrong height is fixed by one more layout, after the views finish painting
+        key = (title, self._bucket_for(option.widget.viewport().width()), self._title_font_key)
+        if key in self._row_heights:
+            return
+        flags = QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.TextFlag.TextWordWrap
+        title_height = self._title_metrics.boundingRect(QtCore.QRect(0, 0, key[1], 0), flags, title).height()
+        # the card adds its spacing and borders to the title and its padding
+        height = max(CARD_SIZE.height(), title_height + 2 * TITLE_PADDING + CARD_SPACING + 2)
+        self._row_heights[key] = height
+        if len(self._row_heights) > ROW_HEIGHT_CACHE_SIZE:
+            self._row_heights.popitem(last=False)
+        if height != option.rect.height() and not self._is_relayout_due:
+            self._is_relayout_due = True
+            QtCore.QTimer.singleShot(0, self._relayout)
+
+    def _relayout(self):
+        self._is_relayout_due = False
+        self.sizeHintChanged.emit(QtCore.QModelIndex())
+
+    def _bucket_for(self, row_width: int) -> int:
+        if row_width != self._row_width:
+            self._row_width = row_width
+            self._title_width_bucket = self._width_bucket(row_width)
+        return self._title_width_bucket
+
+    def _width_bucket(self, row_width: int) -> int:
+        title_width = self._title_rect(QtCore.QRect(0, 0, row_width, CARD_SIZE.height())).width()
+        # measured narrower than drawn: a title never needs more lines than its row has
+        return max(title_width - title_width % TITLE_WIDTH_BUCKET, TITLE_WIDTH_BUCKET)
+
+    def _button_rects(self, rect: QtCore.QRect) -> dict:
+        card_rect = self._card_rect(rect)
+        top = card_rect.top() + (card_rect.height() - BUTTON_SIZE.height()) // 2
+        right = card_rect.right() - CARD_MARGIN
+
+        rects = {}
+        for action in (ACTION_DELETE, ACTION_EDIT, ACTION_DONE):
+            left = right - BUTTON_SIZE.width() + 1
+            rects[action] = QtCore.QRect(QtCore.QPoint(left, top), BUTTON_SIZE)
+            right = left - BUTTON_SPACING - 1
+        return rects
+
+    @staticmethod
+    def _hovered_action(option: QtWidgets.QStyleOptionViewItem, buttons: dict):
+        if not option.state & QtWidgets.QStyle.StateFlag.State_MouseOver or option.widget is None:
+            return None
+        cursor = option.widget.viewport().mapFromGlobal(QtGui.QCursor.pos())
+        for action, rect in buttons.items():
+            if rect.contains(cursor):
+                return action
+        return None
+
+    @staticmethod
+    def _paint_button(painter: QtGui.QPainter, rect: QtCore.QRect, action: str, is_completed: bool, hovered: bool):
+        style = theme.CARD_BUTTONS[action, is_completed]
+        painter.setPen(QtGui.QPen(style["border"], 1))
+        painter.setBrush(style["hover"] if hovered else style["background"])
+        painter.drawRoundedRect(rect, 15, 15)
+        painter.setPen(style["color"])
+        painter.drawText(rect, QtCore.Qt.AlignmentFlag.AlignCenter, style["text"])
@@ -0,0 +1,148 @@
+"""
+Contains the task file formats for import and export: JSON arrays, NDJSON and CSV.
+Readers and writers are generators over one record at a time, so files of any size
+are streamed instead of loaded.
+"""
+import csv
+import json
+from pathlib import Path
+
+from task_codec import iter_json_array, write_tasks_json
+
+FORMAT_JSON = "json"
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+FORMATS = (FORMAT_JSON, FORMAT_NDJSON, FORMAT_CSV)
+
+# File suffixes format_for_path recognizes; anything else is read as a JSON array
+SUFFIX_FORMATS = {".ndjson": FORMAT_NDJSON, ".jsonl": FORMAT_NDJSON, ".csv": FORMAT_CSV}
+
+# CSV header, in column order
+CSV_FIELDS = ("id", "title", "is_completed")
+CSV_TRUE = {"true", "1", "yes", "x"}
+CSV_FALSE = {"false", "0", "no", ""}
+
+# NDJSON lines decoded with one json.loads call
+NDJSON_BATCH_LINES = 1000
+
+_encode_string = json.JSONEncoder().encode
+
+
+def format_for_path(path: Path) -> str:
+    return SUFFIX_FORMATS.get(Path(path).suffix.lower(), FORMAT_JSON)
+
+
+def read_json(file):
+    """
+    Reads a JSON array of task dictionaries
+    Args:
+        file: text file opened for reading
+
+    Returns: generator of (record number, item) pairs
+
+    """
+    return enumerate(iter_json_array(file), start=1)
+
+
+def read_ndjson(file):
+    """
+    Reads one task dictionary per line. Lines are decoded NDJSON_BATCH_LINES at a time as
+    one JSON array; a batch with a broken line is decoded line by line instead.
+    Args:
+        file: text file opened for reading
+
+    Returns: generator of (line number, item) pairs; item is None for a line that is not valid JSON
+
+    """
+    numbers = []
+    lines = []
+    for number, line in enumerate(file, start=1):
+        if line.isspace():
+            continue
+        numbers.append(number)
+        lines.append(line)
+        if len(lines) >= NDJSON_BATCH_LINES:
+            yield from _decode_ndjson_batch(numbers, lines)
+            numbers = []
+            lines = []
+    if lines:
+        yield from _decode_ndjson_batch(numbers, lines)
+
+
+def _decode_ndjson_batch(numbers: list[int], lines: list[str]):
+    try:
+        items = json.loads("[" + ",".join(lines) + "]")
+    except json.JSONDecodeError:
+        items = None
+    if items is not None and len(items) == len(lines):
+        return zip(numbers, items)
+    return zip(numbers, map(_decode_ndjson_line, lines))
+
+
+def _decode_ndjson_line(line: str):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return None
+
+
+def read_csv(file):
+    """
+    Reads tasks from CSV with an id,title,is_completed header (id is optional).
+    is_completed may be true/false, 1/0, yes/no, x or empty; other values are passed on as
+    text, so the import rejects them.
+    Args:
+        file: text file opened for reading with newline=""
+
+    Returns: generator of (line number, item) pairs
+
+    """
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = {name.strip().lower(): position for position, name in enumerate(header)}
+    id_column = columns.get("id")
+    title_column = columns.get("title")
+    completed_column = columns.get("is_completed")
+
+    for row in reader:
+        item = {}
+        if id_column is not None and id_column < len(row) and row[id_column]:
+            item["id"] = row[id_column]
+        if title_column is not None and title_column < len(row):
+            item["title"] = row[title_column]
+        if completed_column is not None and completed_column < len(row):
+            value = row[completed_column].strip().lower()
+            item["is_completed"] = True if value in CSV_TRUE else False if value in CSV_FALSE else value
+        yield reader.line_num, item
+
+
+def write_ndjson(file, rows):
+    """
+    Writes one task dictionary per line
+    Args:
+        file: text file opened for writing
+        rows: iterable of (id, title, is_completed) tuples
+
+    """
+    file.writelines(f'{{"id": {_encode_string(task_id)}, "title": {_encode_string(title)}, '
+                    f'"is_completed": {"true" if is_completed else "false"}}}\n'
+                    for task_id, title, is_completed in rows)
+
+
+def write_csv(file, rows):
+    """
+    Writes tasks as CSV with an id,title,is_completed header
+    Args:
+        file: text file opened for writing with newline=""
+        rows: iterable of (id, title, is_completed) tuples
+
+    """
+    writer = csv.writer(file)
+    writer.writerow(CSV_FIELDS)
+    writer.writerows((task_id, title, "true" if is_completed else "false") for task_id, title, is_completed in rows)
+
+
+READERS = {FORMAT_JSON: read_json, FORMAT_NDJSON: read_ndjson, FORMAT_CSV: read_csv}
+WRITERS = {FORMAT_JSON: write_tasks_json, FORMAT_NDJSON: write_ndjson, FORMAT_CSV: write_csv}
@@ -0,0 +1,335 @@
+"""
+Contains the task manager: the app's task operations, without any Qt, so scripts can use them too
+"""
+import gc
+import logging
+import os
+from pathlib import Path
+
+from instrumentation import timed
+from task import Task, TaskError
+from task_codec import FORMAT_JSON
+from task_store import open_store
+
+# Paths
+CUR_DIR = Path(__file__).parent
+DATA_FILE_PATH = CUR_DIR / "data"
+JSON_FILE_PATH = DATA_FILE_PATH / "tasks.json"
+
+# Storage: "json" (tasks.json + journal), "sqlite" (tasks.db) or "mmap" (tasks.taskmap); the last two
+# are migrated from tasks.json
+STORE_BACKEND = os.environ.get("TASK_STORE_BACKEND", "json")
+# Snapshot format of the JSON backend: "json" (indented), "compact" or "binary"; any of them loads
+STORE_FORMAT = os.environ.get("TASK_STORE_FORMAT", "json")
+
+# Which tasks tasks() yields
+STATUS_ALL = "all"
+STATUS_PENDING = "pending"
+STATUS_COMPLETED = "completed"
+
+# Imported tasks are added to the store this many at a time
+IMPORT_BATCH_SIZE = 10_000
+
+
+class EmptyTitleError(TaskError):
+    pass
+
+
+class DuplicateTitleError(TaskError):
+    pass
+
+
+class TaskManager:
+    """
+    Loads, changes and saves tasks through a task store.
+    The GUI and the command line both go through it, so the rules for titles live in one place.
+    With background_saves, save() only schedules a save on a worker thread (for the GUI);
+    otherwise it writes the changes right away.
+    """
+
+    def __init__(self, path: Path = JSON_FILE_PATH, backend: str = STORE_BACKEND, background_saves: bool = False,
+                 file_format: str = STORE_FORMAT):
+        self.store = open_store(path, backend, file_format)
+        self.save_scheduler = None
+        if background_saves:
+            # imported here: the command line never starts the worker thread
+            from save_scheduler import SaveScheduler
+            self.save_scheduler = SaveScheduler(self.store)
+        self.pending = []
+        self.completed = []
+
+    def load(self):
+        """
+        Reads the tasks from the store
+        Returns: (pending tasks, completed tasks)
+
+        """
+        self.pending, self.completed = self.store.load()
+        return self.pending, self.completed
+
+    def tasks(self, status: str = STATUS_ALL):
+        """
+        Yields tasks in list order, pending tasks first
+        Args:
+            status: STATUS_ALL, STATUS_PENDING or STATUS_COMPLETED
+
+        """
+        if status in (STATUS_ALL, STATUS_PENDING):
+            yield from self.pending
+        if status in (STATUS_ALL, STATUS_COMPLETED):
+            yield from self.completed
+
+    def find(self, reference: str) -> Task:
+        """
+        Finds a task by id, or by title
+        Args:
+            reference: task id or title
+
+        Returns: Task, or None if no task matches
+
+        """
+        return self.store.get(reference) or self.store.get_by_title(reference)
+
+    def check_title(self, title: str) -> str:
+        """
+        Checks that a title can be given to a new task
+        Args:
+            title: title as typed
+
+        Returns: normalized title
+
+        """
+        title = Task.normalize_title(title)
+        if not title:
+            raise EmptyTitleError("Task title must not be empty")
+        if self.store.contains_title(title):
+            raise DuplicateTitleError("Cannot have two tasks with the same title")
+        return title
+
+    def add(self, title: str, is_completed: bool = False) -> Task:
+        task = Task(self.check_title(title), is_completed)
+        self.store.add(task)
+        self.save()
+        logging.info("Added task")
+        return task
+
+    @timed("manager.import")
+    def import_tasks(self, records, on_reject=None, on_progress=None) -> tuple[int, int]:
+        """
+        Adds tasks from (record number, item) pairs, as the task_io readers yield them.
+        Every item is checked as it is read: it must be a dictionary with a title that is not
+        empty and not taken, and is_completed, if given, must be true or false. Ids are kept
+        unless another task has them. Accepted tasks are added in batches of up to
+        IMPORT_BATCH_SIZE records, and each batch is checked against the store with one
+        lookup. Rejects are reported once their batch is added, in record order.
+        Args:
+            records: iterable of (record number, item) pairs
+            on_reject: called with (record number, reason) for every rejected item
+            on_progress: called with (records read, tasks added, records rejected) after every batch
+
+        Returns: (number of tasks added, number of records rejected)
+
+        """
+        read = added = rejected = 0
+        batch = []
+        batch_titles = set()
+        # (record number, reason) for the records of the batch that were rejected
+        batch_rejects = []
+        spare_ids = []
+
+        def reject(number: int, reason: str):
+            batch_rejects.append((number, reason))
+
+        def add_batch():
+            nonlocal added, rejected
+            if batch:
+                added += self._add_batch(batch, reject)
+            rejected += len(batch_rejects)
+            if on_reject is not None:
+                # titles the store has are only found now, after the later records' rejects
+                batch_rejects.sort()
+                for number, reason in batch_rejects:
+                    on_reject(number, reason)
+            batch.clear()
+            batch_titles.clear()
+            batch_rejects.clear()
+
+        # an import makes millions of small objects but no reference cycles: pause the cycle
+        # collector instead of letting it walk the growing heap again and again
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for number, item in records:
+                if len(batch) + len(batch_rejects) >= IMPORT_BATCH_SIZE:
+                    add_batch()
+                    if on_progress is not None:
+                        on_progress(read, added, rejected)
+                read += 1
+                if type(item) is not dict:
+                    reject(number, "not a task record")
+                    continue
+                title = item.get("title")
+                is_completed = item.get("is_completed", False)
+                if type(title) is not str:
+                    reject(number, "title is missing")
+                    continue
+                if type(is_completed) is not bool:
+                    reject(number, "is_completed is not true or false")
+                    continue
+
+                task_id = item.get("id")
+                if type(task_id) is not str or not task_id:
+                    if not spare_ids:
+                        spare_ids = Task.new_ids(IMPORT_BATCH_SIZE)
+                    task_id = spare_ids.pop()
+                task = Task(title, is_completed, task_id)
+                if not task.check_task_title_length():
+                    reject(number, "title is empty")
+                    continue
+                if task.title in batch_titles:
+                    reject(number, "duplicate title")
+                    continue
+                batch_titles.add(task.title)
+                batch.append((number, task))
+
+            add_batch()
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        if on_progress is not None:
+            on_progress(read, added, rejected)
+
+        self.save()
+        logging.info("Imported %d tasks, rejected %d", added, rejected)
+        return added, rejected
+
+    def _add_batch(self, batch: list[tuple[int, Task]], reject) -> int:
+        # titles are unique within the batch; drop the ones the store has and re-id taken ids
+        taken_titles = self.store.taken_titles(task.title for _, task in batch)
+        taken_ids = self.store.taken_ids(task.id for _, task in batch)
+        tasks = []
+        ids = set()
+        for number, task in batch:
+            if task.title in taken_titles:
+                reject(number, "duplicate title")
+                continue
+            if task.id in taken_ids or task.id in ids:
+                task.id = Task.new_id()
+            ids.add(task.id)
+            tasks.append(task)
+        self.store.add_many(tasks)
+        return len(tasks)
+
+    def export_tasks(self, file, status: str = STATUS_ALL, file_format: str = FORMAT_JSON):
+        """
+        Writes tasks one at a time in a task_io format
+        Args:
+            file: text file opened for writing (with newline="" for CSV)
+            status: STATUS_ALL, STATUS_PENDING or STATUS_COMPLETED
+            file_format: FORMAT_JSON (the tasks file layout), FORMAT_NDJSON or FORMAT_CSV
+
+        """
+        # imported here: the GUI never exports, so it does not load the csv module at startup
+        from task_io import WRITERS
+
+        rows = ((task.id, task.title, task.is_completed) for task in self.tasks(status))
+        WRITERS[file_format](file, rows)
+
+    def move_tasks(self, tasks: list[Task], completed: bool):
+        """
+        Changes the completion status of tasks and moves them to the top of their new list
+        Args:
+            tasks: tasks to move
+            completed: new completion status
+
+        """
+        task_ids = list(dict.fromkeys(task.id for task in tasks))
+        positions = self.store.move_tasks(task_ids, completed)
+        self._update_moved(tasks, completed, dict(zip(task_ids, positions)))
+        self.save()
+
+    @property
+    def can_reorder(self) -> bool:
+        # False for the mmap backend, which keeps tasks in file order but for the ones moved to the top
+        return self.store.can_reorder
+
+    def reorder(self, tasks: list[Task], completed: bool, before: Task = None):
+        """
+        Moves tasks, in the given order, above a task of the pending or completed list or to
+        its bottom. Tasks from the other list change their completion status.
+        Args:
+            tasks: tasks to move
+            completed: status of the list to move them to
+            before: task to put them above, in that list and not one of tasks; None for the bottom
+
+        """
+        if not self.can_reorder:
+            raise TaskError("Tasks cannot be reordered in this task store")
+        task_ids = list(dict.fromkeys(task.id for task in tasks))
+        positions = self.store.reorder(task_ids, completed, before.id if before is not None else None)
+        self._update_moved(tasks, completed, dict(zip(task_ids, positions)))
+        self.save()
+
+    @staticmethod
+    def _update_moved(tasks: list[Task], completed: bool, positions: dict[str, float]):
+        # the SQLite store does not share its Task objects with the caller
+        for task in tasks:
+            task.is_completed = completed
+            task.position = positions[task.id]
+
+    def delete_tasks(self, tasks: list[Task]):
+        self.store.delete_tasks([task.id for task in tasks])
+        self.save()
+
+    def rename(self, task: Task, title: str):
+        """
+        Changes the title of a task
+        Args:
+            task: task to rename
+            title: new title as typed
+
+        """
+        if Task.normalize_title(title) != task.title:
+            title = self.check_title(title)
+        self.store.rename(task.id, title)
+        task.title = title
+        self.save()
+
+    @property
+    def watch_paths(self) -> tuple:
+        # files other programs may change the tasks through (none for the database backends)
+        return self.store.watch_paths
+
+    def read_changes(self, callback):
+        """
+        Reads what other programs changed in the tasks files. With background saves the files
+        are read on the save thread, after the queued saves, and callback is called there.
+        Args:
+            callback: called with the store's TaskChanges, or None if the files did not change
+
+        """
+        if self.save_scheduler is not None:
+            self.save_scheduler.run(self.store.read_changes, callback)
+        else:
+            callback(self.store.read_changes())
+
+    def apply_changes(self, changes) -> bool:
+        """
+        Merges changes from read_changes into the tasks in memory
+        Returns: False if tasks were changed here since the files were read (read them again)
+
+        """
+        return self.store.apply_changes(changes)
+
+    def save(self):
+        if self.save_scheduler is not None:
+            # changes are written in the background, together with the ones that follow shortly
+            self.save_scheduler.mark_dirty()
+        else:
+            self.store.flush()
+
+    def close(self):
+        if self.save_scheduler is not None:
+            self.save_scheduler.close()
+        self.store.close()
@@ -0,0 +1,345 @@
+"""
+Contains the list model used by the pending and completed task views
+"""
+from bisect import bisect_right
+from collections.abc import Sequence
+from operator import attrgetter
+
+from PySide6 import QtCore
+
+from instrumentation import timed
+from task import Task
+
+# Dragged tasks are carried as their ids, one per line
+TASK_IDS_MIME_TYPE = "application/x-task-ids"
+
+_position = attrgetter("position")
+
+
+class TaskListModel(QtCore.QAbstractListModel):
+    """
+    Shows the tasks of a store list. Rows are fetched from the list a page at a time
+    when the view needs them, so the list may be a lazy database-backed sequence.
+    The model always holds the tasks of a prefix of the store list in the same order:
+    all of them, or with a filter set, the ones whose ids are in the filter (like
+    QSortFilterProxyModel.filterAcceptsRow, but applied while fetching).
+    Store lists are sorted by task position, so tasks joining one are inserted with bisect.
+    Tasks dropped on the view are not moved by the model: tasks_dropped asks for the move.
+    """
+    TaskRole = QtCore.Qt.ItemDataRole.UserRole
+    SelectedRole = QtCore.Qt.ItemDataRole.UserRole + 1
+
+    # emitted with the ids of the tasks dropped on the view and the row they were dropped above
+    tasks_dropped = QtCore.Signal(list, int)
+
+    PAGE_SIZE = 200
+    # a filtered fetch reads at most this many store tasks
+    SCAN_SIZE = 20_000
+    # a removal split into more ranges than this resets the model instead
+    MAX_REMOVED_RANGES = 32
+    # so does an insertion at more rows than this
+    MAX_INSERTED_RANGES = 32
+
+    def __init__(self, tasks: Sequence[Task] = None, parent: QtCore.QObject = None):
+        super().__init__(parent)
+        self._source = tasks if tasks is not None else []
+        self._total = len(self._source)
+        # number of store tasks fetched (shown or filtered out)
+        self._scanned = 0
+        self._filter = None
+        self._tasks = []
+        self._selected = set()
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._tasks)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._tasks):
+            return None
+
+        task = self._tasks[index.row()]
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return task.title
+        if role == self.TaskRole:
+            return task
+        if role == self.SelectedRole:
+            return task in self._selected
+        return None
+
+    def canFetchMore(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> bool:
+        if parent.isValid():
+            return False
+        return self._scanned < self._total
+
+    @timed("model.fetch")
+    def fetchMore(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()):
+        if parent.isValid():
+            return
+
+        start = self._scanned
+        if self._filter is None:
+            page = list(self._source[start:min(start + self.PAGE_SIZE, self._total)])
+            scanned = len(page)
+        else:
+            chunk = self._source[start:min(start + self.SCAN_SIZE, self._total)]
+            page = [task for task in chunk if task.id in self._filter]
+            scanned = len(chunk)
+        if not scanned:
+            # the store list is shorter than expected: stop fetching
+            self._total = start
+            return
+
+        self._scanned += scanned
+        if not page:
+            return
+        first = len(self._tasks)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(page) - 1)
+        self._tasks.extend(page)
+        self.endInsertRows()
+
+    def flags(self, index: QtCore.QModelIndex) -> QtCore.Qt.ItemFlag:
+        if not index.isValid():
+            # tasks are dropped between the cards, never onto one
+            return QtCore.Qt.ItemFlag.ItemIsDropEnabled
+        return (QtCore.Qt.ItemFlag.ItemIsEnabled | QtCore.Qt.ItemFlag.ItemIsSelectable
+                | QtCore.Qt.ItemFlag.ItemIsDragEnabled)
+
+    def supportedDropActions(self) -> QtCore.Qt.DropAction:
+        return QtCore.Qt.DropAction.MoveAction
+
+    def mimeTypes(self) -> list[str]:
+        return [TASK_IDS_MIME_TYPE]
+
+    def mimeData(self, indexes: list[QtCore.QModelIndex]) -> QtCore.QMimeData:
+        rows = sorted({index.row() for index in indexes if index.isValid()})
+        data = QtCore.QMimeData()
+        data.setData(TASK_IDS_MIME_TYPE, "\n".join(self._tasks[row].id for row in rows).encode("utf-8"))
+        return data
+
+    def dropMimeData(self, data: QtCore.QMimeData, action: QtCore.Qt.DropAction, row: int, column: int,
+                     parent: QtCore.QModelIndex) -> bool:
+        if action != QtCore.Qt.DropAction.MoveAction or not data.hasFormat(TASK_IDS_MIME_TYPE):
+            return False
+        if row == -1:
+            # dropped below the last card
+            row = len(self._tasks)
+        task_ids = bytes(data.data(TASK_IDS_MIME_TYPE)).decode("utf-8").split("\n")
+        self.tasks_dropped.emit(task_ids, row)
+        # the receiver moved the tasks: the source view's removeRows call that follows does nothing
+        return True
+
+    def total_count(self) -> int:
+        # length of the store list, including the tasks not fetched yet
+        return self._total
+
+    def is_filtered(self) -> bool:
+        return self._filter is not None
+
+    def task(self, row: int) -> Task:
+        return self._tasks[row]
+
+    def tasks(self) -> list[Task]:
+        return list(self._tasks)
+
+    def set_tasks(self, tasks: Sequence[Task]):
+        """
+        Shows the tasks of a store list. Only the first page is read now.
+        Args:
+            tasks: list or lazy sequence of tasks from the store
+
+        """
+        self.beginResetModel()
+        self._source = tasks
+        self._total = len(tasks)
+        self._scanned = 0
+        self._tasks = []
+        self._selected.clear()
+        self.endResetModel()
+
+    def set_filter(self, task_ids: set[str] = None):
+        """
+        Shows only the tasks whose ids are in task_ids, fetching again from the top
+        Args:
+            task_ids: ids of the tasks to show, or None to show every task
+
+        """
+        self.beginResetModel()
+        self._filter = task_ids
+        self._total = len(self._source)
+        # nothing to find: skip reading the store list
+        self._scanned = self._total if task_ids is not None and not task_ids else 0
+        self._tasks = []
+        self._selected.clear()
+        self.endResetModel()
+
+    def insert_task(self, row: int, task: Task):
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self._tasks.insert(row, task)
+        self._total += 1
+        self._scanned += 1
+        self.endInsertRows()
+
+    def append_task(self, task: Task):
+        self.append_tasks([task])
+
+    def append_tasks(self, tasks: list[Task]):
+        """
+        Shows tasks appended to the store list
+        Args:
+            tasks: tasks added at the bottom of the store list
+
+        """
+        if self.canFetchMore():
+            # the tasks are read with the last page
+            self._total += len(tasks)
+            return
+        if self._filter is not None:
+            shown = [task for task in tasks if task.id in self._filter]
+            self._total += len(tasks) - len(shown)
+            self._scanned += len(tasks) - len(shown)
+            tasks = shown
+        self.insert_tasks(len(self._tasks), tasks)
+
+    def insert_tasks(self, row: int, tasks: list[Task]):
+        if not tasks:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), row, row + len(tasks) - 1)
+        self._tasks[row:row] = tasks
+        self._total += len(tasks)
+        self._scanned += len(tasks)
+        self.endInsertRows()
+
+    def update_task(self, row: int):
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def insert_sorted(self, tasks: list[Task]):
+        """
+        Shows tasks that joined the store list where their positions sort them: fetched rows
+        are found with bisect, and tasks below the last fetched row are only counted, to be
+        fetched with their page. Tasks landing on the same row are inserted with one signal.
+        Set the filter again instead when there is one, unless the tasks match it.
+        Args:
+            tasks: tasks of this model's store list, with their positions
+
+        """
+        fetching = self.canFetchMore()
+        last = self._tasks[-1].position if self._tasks else None
+        shown = sorted((task for task in tasks if not fetching or (last is not None and task.position <= last)),
+                       key=_position)
+        self._total += len(tasks) - len(shown)
+        if not shown:
+            return
+
+        groups = []
+        for task in shown:
+            row = bisect_right(self._tasks, task.position, key=_position)
+            if groups and groups[-1][0] == row:
+                groups[-1][1].append(task)
+            else:
+                groups.append((row, [task]))
+        if len(groups) > self.MAX_INSERTED_RANGES:
+            self.beginResetModel()
+            self._tasks.extend(shown)
+            self._tasks.sort(key=_position)
+            self._total += len(shown)
+            self._scanned += len(shown)
+            self._selected.clear()
+            self.endResetModel()
+            return
+        # last group first, so the rows of the other groups do not shift
+        for row, group in reversed(groups):
+            self.insert_tasks(row, group)
+
+    def rows_of(self, tasks: set[Task]) -> list[int]:
+        # rows of the fetched tasks among tasks; the others are not fetched (or filtered out)
+        return [row for row, task in enumerate(self._tasks) if task in tasks]
+
+    def rows_of_ids(self, task_ids: set[str]) -> list[int]:
+        return [row for row, task in enumerate(self._tasks) if task.id in task_ids]
+
+    def remove_tasks(self, tasks: set[Task]):
+        """
+        Removes tasks that left the store list, fetched or not: the ones not fetched yet only
+        shorten the part of the list still to fetch. Set the filter again instead when there is one.
+        Args:
+            tasks: tasks that were in this model's store list
+
+        """
+        rows = self.rows_of(tasks)
+        self.remove_rows(rows)
+        self._total -= len(tasks) - len(rows)
+
+    def remove_task(self, row: int) -> Task:
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        task = self._tasks.pop(row)
+        self._total -= 1
+        self._scanned -= 1
+        self._selected.discard(task)
+        self.endRemoveRows()
+        return task
+
+    def remove_rows(self, rows: list[int]) -> list[Task]:
+        """
+        Removes many rows at once. Contiguous rows are removed with one signal per range;
+        a selection split into many ranges resets the model once instead.
+        Args:
+            rows: rows to remove, in any order
+
+        Returns: removed tasks, in row order
+
+        """
+        rows = sorted(set(rows))
+        if not rows:
+            return []
+
+        ranges = []
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+
+        removed = [self._tasks[row] for row in rows]
+        if len(ranges) > self.MAX_REMOVED_RANGES:
+            removed_rows = set(rows)
+            self.beginResetModel()
+            self._tasks = [task for row, task in enumerate(self._tasks) if row not in removed_rows]
+            self._total -= len(rows)
+            self._scanned -= len(rows)
+            self._selected.clear()
+            self.endResetModel()
+            return removed
+
+        # last range first, so the rows of the other ranges do not shift
+        for first, last in reversed(ranges):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            del self._tasks[first:last + 1]
+            self._total -= last - first + 1
+            self._scanned -= last - first + 1
+            self.endRemoveRows()
+        self._selected.difference_update(removed)
+        return removed
+
+    @timed("model.selection_repaint")
+    def set_selected_range(self, first: int, last: int, selected: bool = True):
+        """
+        Changes the highlighted state of rows first..last and repaints only those rows
+        Args:
+            first: first row to change
+            last: last row to change (inclusive)
+            selected: True to highlight the rows, False to reset them
+
+        """
+        last = min(last, len(self._tasks) - 1)
+        if first > last:
+            return
+
+        for task in self._tasks[first:last + 1]:
+            if selected:
+                self._selected.add(task)
+            else:
+                self._selected.discard(task)
+        self.dataChanged.emit(self.index(first), self.index(last), [self.SelectedRole])
@@ -0,0 +1,520 @@
+"""
+Contains the task server: lets other programs on this machine list and change the tasks over HTTP
+with JSON bodies, through the same TaskManager (and title rules) as the GUI and the command line.
+PySide6 is never imported.
+Usage:
+    python -m task_server                              (http://127.0.0.1:8765)
+    python -m task_server --port 9000
+    python -m task_server --unix /tmp/tasks.sock       (a Unix socket instead of TCP)
+Requests:
+    GET    /tasks?status=pending&q=milk&offset=0&limit=100
+               a page: {"tasks": [...], "total": matching tasks, "next_offset": offset or null}
+    GET    /tasks?stream=1&status=...&q=...
+               every matching task, one JSON object per line, sent in chunks
+    GET    /tasks/<id>
+    POST   /tasks                 {"title": "Buy milk", "is_completed": false}    answers 201
+    PATCH  /tasks/<id>            {"title": ..., "is_completed": ..., "before": ...}   all optional
+               before: id of the task to put it above (in that task's list), or null for the bottom
+    POST   /tasks/<id>/toggle
+    DELETE /tasks/<id>                                                            answers 204
+Tasks are {"id": ..., "title": ..., "is_completed": ..., "position": ...}, listed by position;
+q matches title words as the search bar does. Refused changes answer 400 (409 for a taken title) with {"error": message}.
+Connections are kept alive and requests may be pipelined: they are handled as they arrive and
+answered in order. A change is answered once it is saved, and the changes made while a save
+runs are all saved by the next one, so many clients cost one flush per batch of changes.
+Other programs' changes to the tasks files are read every RELOAD_INTERVAL seconds.
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import logging
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import instrumentation
+import task_io
+from instrumentation import span
+from save_scheduler import SaveScheduler
+from search_index import TaskSearchIndex
+from task_codec import FORMATS as STORE_FORMATS
+from task_manager import (TaskManager, TaskError, DuplicateTitleError, JSON_FILE_PATH, STORE_BACKEND,
+                          STORE_FORMAT, STATUS_ALL, STATUS_PENDING, STATUS_COMPLETED)
+from task_store import BACKENDS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Tasks per page when a list request has no limit, and the most a request may ask for
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Tasks per chunk of a streamed list
+STREAM_CHUNK_SIZE = 1000
+# Requests of one connection that may wait for their answers; reading stops beyond that
+PIPELINE_DEPTH = 64
+# Largest request head and body accepted, in bytes
+MAX_HEAD_SIZE = 16 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+# Seconds between checks for other programs' changes to the tasks files
+RELOAD_INTERVAL = 1.0
+
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Content Too Large", 431: "Request Header Fields Too Large",
+           500: "Internal Server Error", 501: "Not Implemented"}
+STATUSES = (STATUS_ALL, STATUS_PENDING, STATUS_COMPLETED)
+
+
+class RequestError(Exception):
+    """
+    A request was refused: answered with status and {"error": message}
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class BatchedSaves:
+    """
+    Saves the store for the server, on a worker thread so the event loop keeps answering.
+    mark_dirty() starts a save once the requests that already arrived are handled; changes made
+    while it runs wait in next_save, a future set when the save after it is done. Has the
+    SaveScheduler methods TaskManager calls, so the manager saves through it.
+    """
+
+    def __init__(self, store, loop: asyncio.AbstractEventLoop):
+        self.store = store
+        self.next_save = None
+        self._loop = loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-save")
+        self._is_saving = False
+
+    def mark_dirty(self):
+        if self.next_save is not None:
+            return
+        self.next_save = self._loop.create_future()
+        if not self._is_saving:
+            self._loop.call_soon(self._start)
+
+    def run(self, function, callback):
+        # like SaveScheduler.run: after the saves already started, never overlapping one
+        future = self._executor.submit(lambda: callback(function()))
+        future.add_done_callback(SaveScheduler._log_failure)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _start(self):
+        saved, self.next_save = self.next_save, None
+        self._is_saving = True
+        flushed = self._loop.run_in_executor(self._executor, self.store.flush)
+        flushed.add_done_callback(lambda future: self._finish(future, saved))
+
+    def _finish(self, flushed: asyncio.Future, saved: asyncio.Future):
+        self._is_saving = False
+        error = flushed.exception()
+        if error is not None:
+            logging.error("Saving tasks failed", exc_info=error)
+            saved.set_exception(error)
+            # the answers report it; nobody may be waiting for them any more
+            saved.exception()
+        else:
+            saved.set_result(None)
+        if self.next_save is not None:
+            self._start()
+
+
+def _json_response(status: int, body, keep_alive: bool) -> bytes:
+    data = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8") if body is not None else b""
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n")
+    if not keep_alive:
+        head += "Connection: close\r\n"
+    return head.encode("ascii") + b"\r\n" + data
+
+
+def _error_response(error: RequestError, keep_alive: bool) -> bytes:
+    return _json_response(error.status, {"error": str(error)}, keep_alive)
+
+
+class TaskServer:
+    """
+    Answers task requests on one event loop. Every connection has a reader, which parses and
+    handles requests as they arrive (changes are made in memory right away, in order), and a
+    writer, which sends the answers in the same order, each change's once its save is done.
+    """
+
+    def __init__(self, manager: TaskManager):
+        self.manager = manager
+        self.search_index = TaskSearchIndex()
+        self.search_index.add_tasks(manager.tasks())
+        self._loop = None
+        self._reload_handle = None
+        self._is_reading_changes = False
+        self._connections = set()
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        # the manager's changes are saved in batches instead of one flush per change
+        self.manager.save_scheduler = BatchedSaves(self.manager.store, loop)
+        if self.manager.watch_paths:
+            self._reload_handle = loop.call_later(RELOAD_INTERVAL, self._read_external_changes)
+
+    def stop(self):
+        if self._reload_handle is not None:
+            self._reload_handle.cancel()
+        for connection in self._connections:
+            connection.cancel()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        answers = asyncio.Queue(PIPELINE_DEPTH)
+        sender = asyncio.create_task(self._send_answers(writer, answers))
+        self._connections.add(sender)
+        try:
+            keep_alive = True
+            while keep_alive and not sender.done():
+                try:
+                    request = await self._read_request(reader)
+                except RequestError as error:
+                    await answers.put((None, _error_response(error, False), False))
+                    break
+                if request is None:
+                    break
+                method, target, body, keep_alive = request
+                await answers.put((*self._handle(method, target, body, keep_alive), keep_alive))
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            # the writer sends what is queued, then closes the connection
+            if not sender.done():
+                await answers.put(None)
+            await asyncio.gather(sender, return_exceptions=True)
+            self._connections.discard(sender)
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """
+        Reads the next request of a connection
+        Returns: (method, target, body bytes, keep alive), or None once the client closed it
+
+        """
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as error:
+            if error.partial.strip():
+                raise RequestError(400, "Incomplete request")
+            return None
+        except asyncio.LimitOverrunError:
+            raise RequestError(431, "Request head too large")
+
+        request_line, *header_lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = request_line.split(" ")
+        except ValueError:
+            raise RequestError(400, "Malformed request line")
+        headers = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        if "transfer-encoding" in headers:
+            raise RequestError(501, "Chunked request bodies are not supported")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise RequestError(400, "Malformed Content-Length")
+        if not 0 <= length <= MAX_BODY_SIZE:
+            raise RequestError(413, f"Request body larger than {MAX_BODY_SIZE} bytes")
+        try:
+            body = await reader.readexactly(length) if length else b""
+        except asyncio.IncompleteReadError:
+            raise RequestError(400, "Incomplete request body")
+        return method, target, body, keep_alive
+
+    async def _send_answers(self, writer: asyncio.StreamWriter, answers: asyncio.Queue):
+        # answers are (future of the save to wait for or None, bytes or async iterator of bytes, keep alive)
+        try:
+            while (answer := await answers.get()) is not None:
+                saved, response, keep_alive = answer
+                if saved is not None:
+                    try:
+                        await saved
+                    except Exception as error:
+                        response = _error_response(RequestError(500, f"Saving failed: {error}"), False)
+                        keep_alive = False
+                if isinstance(response, bytes):
+                    writer.write(response)
+                else:
+                    async for chunk in response:
+                        writer.write(chunk)
+                        await writer.drain()
+                if not keep_alive:
+                    break
+                if answers.empty():
+                    # one write to the socket for every answer that was ready together
+                    await writer.drain()
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _handle(self, method: str, target: str, body: bytes, keep_alive: bool) -> tuple:
+        """
+        Handles one request
+        Returns: (future of the save the answer waits for or None, answer bytes or async iterator of bytes)
+
+        """
+        with span("server.request"):
+            try:
+                return self._route(method, target, body, keep_alive)
+            except RequestError as error:
+                return None, _error_response(error, keep_alive)
+            except DuplicateTitleError as error:
+                return None, _error_response(RequestError(409, str(error)), keep_alive)
+            except TaskError as error:
+                return None, _error_response(RequestError(400, str(error)), keep_alive)
+            except Exception as error:
+                logging.exception("Handling %s %s failed", method, target)
+                return None, _error_response(RequestError(500, f"Internal error: {error}"), keep_alive)
+
+    def _route(self, method: str, target: str, body: bytes, keep_alive: bool) -> tuple:
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        if parts[0] != "tasks" or len(parts) > 3 or (len(parts) == 3 and parts[2] != "toggle"):
+            raise RequestError(404, f"No resource {url.path}")
+
+        if len(parts) == 1:
+            if method == "GET":
+                return self._list_tasks(parse_qs(url.query), keep_alive)
+            if method == "POST":
+                item = self._read_item(body)
+                task = self.manager.add(self._field(item, "title", str, ""), self._field(item, "is_completed", bool, False))
+                self.search_index.add(task.id, task.title)
+                return self._saved(201, task.to_dict(), keep_alive)
+            raise RequestError(405, f"{method} is not allowed on /tasks")
+
+        task = self.manager.store.get(parts[1])
+        if task is None:
+            raise RequestError(404, f"No task {parts[1]!r}")
+        if len(parts) == 3:
+            if method != "POST":
+                raise RequestError(405, f"{method} is not allowed on {url.path}")
+            self.manager.move_tasks([task], not task.is_completed)
+            return self._saved(200, task.to_dict(), keep_alive)
+        if method == "GET":
+            return None, _json_response(200, task.to_dict(), keep_alive)
+        if method == "PATCH":
+            item = self._read_item(body)
+            title = self._field(item, "title", str, None)
+            is_completed = self._field(item, "is_completed", bool, None)
+            # checked before anything changes, so a refused request leaves the task as it was: only
+            # the rename can still be refused, and it is the first change
+            place = self._place(task, item["before"], is_completed) if "before" in item else None
+            if title is not None:
+                old_title = task.title
+                self.manager.rename(task, title)
+                self.search_index.rename(task.id, old_title, task.title)
+            if place is not None:
+                self.manager.reorder([task], *place)
+            elif is_completed is not None and is_completed != task.is_completed:
+                self.manager.move_tasks([task], is_completed)
+            return self._saved(200, task.to_dict(), keep_alive)
+        if method == "DELETE":
+            self.manager.delete_tasks([task])
+            self.search_index.remove(task.id, task.title)
+            return self._saved(204, None, keep_alive)
+        raise RequestError(405, f"{method} is not allowed on {url.path}")
+
+    def _place(self, task, before_id, is_completed: bool) -> tuple:
+        # (completed, before) to put task above the task before_id, or at the bottom of its list
+        # (of is_completed's, if given)
+        if not self.manager.can_reorder:
+            raise RequestError(400, "Tasks cannot be reordered in this task store")
+        before = None
+        if before_id is not None:
+            if type(before_id) is not str:
+                raise RequestError(400, "before must be a task id or null")
+            before = self.manager.store.get(before_id)
+            if before is None or before.id == task.id:
+                raise RequestError(400, f"No other task {before_id!r} to put the task above")
+        completed = before.is_completed if before is not None else task.is_completed
+        if is_completed is not None:
+            if before is not None and is_completed != completed:
+                raise RequestError(400, "before must be a task of the list the task moves to")
+            completed = is_completed
+        return completed, before
+
+    def _saved(self, status: int, body, keep_alive: bool) -> tuple:
+        # the manager marked the store dirty: answer once the save holding this change is done
+        return self.manager.save_scheduler.next_save, _json_response(status, body, keep_alive)
+
+    def _list_tasks(self, query: dict, keep_alive: bool) -> tuple:
+        status = query.get("status", [STATUS_ALL])[-1]
+        if status not in STATUSES:
+            raise RequestError(400, f"status must be one of {', '.join(STATUSES)}")
+        search = query.get("q", [""])[-1].strip()
+        task_ids = self.search_index.search(search) if search else None
+        lists = [tasks for tasks, shown in ((self.manager.pending, status != STATUS_COMPLETED),
+                                            (self.manager.completed, status != STATUS_PENDING)) if shown]
+
+        if query.get("stream", ["0"])[-1] not in ("", "0"):
+            tasks = itertools.chain.from_iterable(lists)
+            if task_ids is not None:
+                tasks = (task for task in tasks if task.id in task_ids)
+            return None, self._stream(tasks, keep_alive)
+
+        offset = self._number(query, "offset", 0)
+        limit = min(self._number(query, "limit", PAGE_SIZE), MAX_PAGE_SIZE)
+        if task_ids is None:
+            total = sum(len(tasks) for tasks in lists)
+            page = []
+            start = offset
+            for tasks in lists:
+                if len(page) < limit and start < len(tasks):
+                    page.extend(tasks[start:start + limit - len(page)])
+                start = max(start - len(tasks), 0)
+        else:
+            matching = [task for task in itertools.chain(*lists) if task.id in task_ids]
+            total = len(matching)
+            page = matching[offset:offset + limit]
+        next_offset = offset + len(page) if offset + len(page) < total else None
+        return None, _json_response(200, {"tasks": [task.to_dict() for task in page], "total": total,
+                                          "next_offset": next_offset}, keep_alive)
+
+    @staticmethod
+    async def _stream(tasks, keep_alive: bool):
+        # tasks are read a chunk at a time, so the store's lists are never copied whole; like paging
+        # with offsets, tasks moved while the stream is sent may be left out or sent twice
+        head = "HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n"
+        if not keep_alive:
+            head += "Connection: close\r\n"
+        yield head.encode("ascii") + b"\r\n"
+        while chunk := list(itertools.islice(tasks, STREAM_CHUNK_SIZE)):
+            lines = io.StringIO()
+            task_io.write_ndjson(lines, ((task.id, task.title, task.is_completed) for task in chunk))
+            data = lines.getvalue().encode("utf-8")
+            yield f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n"
+        yield b"0\r\n\r\n"
+
+    @staticmethod
+    def _read_item(body: bytes) -> dict:
+        try:
+            item = json.loads(body)
+        except ValueError:
+            raise RequestError(400, "Request body is not JSON")
+        if type(item) is not dict:
+            raise RequestError(400, "Request body is not a JSON object")
+        return item
+
+    @staticmethod
+    def _field(item: dict, name: str, kind: type, default):
+        value = item.get(name, default)
+        if value is not default and type(value) is not kind:
+            raise RequestError(400, f"{name} must be a {'string' if kind is str else 'boolean'}")
+        return value
+
+    @staticmethod
+    def _number(query: dict, name: str, default: int) -> int:
+        try:
+            value = int(query.get(name, [default])[-1])
+        except ValueError:
+            raise RequestError(400, f"{name} must be a number")
+        if value < 0:
+            raise RequestError(400, f"{name} must not be negative")
+        return value
+
+    def _read_external_changes(self):
+        self._reload_handle = self._loop.call_later(RELOAD_INTERVAL, self._read_external_changes)
+        if self._is_reading_changes:
+            return
+        self._is_reading_changes = True
+        # read on the save thread, applied on the event loop like every other change
+        self.manager.read_changes(lambda changes: self._loop.call_soon_threadsafe(self._apply_external_changes, changes))
+
+    def _apply_external_changes(self, changes):
+        self._is_reading_changes = False
+        # requests changed tasks while the files were read: the next check reads them again
+        if changes is None or not self.manager.apply_changes(changes) or not changes:
+            return
+        for task in changes.removed:
+            self.search_index.remove(task.id, task.title)
+        for task, old_title, title in changes.renamed:
+            self.search_index.rename(task.id, old_title, title)
+        self.search_index.add_tasks(changes.added)
+        logging.info("External change - %d added, %d removed, %d moved, %d renamed", len(changes.added),
+                     len(changes.removed), len(changes.moved), len(changes.renamed))
+
+
+async def serve(manager: TaskManager, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: Path = None,
+                started: asyncio.Event = None):
+    """
+    Answers task requests until cancelled (or sent SIGTERM), then closes the connections; the caller
+    closes the manager
+    Args:
+        manager: loaded task manager
+        host: address to listen on
+        port: TCP port (0 picks a free one)
+        unix_path: Unix socket to listen on instead of host and port
+        started: set once the server accepts connections
+
+    """
+    loop = asyncio.get_running_loop()
+    server = TaskServer(manager)
+    server.start(loop)
+    try:
+        # stopped like with Ctrl+C, so the manager still saves and closes
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass
+    if unix_path is not None:
+        listener = await asyncio.start_unix_server(server.handle_connection, unix_path, limit=MAX_HEAD_SIZE)
+    else:
+        listener = await asyncio.start_server(server.handle_connection, host, port, limit=MAX_HEAD_SIZE)
+    for sock in listener.sockets:
+        logging.info("Serving tasks on %s", sock.getsockname())
+    if started is not None:
+        started.set()
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.stop()
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m task_server", description="Serve the tasks over HTTP")
+    parser.add_argument("--file", type=Path, default=JSON_FILE_PATH, help="JSON tasks file (default: %(default)s)")
+    parser.add_argument("--backend", default=STORE_BACKEND, choices=BACKENDS,
+                        help="task store backend (default: %(default)s)")
+    parser.add_argument("--store-format", default=STORE_FORMAT, choices=STORE_FORMATS,
+                        help="format the json backend saves in; files load in any format (default: %(default)s)")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port (default: %(default)s)")
+    parser.add_argument("--unix", type=Path, help="Unix socket to listen on instead of --host and --port")
+    args = parser.parse_args(argv)
+
+    manager = TaskManager(args.file, args.backend, file_format=args.store_format)
+    try:
+        manager.load()
+    except TaskError as error:
+        print(error, file=sys.stderr)
+        return 1
+    try:
+        asyncio.run(serve(manager, args.host, args.port, args.unix))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        manager.close()
+        instrumentation.log_summary()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1014 @@
+"""
+Contains the task store: reads the tasks file and splits it into pending and completed tasks
+"""
+import contextlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from operator import attrgetter
+from pathlib import Path
+
+from instrumentation import timed
+from task import Task, TaskError
+from task_codec import FORMAT_COMPACT, FORMAT_JSON, READERS, WRITERS, CorruptTasksFile, detect_format, json_library
+from task_table import TaskTable
+
+# Storage backends open_store can create
+BACKEND_JSON = "json"
+BACKEND_SQLITE = "sqlite"
+BACKEND_MMAP = "mmap"
+BACKENDS = (BACKEND_JSON, BACKEND_SQLITE, BACKEND_MMAP)
+
+try:
+    import fcntl
+except ImportError:
+    # no advisory locks (Windows): only one program at a time may write the tasks files
+    fcntl = None
+
+# the key both task lists are sorted by
+_position = attrgetter("position")
+
+
+class TaskChanges:
+    """
+    Differences between the tasks files and the tasks in memory, as TaskStore.read_changes
+    finds them. Removed, moved, renamed and reordered tasks are the store's own Task objects;
+    added tasks are new ones. Moved and reordered tasks still have their old status and
+    position until the changes are applied.
+    """
+    __slots__ = ("edits", "version", "added", "removed", "moved", "renamed", "reordered")
+
+    def __init__(self, edits: int = 0, version: int = 0):
+        # the store's count of changes made in memory, and the store version the files were read at
+        self.edits = edits
+        self.version = version
+        self.added = []
+        self.removed = []
+        self.moved = []
+        # (task, old title, new title)
+        self.renamed = []
+        # (task, old position, new position)
+        self.reordered = []
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.moved or self.renamed or self.reordered)
+
+
+def _stat_signature(stat: os.stat_result) -> tuple:
+    # enough to tell a file someone wrote or replaced from an untouched one without reading it
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _file_signature(path: Path):
+    try:
+        return _stat_signature(os.stat(path))
+    except FileNotFoundError:
+        return None
+
+
+class TaskStore:
+    """
+    Keeps the tasks in memory and persists them as a snapshot plus an append-only journal.
+    Every change queues one small journal record; flush() appends the queued records to
+    the journal and, once the journal is as long as the task list (and at least
+    COMPACT_THRESHOLD records), folds it into a new snapshot.
+    flush() may run on a worker thread while the GUI thread keeps changing tasks.
+    Snapshots are written in file_format (a task_codec format) and read in whichever
+    format they were written, so the format can be changed between runs.
+
+    Several programs may share the files. Every journal record carries the store version
+    it was written at, and each snapshot's journal starts with a "snapshot" record holding
+    the snapshot's version. The files are only read and written under an advisory lock on
+    tasks.lock, held for short sections: reading or appending journal records, and renaming
+    a snapshot that was written beforehand. Saves compare and swap: under the lock, a flush
+    first reads what other programs appended since this store last read or wrote the files,
+    then appends its own records after theirs; every record changes one task, so replaying
+    the journal merges them. A snapshot is only renamed into place if no other program
+    wrote in the meantime, and only from tasks with the other programs' changes merged in
+    (read_changes() and apply_changes(), which the GUI uses to show them).
+
+    Both task lists are kept sorted by Task.position, which is saved with every task. Tasks
+    placed between two others get positions between theirs (Task.positions_between), so a
+    move is one journal record however long the list is. Only when two neighbours are too
+    close for that is the list renumbered, and the next flush saves it as a snapshot.
+
+    A read_only store only reads the files: it never writes, cuts or moves them aside, and
+    takes the file lock only if another program created the lock file.
+    """
+    COMPACT_THRESHOLD = 1000
+    # a flush gives up compacting after other programs wrote first this many times in a row
+    SNAPSHOT_ATTEMPTS = 2
+    # up to this many tasks are taken out of or put into a list with bisect; more with one pass over it
+    BISECT_LIMIT = 32
+    # tasks can be put anywhere in their lists with reorder()
+    can_reorder = True
+
+    def __init__(self, path: Path, file_format: str = FORMAT_JSON, read_only: bool = False):
+        if file_format not in WRITERS:
+            raise ValueError(f"Unknown tasks file format: {file_format}")
+        self.path = Path(path)
+        self.file_format = file_format
+        self.read_only = read_only
+        self.journal_path = self.path.with_suffix(".journal")
+        self.lock_path = self.path.with_suffix(".lock")
+        self.pending = []
+        self.completed = []
+        self._tasks_by_id = {}
+        self._tasks_by_title = {}
+        self._journal_file = None
+        self._lock_file = None
+        self._journal_records = 0
+        self._unsaved_records = []
+        # set by add_many: the next flush writes a snapshot instead of journal records
+        self._snapshot_due = False
+        # counts the changes made in memory, so changes read from the files before one are not applied
+        self._edits = 0
+        # counts every change to the tasks in memory, merged ones too: a snapshot copied without
+        # the lock is only written if no change came in while it was copied
+        self._revision = 0
+        # this store's place in the files: the last store version it read or wrote, the version
+        # of the journal's snapshot record, the journal bytes read or written and the snapshot read
+        self._version = 0
+        self._journal_base = 0
+        self._journal_size = 0
+        self._snapshot_signature = None
+        # other programs' records read from the journal but not merged into the tasks yet, and
+        # after another program wrote a snapshot, the version at which it has to be read whole
+        self._unmerged_records = []
+        self._unmerged_keys = set()
+        self._reread_version = None
+        # (snapshot, journal) signatures when this store last read or wrote them
+        self._signature = None
+        # _lock guards the task lists and queued records, _flush_lock serializes flushes
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+
+    @property
+    def tasks(self) -> list[Task]:
+        return self.pending + self.completed
+
+    @timed("store.load")
+    def load(self) -> tuple[list[Task], list[Task]]:
+        """
+        Reads the snapshot once, splits its tasks by completion status and replays the journal
+        Returns: (pending tasks, completed tasks)
+
+        """
+        started = time.perf_counter()
+        try:
+            file_format, outdated = self._read()
+        except CorruptTasksFile:
+            # keep the broken file around instead of wiping it
+            backup_path = self.path.with_suffix(".json.corrupt")
+            os.replace(self.path, backup_path)
+            logging.error("JSON - Tasks file is not valid, moved it to %s", backup_path.name)
+            file_format, outdated = self._read()
+
+        source = f"{file_format} file, {self._library(file_format)}" if file_format else "no file"
+        logging.info("JSON - Loaded %d pending and %d completed tasks (%s) in %.3fs",
+                     len(self.pending), len(self.completed), source, time.perf_counter() - started)
+
+        if outdated:
+            # save the ids and positions given to tasks from an older or hand-edited tasks file, so they
+            # stay the same, and drop the tasks skipped for taking another task's title
+            self.compact()
+
+        return self.pending, self.completed
+
+    def get(self, task_id: str) -> Task:
+        return self._tasks_by_id.get(task_id)
+
+    def get_by_title(self, title: str) -> Task:
+        return self._tasks_by_title.get(Task.normalize_title(title))
+
+    def contains_title(self, title: str) -> bool:
+        return Task.normalize_title(title) in self._tasks_by_title
+
+    def taken_titles(self, titles) -> set[str]:
+        """
+        Checks many normalized titles at once
+        Returns: the titles a task already has
+
+        """
+        return {title for title in titles if title in self._tasks_by_title}
+
+    def taken_ids(self, task_ids) -> set[str]:
+        return {task_id for task_id in task_ids if task_id in self._tasks_by_id}
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._unsaved_records) or self._snapshot_due
+
+    @property
+    def version(self) -> int:
+        # the last store version this store read from the files or wrote to them
+        return self._version
+
+    def add(self, task: Task):
+        """
+        Adds a task at the bottom of its list
+        Args:
+            task: task with a title and an id no other task has; its position is set here
+
+        """
+        with self._lock:
+            self._append_to_list(self.completed if task.is_completed else self.pending, [task])
+            self._index(task)
+            self._append({"op": "add", "id": task.id, "title": task.title, "is_completed": task.is_completed,
+                          "position": task.position})
+
+    def add_many(self, tasks: list[Task]):
+        """
+        Adds many tasks at once at the bottom of their lists. Instead of one journal record
+        per task, the next flush writes a new snapshot.
+        Args:
+            tasks: tasks with titles and ids no other task has
+
+        """
+        with self._lock:
+            self._append_to_list(self.pending, [task for task in tasks if not task.is_completed])
+            self._append_to_list(self.completed, [task for task in tasks if task.is_completed])
+            self._tasks_by_id.update((task.id, task) for task in tasks)
+            self._tasks_by_title.update((task.title, task) for task in tasks)
+            self._snapshot_due = True
+            self._edits += 1
+            self._revision += 1
+
+    def delete(self, task_id: str):
+        self.delete_tasks([task_id])
+
+    def delete_tasks(self, task_ids: list[str]):
+        """
+        Deletes many tasks
+        Args:
+            task_ids: ids of the tasks to delete
+
+        """
+        with self._lock:
+            tasks = [self._tasks_by_id[task_id] for task_id in dict.fromkeys(task_ids)]
+            self._detach(tasks)
+            for task in tasks:
+                self._unindex(task)
+                self._append({"op": "delete", "id": task.id, "title": task.title})
+
+    def set_completed(self, task_id: str, status: bool):
+        """
+        Changes the completion status of a task and moves it to the top of its new list
+        Args:
+            task_id: id of the task to change
+            status: new completion status
+
+        """
+        self.move_tasks([task_id], status)
+
+    def move_tasks(self, task_ids: list[str], completed: bool) -> list[float]:
+        """
+        Changes the completion status of many tasks and moves them, in the given order,
+        to the top of their new list
+        Args:
+            task_ids: ids of the tasks to move
+            completed: new completion status
+
+        Returns: the new positions of the tasks
+
+        """
+        with self._lock:
+            tasks = [self._tasks_by_id[task_id] for task_id in dict.fromkeys(task_ids)]
+            self._detach(tasks)
+            return self._place(tasks, completed, 0, "set_completed")
+
+    def reorder(self, task_ids: list[str], completed: bool, before_id: str = None) -> list[float]:
+        """
+        Moves tasks, in the given order, to a place in the pending or completed list, changing
+        their status if they come from the other one. Each task gets a position between its new
+        neighbours' and one journal record; the other tasks keep theirs.
+        Args:
+            task_ids: ids of the tasks to move
+            completed: status of the list to move them to
+            before_id: id of the task to put them above, not one of the moved tasks; None for the bottom
+
+        Returns: the new positions of the tasks
+
+        """
+        with self._lock:
+            tasks = [self._tasks_by_id[task_id] for task_id in dict.fromkeys(task_ids)]
+            before = self._tasks_by_id[before_id] if before_id is not None else None
+            if before is not None and (before.is_completed != completed or before in tasks):
+                raise ValueError("The tasks can only be put above another task of the list they move to")
+            self._detach(tasks)
+            task_list = self.completed if completed else self.pending
+            row = self._index_of(task_list, before) if before is not None else len(task_list)
+            return self._place(tasks, completed, row, "reorder")
+
+    def rename(self, task_id: str, title: str):
+        with self._lock:
+            task = self._tasks_by_id[task_id]
+            old_title = task.title
+            self._unindex(task)
+            task.title = Task.normalize_title(title)
+            self._index(task)
+            self._append({"op": "rename", "id": task.id, "title": old_title, "new_title": task.title})
+
+    @timed("store.flush")
+    def flush(self, compact: bool = False):
+        """
+        Appends the queued records to the journal in one write, after the records other
+        programs appended, and writes a new snapshot when the journal has grown as long as
+        the task list. A snapshot due because of the journal length waits until the other
+        programs' changes are merged by apply_changes(); one asked for with compact (or due
+        after add_many) merges them first.
+        Args:
+            compact: True to write a new snapshot whatever the journal length
+
+        """
+        with self._flush_lock:
+            with self._lock:
+                records, self._unsaved_records = self._unsaved_records, []
+                snapshot_due = self._snapshot_due
+            with self._file_lock():
+                self._catch_up()
+                self._write_journal(records)
+
+            merge = compact or snapshot_due
+            if not (merge or self._journal_records >= max(self.COMPACT_THRESHOLD, len(self._tasks_by_id))):
+                return
+            for _ in range(self.SNAPSHOT_ATTEMPTS):
+                if self._is_behind() and not (merge and self._merge()):
+                    # a snapshot of the tasks in memory would drop the other programs' changes
+                    logging.debug("JSON - Tasks files changed by another program, compacting once merged")
+                    return
+                if self._write_snapshot():
+                    return
+            logging.info("JSON - Other programs keep writing the tasks files, compacting later")
+
+    def changed_on_disk(self) -> bool:
+        """
+        Returns: True if the tasks files were written since this store last read or wrote them
+
+        """
+        return self._disk_signature() != self._signature
+
+    @property
+    def exists(self) -> bool:
+        # closed without a snapshot, a store may keep its tasks in the journal alone
+        return self.path.exists() or self.journal_path.exists()
+
+    @property
+    def watch_paths(self) -> tuple[Path, Path]:
+        # the files other programs change the tasks through
+        return self.path, self.journal_path
+
+    def read_changes(self) -> TaskChanges:
+        """
+        Finds what other programs changed in the tasks files. Queued changes are journaled
+        first, so they are part of what is compared. Records appended to the journal are
+        compared with the tasks without reading anything else; after another program wrote
+        a snapshot, both files are read again whole.
+        May run on a worker thread; the result is merged on the caller's side with apply_changes().
+        Returns: TaskChanges, or None if no other program wrote the files (or a program
+            that does not take the lock is still writing them)
+
+        """
+        with self._flush_lock:
+            if not (self.changed_on_disk() or self._is_behind()):
+                return None
+            with self._lock:
+                records, self._unsaved_records = self._unsaved_records, []
+            with self._file_lock():
+                self._catch_up()
+                self._write_journal(records)
+            if not self._is_behind():
+                return None
+            try:
+                return self._read_changes()
+            except CorruptTasksFile:
+                logging.info("JSON - Tasks file is being written by another program, reading it later")
+                return None
+
+    def apply_changes(self, changes: TaskChanges) -> bool:
+        """
+        Merges changes found by read_changes() into the tasks in memory, without journaling
+        them: they are in the files already. Tasks go where their new positions sort them;
+        moved and added tasks from records without positions go to the top and to the bottom
+        of their list.
+        Args:
+            changes: result of read_changes()
+
+        Returns: False if tasks were changed in memory since the files were read (read them again)
+
+        """
+        with self._lock:
+            if changes.edits != self._edits:
+                return False
+            self._apply(changes)
+            self._set_unmerged([record for record in self._unmerged_records if record["version"] > changes.version])
+            if self._reread_version is not None and self._reread_version <= changes.version:
+                self._reread_version = None
+        if changes:
+            logging.info("JSON - Merged changes from another program: %d added, %d removed, %d moved, %d renamed, "
+                         "%d reordered", len(changes.added), len(changes.removed), len(changes.moved),
+                         len(changes.renamed), len(changes.reordered))
+        return True
+
+    def compact(self):
+        self.flush(compact=True)
+
+    def close(self):
+        # the journal keeps the changes: a snapshot is only written when one is due anyway
+        if not self.read_only:
+            self.flush()
+        self._close_journal()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    @timed("store.snapshot")
+    def _write_snapshot(self) -> bool:
+        """
+        Folds the journal into a new snapshot. The snapshot is written to a temporary file
+        without the file lock, then renamed over the old one under it, so a crash never
+        leaves a half-written tasks file. Only called from flush(), with the flush lock held.
+        Returns: False if another program wrote the files in the meantime (nothing was renamed)
+
+        """
+        started = time.perf_counter()
+        # copy without the lock so the GUI thread is not held up by a long list, and again
+        # under it if a task changed meanwhile; the table keeps no Python object per task
+        with self._lock:
+            tasks = self.tasks
+            revision = self._revision
+            snapshot_due, self._snapshot_due = self._snapshot_due, False
+        table = TaskTable.from_tasks(tasks)
+        with self._lock:
+            if self._revision != revision:
+                table = TaskTable.from_tasks(self.tasks)
+
+        # one temporary file per process: two programs may compact at the same time
+        temp_path = self.path.with_suffix(f".json.{os.getpid()}.tmp")
+        with open(temp_path, 'wb') as tasks_file:
+            WRITERS[self.file_format](tasks_file, table.rows())
+            tasks_file.flush()
+            os.fsync(tasks_file.fileno())
+
+        with self._file_lock():
+            self._catch_up()
+            if self._is_behind():
+                os.remove(temp_path)
+                with self._lock:
+                    self._snapshot_due = self._snapshot_due or snapshot_due
+                return False
+            os.replace(temp_path, self.path)
+
+            # every journal record is part of the snapshot now, queued ones are not written yet
+            self._version += 1
+            self._close_journal()
+            header = json.dumps({"op": "snapshot", "version": self._version}) + "\n"
+            with open(self.journal_path, 'w') as journal_file:
+                journal_file.write(header)
+            self._journal_base = self._version
+            self._journal_size = os.stat(self.journal_path).st_size
+            self._journal_records = 0
+            self._snapshot_signature = _file_signature(self.path)
+            self._signature = self._disk_signature()
+        logging.info("JSON - Saved %d tasks (%s file, %s) in %.3fs", len(table), self.file_format,
+                     self._library(self.file_format), time.perf_counter() - started)
+        return True
+
+    @staticmethod
+    def _library(file_format: str) -> str:
+        # the library behind the format, for the load and save log lines
+        return json_library() if file_format == FORMAT_COMPACT else "stdlib"
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """
+        Holds the advisory lock every program sharing the tasks files takes to read or write
+        them. The lock is on a file of its own, since the snapshot is replaced by renames.
+        Not reentrant.
+        """
+        if fcntl is None:
+            yield
+            return
+        if self._lock_file is None:
+            try:
+                self._lock_file = open(self.lock_path, 'rb' if self.read_only else 'a')
+            except FileNotFoundError:
+                # read only, and no program wrote the files under the lock yet
+                yield
+                return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> tuple[str, bool]:
+        """
+        Reads the snapshot and replays the journal into the task lists. The snapshot is parsed
+        without the file lock (it is only ever replaced whole), the journal under it.
+        Returns: (format of the snapshot, or None without one; True if the snapshot needs saving again)
+
+        """
+        snapshot = self._read_snapshot()
+        with self._file_lock():
+            if snapshot[0] != _file_signature(self.path):
+                # another program replaced the snapshot meanwhile: read the new one under the lock
+                snapshot = self._read_snapshot()
+            self._snapshot_signature, pending, completed, file_format, outdated = snapshot
+            records = self._read_journal(0)
+            self._signature = self._disk_signature()
+
+        self.pending = pending
+        self.completed = completed
+        self._tasks_by_id = {task.id: task for task in self.tasks}
+        self._tasks_by_title = {task.title: task for task in self.tasks}
+        self._apply(self._replay(records))
+        self._journal_records = len(records)
+        self._set_unmerged([])
+        self._reread_version = None
+        logging.info("JSON - Replayed %d journal records", len(records))
+        return file_format, outdated
+
+    def _read_snapshot(self) -> tuple:
+        # (signature of the file read, pending tasks, completed tasks, file format,
+        #  True if tasks had no ids or positions, or the id or title of another task)
+        pending = []
+        completed = []
+        outdated = False
+        try:
+            tasks_file = open(self.path, 'rb')
+        except FileNotFoundError:
+            logging.info("JSON - No tasks file yet")
+            return None, pending, completed, None, outdated
+
+        # a hand-edited file may give two tasks one id or one normalized title
+        task_ids = set()
+        titles = set()
+        duplicate_ids = 0
+        duplicate_titles = 0
+        with tasks_file:
+            signature = _stat_signature(os.fstat(tasks_file.fileno()))
+            file_format = detect_format(tasks_file)
+            for number, (task_id, title, is_completed, position) in enumerate(READERS[file_format](tasks_file), 1):
+                if position is None:
+                    # tasks saved before tasks had positions keep their order in the file
+                    position = float(number)
+                    outdated = True
+                if task_id in task_ids:
+                    duplicate_ids += 1
+                    task_id = None
+                task = Task(title, is_completed, task_id, position)
+                if task.title in titles:
+                    # the first task with a title keeps it, as when journal records clash
+                    duplicate_titles += 1
+                    continue
+                outdated = outdated or task_id is None
+                task_ids.add(task.id)
+                titles.add(task.title)
+                if is_completed:
+                    completed.append(task)
+                else:
+                    pending.append(task)
+        if duplicate_ids or duplicate_titles:
+            logging.warning("JSON - Gave new ids to %d tasks and skipped %d tasks that had the id or title of "
+                            "an earlier task", duplicate_ids, duplicate_titles)
+            outdated = True
+        # files are written in list order: sorting only costs a pass unless someone edited the file
+        pending.sort(key=_position)
+        completed.sort(key=_position)
+        return signature, pending, completed, file_format, outdated
+
+    def _read_journal(self, offset: int) -> list[dict]:
+        """
+        Reads the journal records from a byte offset on and moves this store's place in the
+        files past them. Called with the file lock held.
+        Args:
+            offset: 0, or the end of the records this store read or wrote before
+
+        Returns: the records, without the snapshot record
+
+        """
+        if offset == 0:
+            self._journal_base = 0
+        records = []
+        try:
+            journal_file = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            self._journal_size = 0
+            return records
+
+        with journal_file:
+            journal_file.seek(offset)
+            for line in journal_file:
+                if not line.endswith(b"\n"):
+                    # the last record was cut short by a crash: cut it off, or the next append
+                    # would land on the same line and be lost with it
+                    if not self.read_only:
+                        os.truncate(self.journal_path, offset)
+                        logging.warning("JSON - Cut a broken record off the end of the journal")
+                    break
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning("JSON - Skipped a broken journal record")
+                    continue
+                # records written before store versions count one version each
+                self._version = max(self._version, record.get("version", self._version + 1))
+                record["version"] = self._version
+                if record["op"] == "snapshot":
+                    self._journal_base = self._version
+                else:
+                    records.append(record)
+        self._journal_size = offset
+        return records
+
+    def _journal_state(self) -> tuple[int, int]:
+        # (version in the journal's snapshot record, 0 without one; size of the journal in bytes)
+        try:
+            journal_file = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return 0, 0
+        with journal_file:
+            first_line = journal_file.readline()
+            size = os.fstat(journal_file.fileno()).st_size
+        try:
+            record = json.loads(first_line) if first_line else {}
+        except json.JSONDecodeError:
+            record = {}
+        return (record["version"] if record.get("op") == "snapshot" else 0), size
+
+    def _catch_up(self):
+        """
+        Compares the files with this store's place in them and reads the journal records
+        other programs appended since. Called with the file lock held.
+        """
+        base, size = self._journal_state()
+        snapshot_signature = _file_signature(self.path)
+        if snapshot_signature != self._snapshot_signature or base != self._journal_base or size < self._journal_size:
+            # another program wrote a snapshot: the tasks are compared with both files whole
+            self._close_journal()
+            self._snapshot_signature = snapshot_signature
+            self._journal_records = len(self._read_journal(0))
+            with self._lock:
+                self._set_unmerged([])
+                self._reread_version = self._version
+        elif size > self._journal_size:
+            records = self._read_journal(self._journal_size)
+            self._journal_records += len(records)
+            with self._lock:
+                self._unmerged_records.extend(records)
+                self._unmerged_keys.update(self._record_keys(records))
+        self._signature = self._disk_signature()
+
+    def _write_journal(self, records: list[dict]):
+        """
+        Stamps records with the next store versions and appends them to the journal in one
+        write. Called with the file lock held, after _catch_up().
+        """
+        if not records:
+            return
+        with self._lock:
+            if not self._unmerged_keys.isdisjoint(self._record_keys(records)):
+                # these records are in memory already, but come after the other programs' records
+                # in the journal: only reading the files whole puts both in journal order
+                self._set_unmerged([])
+                self._reread_version = self._version + len(records)
+
+        if self._journal_file is None:
+            self._journal_file = open(self.journal_path, 'a')
+        for record in records:
+            self._version += 1
+            record["version"] = self._version
+        self._journal_file.write("".join(json.dumps(record) + "\n" for record in records))
+        self._journal_file.flush()
+        self._journal_size = os.fstat(self._journal_file.fileno()).st_size
+        self._journal_records += len(records)
+        self._signature = self._disk_signature()
+
+    @staticmethod
+    def _record_keys(records: list[dict]) -> set[str]:
+        # the ids and titles records touch
+        keys = {record.get(key) for record in records for key in ("id", "title", "new_title")}
+        keys.discard(None)
+        return keys
+
+    def _set_unmerged(self, records: list[dict]):
+        self._unmerged_records = records
+        self._unmerged_keys = self._record_keys(records)
+
+    def _is_behind(self) -> bool:
+        # True while other programs' changes are in the files but not in memory
+        return bool(self._unmerged_records) or self._reread_version is not None
+
+    def _merge(self) -> bool:
+        # merges the other programs' changes before a snapshot; False if tasks were changed here meanwhile
+        try:
+            changes = self._read_changes()
+        except CorruptTasksFile:
+            return False
+        return self.apply_changes(changes)
+
+    def _read_changes(self) -> TaskChanges:
+        """
+        Compares the files with the tasks in memory, with the flush lock held and the queued
+        records journaled
+        Returns: TaskChanges
+
+        """
+        if self._reread_version is None:
+            with self._lock:
+                changes = self._replay(self._unmerged_records)
+                changes.edits = self._edits
+                changes.version = self._version
+            return changes
+
+        disk = TaskStore(self.path, self.file_format, read_only=True)
+        try:
+            disk._read()
+        finally:
+            disk.close()
+        tasks = {task.id: task for task in disk.tasks}
+        with self._lock:
+            tasks.update((task_id, None) for task_id in self._tasks_by_id if task_id not in tasks)
+            changes = self._diff(tasks)
+            changes.edits = self._edits
+            # everything up to where the other store stopped reading is in the changes
+            self._version = max(self._version, disk._version)
+            self._journal_base = disk._journal_base
+            self._journal_size = disk._journal_size
+            self._journal_records = disk._journal_records
+            self._snapshot_signature = disk._snapshot_signature
+            self._signature = disk._signature
+            self._set_unmerged([])
+            changes.version = self._version
+        return changes
+
+    def _replay(self, records: list[dict]) -> TaskChanges:
+        """
+        Works out what journal records change in the tasks in memory, without changing them.
+        Records are applied idempotently, so a crash between writing a snapshot and emptying
+        the journal does not apply a change twice. Records are matched by id, or by title for
+        records written before tasks had ids. A record that would give two tasks the same
+        title is skipped: when two programs add or rename tasks to one title, the first wins.
+        Returns: TaskChanges
+
+        """
+        # changed copies of the tasks, by id (None once deleted), and the ids of the titles they took or freed
+        tasks = {}
+        owners = {}
+
+        def find(task_id: str) -> Task:
+            return tasks[task_id] if task_id in tasks else self._tasks_by_id.get(task_id)
+
+        def owner(title: str) -> str:
+            if title in owners:
+                return owners[title]
+            task = self._tasks_by_title.get(title)
+            return task.id if task is not None else None
+
+        for record in records:
+            task_id = record["id"] if "id" in record else owner(record["title"])
+            task = find(task_id) if task_id is not None else None
+            op = record["op"]
+            if op == "add":
+                if task is None and owner(record["title"]) is None:
+                    task = Task(record["title"], record["is_completed"], task_id, record.get("position"))
+                    tasks[task.id] = task
+                    owners[task.title] = task.id
+            elif task is None:
+                continue
+            elif op == "delete":
+                tasks[task.id] = None
+                owners[task.title] = None
+            elif op in ("set_completed", "reorder"):
+                # records written before tasks had positions have none: the task goes to the top
+                tasks[task.id] = Task(task.title, record["is_completed"], task.id, record.get("position"))
+            elif op == "rename" and owner(record["new_title"]) in (None, task.id):
+                tasks[task.id] = Task(record["new_title"], task.is_completed, task.id, task.position)
+                owners[task.title] = None
+                owners[record["new_title"]] = task.id
+        return self._diff(tasks)
+
+    def _diff(self, tasks: dict) -> TaskChanges:
+        # compares tasks by id (None for a deleted task, position None for the top of its list) with the tasks in memory
+        changes = TaskChanges()
+        for task_id, task in tasks.items():
+            current = self._tasks_by_id.get(task_id)
+            if task is None:
+                if current is not None:
+                    changes.removed.append(current)
+            elif current is None:
+                changes.added.append(task)
+            else:
+                if current.title != task.title:
+                    changes.renamed.append((current, current.title, task.title))
+                if current.is_completed != task.is_completed:
+                    changes.moved.append(current)
+                if task.position is not None and current.position != task.position:
+                    changes.reordered.append((current, current.position, task.position))
+        return changes
+
+    def _apply(self, changes: TaskChanges):
+        self._revision += 1
+        positions = {task: position for task, _, position in changes.reordered}
+        # a task may be both moved and reordered: take it out of its list once
+        self._detach(list(dict.fromkeys([*changes.removed, *changes.moved, *positions])))
+        for task in changes.removed:
+            self._unindex(task)
+
+        # free every old title first: two tasks may have swapped titles
+        for task, old_title, _ in changes.renamed:
+            del self._tasks_by_title[old_title]
+        for task, _, title in changes.renamed:
+            task.title = title
+            self._tasks_by_title[title] = task
+
+        for task in changes.moved:
+            task.change_completion_status(not task.is_completed)
+        for task, position in positions.items():
+            task.position = position
+        added = [task for task in changes.added if task.position is not None]
+        for completed, task_list in ((False, self.pending), (True, self.completed)):
+            self._insert_sorted(task_list, [task for task in itertools.chain(positions, added)
+                                            if task.is_completed == completed])
+            # tasks from records written before tasks had positions
+            top = [task for task in changes.moved if task not in positions and task.is_completed == completed]
+            if top:
+                self._place_positions(top, task_list, 0)
+                task_list[:0] = top
+            self._append_to_list(task_list, [task for task in changes.added
+                                             if task.position is None and task.is_completed == completed])
+        for task in changes.added:
+            self._index(task)
+
+    def _disk_signature(self) -> tuple:
+        return _file_signature(self.path), _file_signature(self.journal_path)
+
+    def _place(self, tasks: list[Task], completed: bool, row: int, op: str) -> list[float]:
+        """
+        Puts tasks taken out of their lists at a row of the pending or completed list, with
+        positions between the rows' neighbours, and journals one op record per task
+        Returns: the new positions of the tasks
+
+        """
+        task_list = self.completed if completed else self.pending
+        self._place_positions(tasks, task_list, row)
+        for task in tasks:
+            if task.is_completed != completed:
+                task.change_completion_status(completed)
+            self._append({"op": op, "id": task.id, "title": task.title, "is_completed": completed,
+                          "position": task.position})
+        task_list[row:row] = tasks
+        return [task.position for task in tasks]
+
+    def _place_positions(self, tasks: list[Task], task_list: list[Task], row: int):
+        # gives tasks positions between the tasks above and at a row of a list
+        positions = self._positions_at(task_list, row, len(tasks))
+        if positions is None:
+            # the neighbours are too close
+            self._renumber(task_list, row, len(tasks))
+            positions = self._positions_at(task_list, row, len(tasks))
+        for task, position in zip(tasks, positions):
+            task.position = position
+
+    @staticmethod
+    def _positions_at(task_list: list[Task], row: int, count: int) -> list[float]:
+        return Task.positions_between(task_list[row - 1].position if row else None,
+                                      task_list[row].position if row < len(task_list) else None, count)
+
+    def _renumber(self, task_list: list[Task], row: int, count: int):
+        """
+        Spaces the positions around a row of a list evenly again, keeping the order, with room
+        for count tasks at the row. The rows around it are taken in a window that doubles until
+        the tasks outside it are far enough apart to give its tasks positions at least 1.0
+        apart, or it reaches the ends of the list. Each task of the window is journaled as a
+        reorder record; a window longer than COMPACT_THRESHOLD makes the next flush (on the
+        save thread in the GUI) write a snapshot instead.
+        """
+        size = 1
+        while True:
+            low, high = max(row - size, 0), min(row + size, len(task_list))
+            previous = task_list[low - 1].position if low else None
+            following = task_list[high].position if high < len(task_list) else None
+            if previous is None or following is None or following - previous >= high - low + count + 1:
+                break
+            size *= 2
+
+        window = task_list[low:high]
+        positions = Task.positions_between(previous, following, len(window) + count)
+        # the positions of the tasks to come are left out
+        del positions[row - low:row - low + count]
+        for task, position in zip(window, positions):
+            task.position = position
+        if len(window) > self.COMPACT_THRESHOLD:
+            self._snapshot_due = True
+        else:
+            for task in window:
+                self._append({"op": "reorder", "id": task.id, "title": task.title, "is_completed": task.is_completed,
+                              "position": task.position})
+        logging.info("JSON - Renumbered the positions of %d tasks", len(window))
+
+    def _append_to_list(self, task_list: list[Task], tasks: list[Task]):
+        # puts tasks at the bottom of a list
+        if tasks:
+            self._place_positions(tasks, task_list, len(task_list))
+            task_list.extend(tasks)
+
+    def _insert_sorted(self, task_list: list[Task], tasks: list[Task]):
+        # puts tasks with positions where they sort
+        if len(tasks) <= self.BISECT_LIMIT:
+            for task in tasks:
+                insort(task_list, task, key=_position)
+        else:
+            task_list.extend(tasks)
+            task_list.sort(key=_position)
+
+    def _detach(self, tasks: list[Task]):
+        # takes tasks out of their lists
+        if len(tasks) <= self.BISECT_LIMIT:
+            for task in tasks:
+                task_list = self.completed if task.is_completed else self.pending
+                del task_list[self._index_of(task_list, task)]
+        else:
+            leaving = set(tasks)
+            self.pending[:] = [task for task in self.pending if task not in leaving]
+            self.completed[:] = [task for task in self.completed if task not in leaving]
+
+    @staticmethod
+    def _index_of(task_list: list[Task], task: Task) -> int:
+        # finds a task of a list by its position, in O(log n) unless many tasks share it
+        for index in range(bisect_left(task_list, task.position, key=_position), len(task_list)):
+            if task_list[index] is task:
+                return index
+            if task_list[index].position != task.position:
+                break
+        raise TaskError(f"Task {task.id} is not in the {'completed' if task.is_completed else 'pending'} list")
+
+    def _index(self, task: Task):
+        self._tasks_by_id[task.id] = task
+        self._tasks_by_title[task.title] = task
+
+    def _unindex(self, task: Task):
+        # only if the task holds its id and title: a task that was never indexed must not unindex another
+        if self._tasks_by_id.get(task.id) is task:
+            del self._tasks_by_id[task.id]
+        if self._tasks_by_title.get(task.title) is task:
+            del self._tasks_by_title[task.title]
+
+    def _append(self, record: dict):
+        self._unsaved_records.append(record)
+        self._edits += 1
+        self._revision += 1
+
+    def _close_journal(self):
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+
+
+def read_tasks(path: Path) -> tuple[list[Task], list[Task]]:
+    """
+    Reads the tasks of a JSON store without writing its files, for moving them to another backend.
+    A tasks file that cannot be read raises CorruptTasksFile and is left where it is.
+    Args:
+        path: path of the JSON tasks file
+
+    Returns: (pending tasks, completed tasks)
+
+    """
+    store = TaskStore(path, read_only=True)
+    try:
+        store._read()
+    finally:
+        store.close()
+    return store.pending, store.completed
+
+
+def open_store(path: Path, backend: str = BACKEND_JSON, file_format: str = FORMAT_JSON):
+    """
+    Creates the task store for a backend
+    Args:
+        path: path of the JSON tasks file
+        backend: BACKEND_JSON, BACKEND_SQLITE to keep the tasks in a database next to
+            the JSON file, or BACKEND_MMAP to keep them in a memory-mapped file next to it
+            (the JSON file is migrated into either on first run)
+        file_format: task_codec format the JSON backend writes its snapshots in
+
+    Returns: TaskStore, SqliteTaskStore or MappedTaskStore, not loaded yet
+
+    """
+    path = Path(path)
+    if backend == BACKEND_SQLITE:
+        from sqlite_store import SqliteTaskStore
+        return SqliteTaskStore(path.with_suffix(".db"), json_path=path)
+    if backend == BACKEND_MMAP:
+        from mapped_store import MappedTaskStore
+        return MappedTaskStore(path.with_suffix(".taskmap"), json_path=path)
+    if backend == BACKEND_JSON:
+        return TaskStore(path, file_format)
+    raise ValueError(f"Unknown task store backend: {backend}")
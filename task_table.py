@@ -0,0 +1,167 @@
+"""
+Contains TaskTable, a columnar container for large task lists
+"""
+from array import array
+from itertools import accumulate, chain, compress, count
+from operator import attrgetter
+from pathlib import Path
+
+from task import Task
+from task_codec import FORMAT_JSON, WRITERS, read_tasks
+
+# rows() reads the columns this many rows at a time; a multiple of 8, so chunks start on a bitmap byte
+ROWS_CHUNK_SIZE = 4096
+
+# the completion statuses of the 8 rows of every bitmap byte, lowest bit first
+_BYTE_BITS = [tuple(bool(byte >> bit & 1) for bit in range(8)) for byte in range(256)]
+
+
+class _StringPool:
+    """
+    Many strings kept as one, with the offsets of their ends. Strings appended one at a time
+    wait in a list until the pool is read.
+    """
+
+    def __init__(self, strings: list[str] = ()):
+        self._text = "".join(strings)
+        self._pending = []
+        self._ends = array("Q", [0])
+        self._ends.extend(accumulate(map(len, strings)))
+
+    def append(self, string: str):
+        self._pending.append(string)
+        self._ends.append(self._ends[-1] + len(string))
+
+    def __getitem__(self, index: int) -> str:
+        return self._joined()[self._ends[index]:self._ends[index + 1]]
+
+    def slice(self, start: int, stop: int) -> list[str]:
+        text = self._joined()
+        ends = self._ends[start:stop + 1]
+        return [text[left:right] for left, right in zip(ends, ends[1:])]
+
+    def _joined(self) -> str:
+        if self._pending:
+            self._text += "".join(self._pending)
+            self._pending = []
+        return self._text
+
+
+class TaskTable:
+    """
+    Stores many tasks as columns instead of one Task object per task: ids and titles each
+    live in one string pool indexed by an offset array, so any id is kept as it is, the
+    completion statuses are bits of a bytearray and the positions are 64-bit floats. A table
+    holds no Python object per task, so it gives the garbage collector nothing to scan and
+    is never changed by the tasks it was copied from. Task objects are only created when a
+    row is read.
+    """
+
+    def __init__(self):
+        self._ids = _StringPool()
+        self._titles = _StringPool()
+        self._completed = bytearray()
+        self._positions = array("d")
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> Task:
+        """
+        Materializes a Task for one row. Changes to it are not written back to the table.
+        """
+        index = self._check_index(index)
+        return Task(self._titles[index], self.is_completed(index), self._ids[index], self._positions[index])
+
+    def __iter__(self):
+        for task_id, title, is_completed, position in self.rows():
+            yield Task(title, is_completed, task_id, position)
+
+    def append(self, title: str, is_completed: bool = False, task_id: str = None, position: float = None):
+        self._ids.append(task_id or Task.new_id())
+        self._titles.append(Task.normalize_title(title))
+        if self._length % 8 == 0:
+            self._completed.append(0)
+        # rows without a position keep the order they were appended in
+        self._positions.append(position if position is not None else float(self._length + 1))
+        self._length += 1
+        self.set_completed(self._length - 1, is_completed)
+
+    def task_id(self, index: int) -> str:
+        return self._ids[self._check_index(index)]
+
+    def title(self, index: int) -> str:
+        return self._titles[self._check_index(index)]
+
+    def is_completed(self, index: int) -> bool:
+        index = self._check_index(index)
+        return bool(self._completed[index >> 3] & (1 << (index & 7)))
+
+    def position(self, index: int) -> float:
+        return self._positions[self._check_index(index)]
+
+    def set_completed(self, index: int, status: bool):
+        index = self._check_index(index)
+        if status:
+            self._completed[index >> 3] |= 1 << (index & 7)
+        else:
+            self._completed[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def rows(self):
+        """
+        Yields (id, title, is_completed, position) tuples without creating Task objects
+        """
+        for start in range(0, self._length, ROWS_CHUNK_SIZE):
+            stop = min(start + ROWS_CHUNK_SIZE, self._length)
+            # zip stops at the last row: the bits of a partly used last byte are left over
+            yield from zip(self._ids.slice(start, stop), self._titles.slice(start, stop),
+                           chain.from_iterable(map(_BYTE_BITS.__getitem__, self._completed[start >> 3:(stop + 7) >> 3])),
+                           self._positions[start:stop])
+
+    @classmethod
+    def from_tasks(cls, tasks: list[Task]) -> "TaskTable":
+        """
+        Copies tasks into a new table a column at a time
+        Args:
+            tasks: list of Task objects
+
+        Returns: TaskTable with one row per task, in list order
+
+        """
+        table = cls()
+        table._ids = _StringPool(list(map(attrgetter("id"), tasks)))
+        table._titles = _StringPool(list(map(attrgetter("title"), tasks)))
+        table._positions = array("d", map(attrgetter("position"), tasks))
+        table._completed = bytearray((len(tasks) + 7) // 8)
+        for index in compress(count(), map(attrgetter("is_completed"), tasks)):
+            table._completed[index >> 3] |= 1 << (index & 7)
+        table._length = len(tasks)
+        return table
+
+    @classmethod
+    def load(cls, path: Path) -> "TaskTable":
+        """
+        Streams a tasks file, in any task_codec format, into a new table
+        Args:
+            path: path of the tasks file
+
+        Returns: TaskTable with one row per task in the file
+
+        """
+        table = cls()
+        with open(path, 'rb') as tasks_file:
+            for task_id, title, is_completed, position in read_tasks(tasks_file):
+                table.append(title, is_completed, task_id, position)
+        return table
+
+    def dump(self, path: Path, file_format: str = FORMAT_JSON):
+        with open(path, 'wb') as tasks_file:
+            WRITERS[file_format](tasks_file, self.rows())
+
+    def _check_index(self, index: int) -> int:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("task index out of range")
+        return index
@@ -0,0 +1,32 @@
+"""
+Runs benchmark.py's benchmarks as tests. BENCHMARK_SIZES picks the list sizes (default: 1k) and
+BENCHMARK_BASELINE, a file saved with benchmark.py --save-baseline, fails the results that got slower
+or bigger than BENCHMARK_THRESHOLD (default: 0.25) allows
+"""
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from benchmark import BENCHMARKS, SIZES, find_regressions, make_tasks, run_benchmark
+
+BENCHMARK_SIZES = os.environ.get("BENCHMARK_SIZES", "1k").split()
+
+
+@pytest.fixture(scope="module", params=BENCHMARK_SIZES)
+def sized_tasks(request):
+    return request.param, make_tasks(SIZES[request.param])
+
+
+@pytest.mark.parametrize("name", BENCHMARKS)
+def test_benchmark(name, sized_tasks, tmp_path):
+    size, tasks = sized_tasks
+    result = run_benchmark(BENCHMARKS[name], tasks, tmp_path, 1)
+    assert result["seconds"] >= 0 and result["peak_mb"] >= 0
+
+    baseline_path = os.environ.get("BENCHMARK_BASELINE")
+    if baseline_path:
+        baseline = json.loads(Path(baseline_path).read_text())["results"]
+        threshold = float(os.environ.get("BENCHMARK_THRESHOLD", "0.25"))
+        assert find_regressions({f"{name}[{size}]": result}, baseline, threshold) == []
@@ -0,0 +1,85 @@
+import pytest
+
+from mapped_store import (HEADER, HEADER_SIZE, MAGIC, OFFSET, RECORD, STATUS_COMPLETED, STATUS_DELETED,
+                          STATUS_PENDING, VERSION_1, MappedTaskStore)
+from task import Task, TaskError
+
+
+def test_a_second_program_is_refused_until_close(tmp_path):
+    path = tmp_path / "tasks.taskmap"
+    store = MappedTaskStore(path)
+    store.load()
+    store.add(Task("A"))
+
+    with pytest.raises(TaskError):
+        MappedTaskStore(path).load()
+
+    store.close()
+    other = MappedTaskStore(path)
+    other.load()
+    assert [task.title for task in other.pending] == ["A"]
+    other.close()
+
+
+def test_reorder_is_refused_with_a_task_error(tmp_path):
+    store = MappedTaskStore(tmp_path / "tasks.taskmap")
+    store.load()
+    first, second = Task("A"), Task("B")
+    store.add(first)
+    store.add(second)
+    with pytest.raises(TaskError):
+        store.reorder([second.id], False, first.id)
+    assert [task.title for task in store.pending] == ["A", "B"]
+    store.close()
+
+
+def _reopened(store: MappedTaskStore) -> MappedTaskStore:
+    store.close()
+    store = MappedTaskStore(store.path)
+    store.load()
+    return store
+
+
+def _places(store: MappedTaskStore) -> list[list[tuple[str, float]]]:
+    return [[(task.title, task.position) for task in tasks] for tasks in (store.pending, store.completed)]
+
+
+@pytest.mark.parametrize("compact", (False, True))
+def test_moved_tasks_keep_their_place_when_the_file_is_opened_again(tmp_path, compact):
+    store = MappedTaskStore(tmp_path / "tasks.taskmap")
+    store.load()
+    tasks = [Task(title, title in "CE") for title in "ABCDE"]
+    store.add_many(tasks)
+    assert [task.position for task in tasks] == [1.0, 2.0, 1.0, 3.0, 2.0]
+    store.move_tasks([tasks[3].id], True)
+    store.move_tasks([tasks[2].id, tasks[4].id], False)
+    store.add(Task("F"))
+    if compact:
+        store.compact()
+    expected = [[("C", -1.0), ("E", 0.0), ("A", 1.0), ("B", 2.0), ("F", 4.0)], [("D", 0.0)]]
+    assert _places(store) == expected
+    store = _reopened(store)
+    assert _places(store) == expected
+    store.close()
+
+
+def test_files_without_positions_are_upgraded(tmp_path):
+    path = tmp_path / "tasks.taskmap"
+    records = [RECORD.pack(len(task_id), len(title)) + task_id + title
+               for task_id, title in ((b"id-a", b"A"), (b"id-b", b"B"), (b"id-c", b"C"))]
+    capacity = 4
+    data_start = HEADER_SIZE + capacity * (1 + OFFSET.size)
+    offsets = [data_start + sum(map(len, records[:number])) for number in range(len(records))]
+    with open(path, "wb") as tasks_file:
+        header = HEADER.pack(MAGIC, VERSION_1, capacity, 3, 1, 1, offsets[-1] + len(records[-1]))
+        tasks_file.write(header.ljust(HEADER_SIZE, b"\0"))
+        tasks_file.write(bytes([STATUS_COMPLETED, STATUS_DELETED, STATUS_PENDING, 0]))
+        tasks_file.write(b"".join(OFFSET.pack(offset) for offset in offsets + [0]))
+        tasks_file.write(b"".join(records))
+
+    store = MappedTaskStore(path)
+    store.load()
+    assert [(task.id, task.title, task.position) for task in store.tasks] == [("id-c", "C", 1.0), ("id-a", "A", 1.0)]
+    store = _reopened(store)
+    assert [task.title for task in store.tasks] == ["C", "A"]
+    store.close()
@@ -0,0 +1,32 @@
+from search_index import TaskSearchIndex, tokenize
+from task import Task
+
+
+def _index(*titles: str) -> TaskSearchIndex:
+    index = TaskSearchIndex()
+    index.add_tasks(Task(title, task_id=str(number)) for number, title in enumerate(titles))
+    return index
+
+
+def test_titles_are_split_into_lower_case_words():
+    assert tokenize("Call the plumber, re: kitchen_sink!") == {"call", "the", "plumber", "re", "kitchen_sink"}
+
+
+def test_every_query_word_matches_a_word_prefix():
+    index = _index("Buy milk", "Call the plumber", "Buy a plumbing kit")
+    assert index.search("plumb") == {"1", "2"}
+    assert index.search("BU PLU") == {"2"}
+    assert index.search("milk plumber") == set()
+    assert index.search("  ") == set()
+
+
+def test_changes_are_found_after_a_search():
+    index = _index("Buy milk")
+    index.search("buy")
+    index.add("1", "Buy bread")
+    index.rename("0", "Buy milk", "Drink milk")
+    assert index.search("buy") == {"1"}
+    index.remove("1", "Buy bread")
+    assert index.search("b") == set()
+    assert index.search("mi") == {"0"}
+    assert len(index) == 2
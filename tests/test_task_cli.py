@@ -0,0 +1,84 @@
+import io
+
+import pytest
+
+import task_cli
+from task_store import BACKENDS
+
+
+def _run(tasks_path, backend: str, *argv: str) -> int:
+    return task_cli.main(["--file", str(tasks_path), "--backend", backend, *argv])
+
+
+def _listed(capsys, tasks_path, backend: str) -> list[tuple[str, str]]:
+    capsys.readouterr()
+    assert _run(tasks_path, backend, "ls") == 0
+    return [tuple(line.split("\t")[1:]) for line in capsys.readouterr().out.splitlines()]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_tasks_given_twice_are_changed_once(capsys, tasks_path, backend):
+    assert _run(tasks_path, backend, "add", "A", "B", "C") == 0
+    assert _run(tasks_path, backend, "done", "A", "A") == 0
+    assert _run(tasks_path, backend, "rm", "B", "b") == 0
+    if backend != "mmap":
+        assert _run(tasks_path, backend, "mv", "C", "C") == 0
+    assert _listed(capsys, tasks_path, backend) == [("pending", "C"), ("completed", "A")]
+
+
+def test_import_reports_rejects_in_record_order(capsys, tasks_path, tmp_path):
+    assert _run(tasks_path, "json", "add", "Taken") == 0
+    source = tmp_path / "import.ndjson"
+    source.write_text('{"title": "New"}\n{"title": "taken"}\n"not a task"\n{"title": ""}\n')
+    capsys.readouterr()
+
+    assert _run(tasks_path, "json", "import", str(source)) == 1
+    assert capsys.readouterr().err.splitlines() == [
+        "Rejected record 2: duplicate title",
+        "Rejected record 3: not a task record",
+        "Rejected record 4: title is empty",
+        "Imported 1 tasks, rejected 3",
+    ]
+
+
+def test_ls_lines_can_be_piped_into_other_commands(capsys, monkeypatch, tasks_path):
+    assert _run(tasks_path, "json", "add", "Buy milk", "Pay rent", "Water plants") == 0
+    capsys.readouterr()
+    assert _run(tasks_path, "json", "ls", "--status", "pending") == 0
+    lines = capsys.readouterr().out.splitlines()
+
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(lines[:2]) + "\n"))
+    assert _run(tasks_path, "json", "done") == 0
+    assert _run(tasks_path, "json", "done", "--undo", "Pay rent") == 0
+    assert _listed(capsys, tasks_path, "json") == [("pending", "Pay rent"), ("pending", "Water plants"),
+                                                   ("completed", "Buy milk")]
+
+
+def test_missing_tasks_and_taken_titles_fail(capsys, tasks_path):
+    assert _run(tasks_path, "json", "add", "Buy milk") == 0
+    assert _run(tasks_path, "json", "add", "buy milk", "Pay rent") == 1
+    assert _run(tasks_path, "json", "rm", "nothing", "Pay rent") == 1
+    assert "No task 'nothing'" in capsys.readouterr().err
+    assert _run(tasks_path, "json", "mv", "Buy milk", "--before", "nothing") == 1
+    assert _listed(capsys, tasks_path, "json") == [("pending", "Buy milk")]
+
+
+def test_mv_puts_tasks_above_another_one(capsys, tasks_path):
+    assert _run(tasks_path, "json", "add", "First", "Second", "Third") == 0
+    assert _run(tasks_path, "json", "done", "Second") == 0
+    assert _run(tasks_path, "json", "mv", "Third", "--before", "First") == 0
+    assert _run(tasks_path, "json", "mv", "First", "--before", "Second") == 0
+    assert _listed(capsys, tasks_path, "json") == [("pending", "Third"), ("completed", "First"),
+                                                   ("completed", "Second")]
+
+
+@pytest.mark.parametrize("suffix", (".json", ".ndjson", ".csv"))
+def test_export_and_import(capsys, tmp_path, suffix):
+    source_path, target_path = tmp_path / "source.json", tmp_path / "target.json"
+    assert _run(source_path, "json", "add", "Buy milk", 'Say "hi", then leave') == 0
+    assert _run(source_path, "json", "done", "Buy milk") == 0
+    exported = tmp_path / f"tasks{suffix}"
+    assert _run(source_path, "json", "export", str(exported)) == 0
+
+    assert _run(target_path, "json", "import", str(exported)) == 0
+    assert _listed(capsys, target_path, "json") == _listed(capsys, source_path, "json")
@@ -0,0 +1,100 @@
+import io
+import json
+
+import pytest
+
+import task_codec
+from task_codec import (BINARY_MAGIC_V1, BINARY_RECORD_V1, FORMAT_BINARY, FORMAT_COMPACT, FORMAT_JSON, FORMATS,
+                        CorruptTasksFile, detect_format, read_tasks, write_tasks_json)
+
+ROWS = [
+    ("0000000000000001", "Buy milk", False, 1.0),
+    ("0000000000000002", 'Quote " and back\\slash', True, 1.5),
+    ("0000000000000003", "Ünïcödé ✓ and\nnew line", False, -2.25),
+]
+
+
+def _written(file_format: str, rows) -> io.BytesIO:
+    tasks_file = io.BytesIO()
+    task_codec.WRITERS[file_format](tasks_file, rows)
+    tasks_file.seek(0)
+    return tasks_file
+
+
+@pytest.mark.parametrize("file_format", FORMATS)
+def test_round_trip(file_format):
+    tasks_file = _written(file_format, ROWS)
+    assert detect_format(tasks_file) == file_format
+    assert list(read_tasks(tasks_file)) == ROWS
+
+
+@pytest.mark.parametrize("file_format", FORMATS)
+def test_round_trip_of_no_tasks(file_format):
+    assert list(read_tasks(_written(file_format, []))) == []
+
+
+@pytest.mark.parametrize("file_format", FORMATS)
+def test_many_rows_span_batches_and_chunks(file_format):
+    rows = [(f"{number:016x}", f"Task {number} " + "x" * 100, number % 3 == 0, float(number))
+            for number in range(task_codec.COMPACT_BATCH_SIZE * 2 + 7)]
+    assert list(read_tasks(_written(file_format, rows))) == rows
+
+
+def test_json_is_laid_out_like_json_dump():
+    text = _written(FORMAT_JSON, ROWS).read().decode("utf-8")
+    items = [{"id": task_id, "title": title, "is_completed": is_completed, "position": position}
+             for task_id, title, is_completed, position in ROWS]
+    assert text == json.dumps(items, indent=4)
+
+
+def test_json_export_rows_have_no_positions():
+    text = io.StringIO()
+    write_tasks_json(text, [row[:3] for row in ROWS])
+    assert [sorted(item) for item in json.loads(text.getvalue())] == [["id", "is_completed", "title"]] * len(ROWS)
+
+
+def test_files_without_positions_or_ids_read_as_none():
+    tasks_file = io.BytesIO(json.dumps([{"title": "Old", "is_completed": True}]).encode())
+    assert list(read_tasks(tasks_file)) == [(None, "Old", True, None)]
+
+
+def test_ids_that_are_not_strings_read_as_none():
+    tasks_file = io.BytesIO(json.dumps([{"id": 7, "title": "Odd", "is_completed": False}]).encode())
+    assert list(read_tasks(tasks_file)) == [(None, "Odd", False, None)]
+
+
+def test_binary_files_without_positions_still_read():
+    tasks_file = io.BytesIO()
+    tasks_file.write(BINARY_MAGIC_V1)
+    for task_id, title, is_completed, _ in ROWS:
+        id_bytes, title_bytes = task_id.encode(), title.encode()
+        tasks_file.write(BINARY_RECORD_V1.pack(is_completed, len(id_bytes), len(title_bytes)) + id_bytes + title_bytes)
+    tasks_file.seek(0)
+    assert detect_format(tasks_file) == FORMAT_BINARY
+    assert list(read_tasks(tasks_file)) == [(*row[:3], None) for row in ROWS]
+
+
+@pytest.mark.parametrize("file_format", (FORMAT_COMPACT, FORMAT_BINARY))
+def test_cut_files_are_corrupt(file_format):
+    data = _written(file_format, ROWS).read()
+    with pytest.raises(CorruptTasksFile):
+        list(read_tasks(io.BytesIO(data[:len(data) - 5])))
+
+
+def test_json_that_starts_like_a_compact_file_still_reads():
+    items = [{"id": task_id, "title": title, "is_completed": is_completed, "position": position}
+             for task_id, title, is_completed, position in ROWS]
+    spread = b'[\n{"id": "0000000000000001",\n  "title": "Buy milk", "is_completed": false, "position": 1.0},\n' + \
+        json.dumps(items[1:], indent=2)[1:].encode()
+    # one task a line at first, laid out like a compact file, then indented
+    mixed = b"[\n" + b",\n".join(json.dumps(item).encode() for item in items[:2]) + b",\n" + \
+        json.dumps(items[2:], indent=2)[1:].encode()
+    for data in (spread, mixed):
+        tasks_file = io.BytesIO(data)
+        assert detect_format(tasks_file) == FORMAT_COMPACT
+        assert list(read_tasks(tasks_file)) == ROWS
+
+
+def test_broken_json_is_corrupt():
+    with pytest.raises(CorruptTasksFile):
+        list(read_tasks(io.BytesIO(b'[{"title": "A"}, {"title": ')))
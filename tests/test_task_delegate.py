@@ -0,0 +1,74 @@
+import itertools
+
+import pytest
+from PySide6 import QtCore, QtTest, QtWidgets
+
+import task_delegate
+from task import Task
+from task_delegate import ACTION_DELETE, ACTION_DONE, ACTION_EDIT, CARD_SIZE, CARD_SPACING, TaskCardDelegate
+from task_model import TaskListModel
+
+
+@pytest.fixture
+def view(qt_app):
+    view = QtWidgets.QListView()
+    view.setModel(TaskListModel([Task("Buy milk", position=0.0), Task("Pay rent", position=1.0)]))
+    view.setItemDelegate(TaskCardDelegate(view))
+    view.resize(700, 500)
+    view.show()
+    qt_app.processEvents()
+    yield view
+    view.close()
+
+
+def _settle():
+    # lets the view lay out and paint the rows, then lay them out again with the measured heights
+    for _ in range(3):
+        QtTest.QTest.qWait(10)
+
+
+def _middle(rect: QtCore.QRect) -> int:
+    # height of the middle of the card drawn in a row
+    return rect.top() + (rect.height() - CARD_SPACING) // 2
+
+
+def test_buttons_are_found_left_to_right(qt_app):
+    delegate = TaskCardDelegate()
+    rect = QtCore.QRect(0, 0, 600, CARD_SIZE.height())
+    actions = [delegate.action_at(rect, QtCore.QPoint(x, _middle(rect))) for x in range(rect.width())]
+    assert [action for action, _ in itertools.groupby(actions) if action] == [ACTION_DONE, ACTION_EDIT, ACTION_DELETE]
+    assert delegate.action_at(rect, QtCore.QPoint(rect.width() - 20, 2)) is None
+
+
+def test_clicks_on_a_button_are_signalled_without_selecting(view):
+    clicks = []
+    view.itemDelegate().button_clicked.connect(lambda index, action: clicks.append((index.row(), action)))
+    rect = view.visualRect(view.model().index(1))
+    x = next(x for x in range(rect.width())
+             if view.itemDelegate().action_at(rect, QtCore.QPoint(x, _middle(rect))) == ACTION_EDIT)
+    QtTest.QTest.mouseClick(view.viewport(), QtCore.Qt.MouseButton.LeftButton, QtCore.Qt.KeyboardModifier.NoModifier,
+                            QtCore.QPoint(x + 5, _middle(rect)))
+    assert clicks == [(1, ACTION_EDIT)]
+    assert not view.selectionModel().hasSelection()
+
+
+def test_rows_grow_with_wrapped_titles_once_painted(view):
+    model = view.model()
+    model.append_task(Task("word " * 80, position=2.0))
+    _settle()
+    heights = [view.visualRect(model.index(row)).height() for row in range(3)]
+    assert heights[:2] == [CARD_SIZE.height()] * 2
+    assert heights[2] > CARD_SIZE.height()
+
+    # narrower: the title wraps over more lines
+    view.resize(450, 500)
+    _settle()
+    assert view.visualRect(model.index(2)).height() > heights[2]
+
+
+def test_row_heights_kept_are_bounded(view, monkeypatch):
+    monkeypatch.setattr(task_delegate, "ROW_HEIGHT_CACHE_SIZE", 3)
+    for number in range(5):
+        view.model().append_task(Task(f"Task {number}", position=2.0 + number))
+    _settle()
+    assert len(view.itemDelegate()._row_heights) == 3
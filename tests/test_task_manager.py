@@ -0,0 +1,156 @@
+import io
+import json
+
+import pytest
+
+from task_manager import (TaskManager, DuplicateTitleError, EmptyTitleError, TaskError, STATUS_COMPLETED,
+                          STATUS_PENDING)
+from task_store import BACKEND_JSON, BACKEND_MMAP, BACKEND_SQLITE, BACKENDS
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    return request.param
+
+
+def _opened(tasks_path, backend: str) -> TaskManager:
+    manager = TaskManager(tasks_path, backend)
+    manager.load()
+    return manager
+
+
+def _titles(manager: TaskManager, status: str) -> list[str]:
+    return [task.title for task in manager.tasks(status)]
+
+
+def test_titles_are_normalized_and_unique(tasks_path, backend):
+    manager = _opened(tasks_path, backend)
+    assert manager.add("  buy milk ").title == "Buy milk"
+    with pytest.raises(DuplicateTitleError):
+        manager.add("Buy milk")
+    with pytest.raises(EmptyTitleError):
+        manager.add("   ")
+    manager.close()
+
+
+def test_changes_persist(tasks_path, backend):
+    manager = _opened(tasks_path, backend)
+    milk, rent, plants = (manager.add(title) for title in ("Buy milk", "Pay rent", "Water plants"))
+    manager.move_tasks([milk, plants], True)
+    manager.rename(rent, "pay the rent")
+    manager.delete_tasks([plants])
+    manager.close()
+
+    manager = _opened(tasks_path, backend)
+    assert _titles(manager, STATUS_PENDING) == ["Pay the rent"]
+    assert _titles(manager, STATUS_COMPLETED) == ["Buy milk"]
+    assert manager.find(milk.id).title == "Buy milk"
+    assert manager.find("Pay the rent").id == rent.id
+    assert manager.find("Water plants") is None
+    manager.close()
+
+
+def test_moved_tasks_go_to_the_top(tasks_path, backend):
+    manager = _opened(tasks_path, backend)
+    first, second, third = (manager.add(title) for title in ("First", "Second", "Third"))
+    manager.move_tasks([third, second], True)
+    manager.move_tasks([first], True)
+    assert _titles(manager, STATUS_COMPLETED) == ["First", "Third", "Second"]
+    assert first.is_completed and first.position < third.position
+    manager.close()
+
+
+def test_reorder(tasks_path, backend):
+    manager = _opened(tasks_path, backend)
+    first, second, third = (manager.add(title) for title in ("First", "Second", "Third"))
+    if backend == BACKEND_MMAP:
+        assert not manager.can_reorder
+        with pytest.raises(TaskError):
+            manager.reorder([third], False, first)
+        manager.close()
+        return
+
+    manager.reorder([third], False, first)
+    manager.reorder([first], True)
+    assert _titles(manager, STATUS_PENDING) == ["Third", "Second"]
+    assert _titles(manager, STATUS_COMPLETED) == ["First"]
+    manager.close()
+
+    manager = _opened(tasks_path, backend)
+    assert _titles(manager, STATUS_PENDING) == ["Third", "Second"]
+    manager.close()
+
+
+def test_backends_are_migrated_from_the_json_file(tasks_path):
+    manager = _opened(tasks_path, BACKEND_JSON)
+    manager.add("Pending")
+    manager.add("Done", True)
+    manager.close()
+
+    for backend in (BACKEND_SQLITE, BACKEND_MMAP):
+        manager = _opened(tasks_path, backend)
+        assert (_titles(manager, STATUS_PENDING), _titles(manager, STATUS_COMPLETED)) == (["Pending"], ["Done"])
+        manager.close()
+
+
+@pytest.mark.parametrize("backend", (BACKEND_SQLITE, BACKEND_MMAP))
+def test_migration_leaves_the_json_files_as_they_are(tasks_path, backend):
+    # no ids or positions, and a torn journal record: a JSON store would rewrite both
+    tasks_path.write_text(json.dumps([{"title": "Pending", "is_completed": False},
+                                      {"title": "Done", "is_completed": True}]))
+    journal_path = tasks_path.with_suffix(".journal")
+    journal_path.write_text(json.dumps({"op": "add", "id": "00000000000000aa", "title": "Journaled",
+                                        "is_completed": False}) + '\n{"op": "add", "ti')
+    files = {path: path.read_bytes() for path in (tasks_path, journal_path)}
+
+    manager = _opened(tasks_path, backend)
+    assert (_titles(manager, STATUS_PENDING), _titles(manager, STATUS_COMPLETED)) == (["Pending", "Journaled"],
+                                                                                      ["Done"])
+    manager.close()
+    assert {path: path.read_bytes() for path in files} == files
+    assert not tasks_path.with_suffix(".lock").exists()
+
+
+@pytest.mark.parametrize("backend", (BACKEND_SQLITE, BACKEND_MMAP))
+def test_a_corrupt_json_file_is_not_migrated_or_moved(tasks_path, backend):
+    tasks_path.write_text('[{"title": "A"}, {"ti')
+    manager = _opened(tasks_path, backend)
+    assert list(manager.tasks()) == []
+    manager.close()
+    assert tasks_path.read_text() == '[{"title": "A"}, {"ti'
+
+
+def test_import_keeps_free_ids_and_rejects_bad_records(tasks_path, backend):
+    manager = _opened(tasks_path, backend)
+    taken = manager.add("Taken")
+    records = enumerate([
+        {"id": "00000000000000aa", "title": "Kept id", "is_completed": True},
+        {"id": taken.id, "title": "Taken id"},
+        {"title": "taken"},
+        {"title": "Twice"},
+        {"title": "twice"},
+        {"title": "Bad status", "is_completed": "yes"},
+        ["not", "a", "record"],
+    ], start=1)
+    rejects = []
+    assert manager.import_tasks(records, lambda number, reason: rejects.append(number)) == (3, 4)
+    assert rejects == [3, 5, 6, 7]
+    assert manager.find("Kept id").id == "00000000000000aa"
+    assert manager.find("Taken id").id != taken.id
+    manager.close()
+
+
+def test_export_round_trips_through_import(tmp_path, backend):
+    manager = _opened(tmp_path / "tasks.json", backend)
+    manager.add("Pending")
+    manager.add("Done", True)
+    exported = io.StringIO()
+    manager.export_tasks(exported)
+    manager.close()
+
+    items = json.loads(exported.getvalue())
+    other = _opened(tmp_path / "other.json", backend)
+    assert other.import_tasks(enumerate(items, start=1)) == (2, 0)
+    assert [(task.id, task.title, task.is_completed) for task in other.tasks()] == [
+        (item["id"], item["title"], item["is_completed"]) for item in items]
+    other.close()
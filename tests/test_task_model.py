@@ -0,0 +1,189 @@
+import pytest
+from PySide6 import QtCore, QtWidgets
+
+from task import Task
+from task_delegate import TaskCardDelegate
+from task_manager import TaskManager
+from task_model import TaskListModel
+from task_store import BACKENDS
+
+
+def _tasks(count: int, is_completed: bool = False) -> list[Task]:
+    return [Task(f"Task {number}", is_completed, position=float(number)) for number in range(count)]
+
+
+def _fetched(model: TaskListModel) -> list[str]:
+    return [model.task(row).title for row in range(model.rowCount())]
+
+
+def _fetch_all(model: TaskListModel):
+    while model.canFetchMore():
+        model.fetchMore()
+
+
+def test_rows_show_their_tasks():
+    tasks = _tasks(3)
+    model = TaskListModel(tasks)
+    _fetch_all(model)
+    index = model.index(1)
+    assert index.data() == "Task 1"
+    assert index.data(TaskListModel.TaskRole) is tasks[1]
+    assert index.data(TaskListModel.SelectedRole) is False
+    assert model.data(model.index(3)) is None
+
+
+def test_selection_repaints_only_the_changed_rows():
+    model = TaskListModel(_tasks(5))
+    _fetch_all(model)
+    changed = []
+    model.dataChanged.connect(lambda first, last, roles: changed.append((first.row(), last.row(), roles)))
+    model.set_selected_range(1, 2)
+    model.set_selected_range(3, 10)
+    model.set_selected_range(1, 1, False)
+    model.set_selected_range(7, 9)
+    assert changed == [(1, 2, [TaskListModel.SelectedRole]), (3, 4, [TaskListModel.SelectedRole]),
+                       (1, 1, [TaskListModel.SelectedRole])]
+    assert [model.index(row).data(TaskListModel.SelectedRole) for row in range(5)] == [False, False, True, True, True]
+
+
+def test_removed_rows_are_signalled_once_per_range():
+    tasks = _tasks(10)
+    model = TaskListModel(tasks)
+    _fetch_all(model)
+    removed = []
+    model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+    assert model.remove_rows([8, 1, 2, 7, 2]) == [tasks[1], tasks[2], tasks[7], tasks[8]]
+    assert removed == [(7, 8), (1, 2)]
+    assert _fetched(model) == ["Task 0", "Task 3", "Task 4", "Task 5", "Task 6", "Task 9"]
+    assert model.total_count() == 6
+
+
+def test_a_scattered_selection_resets_the_model_once(monkeypatch):
+    monkeypatch.setattr(TaskListModel, "MAX_REMOVED_RANGES", 2)
+    model = TaskListModel(_tasks(8))
+    _fetch_all(model)
+    model.set_selected_range(0, 7)
+    resets = []
+    model.modelReset.connect(lambda: resets.append(True))
+    model.remove_rows([0, 2, 4, 6])
+    assert resets == [True]
+    assert _fetched(model) == ["Task 1", "Task 3", "Task 5", "Task 7"]
+    assert model.index(0).data(TaskListModel.SelectedRole) is False
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_moved_tasks_show_where_the_store_put_them(tasks_path, backend):
+    manager = TaskManager(tasks_path, backend)
+    manager.load()
+    for number in range(6):
+        manager.add(f"Task {number}", number >= 4)
+    pending, completed = TaskListModel(manager.pending), TaskListModel(manager.completed)
+    _fetch_all(pending)
+    _fetch_all(completed)
+
+    # as App.change_completion_status moves the selected rows
+    moved = pending.remove_rows([3, 1])
+    manager.move_tasks(moved, True)
+    completed.insert_sorted(moved)
+    assert _fetched(pending) == ["Task 0", "Task 2"]
+    assert _fetched(completed) == ["Task 1", "Task 3", "Task 4", "Task 5"]
+    assert [task.title for task in manager.completed] == _fetched(completed)
+    assert (pending.total_count(), completed.total_count()) == (2, 4)
+    manager.close()
+
+
+def test_rows_are_fetched_a_page_at_a_time(monkeypatch):
+    monkeypatch.setattr(TaskListModel, "PAGE_SIZE", 2)
+    model = TaskListModel(_tasks(5))
+    assert (model.rowCount(), model.total_count()) == (0, 5)
+    assert model.canFetchMore()
+    model.fetchMore()
+    assert _fetched(model) == ["Task 0", "Task 1"]
+    model.fetchMore()
+    model.fetchMore()
+    assert model.rowCount() == 5
+    assert not model.canFetchMore()
+
+
+def test_a_filter_fetches_only_matching_rows():
+    tasks = _tasks(6)
+    model = TaskListModel(tasks)
+    model.set_filter({tasks[1].id, tasks[4].id})
+    _fetch_all(model)
+    assert _fetched(model) == ["Task 1", "Task 4"]
+    model.set_filter(set())
+    assert not model.canFetchMore() and model.rowCount() == 0
+    model.set_filter(None)
+    _fetch_all(model)
+    assert model.rowCount() == 6
+
+
+def test_tasks_appended_before_everything_is_fetched_wait_for_their_page(monkeypatch):
+    monkeypatch.setattr(TaskListModel, "PAGE_SIZE", 2)
+    tasks = _tasks(3)
+    model = TaskListModel(tasks)
+    model.fetchMore()
+    added = Task("Added", position=3.0)
+    tasks.append(added)
+    model.append_task(added)
+    assert (model.rowCount(), model.total_count()) == (2, 4)
+    _fetch_all(model)
+    assert _fetched(model) == ["Task 0", "Task 1", "Task 2", "Added"]
+
+    last = Task("Last", position=4.0)
+    tasks.append(last)
+    model.append_task(last)
+    assert model.task(4) is last
+
+
+def test_a_view_fetches_only_the_rows_it_shows(qt_app):
+    model = TaskListModel(_tasks(5000))
+    view = QtWidgets.QListView()
+    view.setModel(model)
+    view.setItemDelegate(TaskCardDelegate(view))
+    view.resize(700, 500)
+    view.show()
+    qt_app.processEvents()
+    assert 0 < model.rowCount() < model.total_count()
+    view.close()
+
+
+def test_tasks_are_inserted_where_their_positions_sort_them():
+    model = TaskListModel(_tasks(4))
+    _fetch_all(model)
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+    model.insert_sorted([Task("Last", position=9.0), Task("Top", position=-1.0), Task("Between", position=1.5),
+                         Task("Also between", position=1.25)])
+    assert _fetched(model) == ["Top", "Task 0", "Task 1", "Also between", "Between", "Task 2", "Task 3", "Last"]
+    # one signal per row the tasks land on, the bottom one first
+    assert inserted == [(4, 4), (2, 3), (0, 0)]
+
+
+def test_tasks_below_the_fetched_rows_wait_for_their_page(monkeypatch):
+    monkeypatch.setattr(TaskListModel, "PAGE_SIZE", 2)
+    tasks = _tasks(4)
+    model = TaskListModel(tasks)
+    model.fetchMore()
+    top, bottom = Task("Top", position=-1.0), Task("Bottom", position=9.0)
+    tasks.insert(0, top)
+    tasks.append(bottom)
+    model.insert_sorted([top, bottom])
+    assert _fetched(model) == ["Top", "Task 0", "Task 1"]
+    assert model.total_count() == 6
+    _fetch_all(model)
+    assert _fetched(model) == ["Top", "Task 0", "Task 1", "Task 2", "Task 3", "Bottom"]
+
+
+def test_dropped_tasks_are_carried_as_ids():
+    tasks = _tasks(3)
+    model = TaskListModel(tasks)
+    _fetch_all(model)
+    dropped = []
+    model.tasks_dropped.connect(lambda task_ids, row: dropped.append((task_ids, row)))
+    data = model.mimeData([model.index(2), model.index(0)])
+    assert model.dropMimeData(data, QtCore.Qt.DropAction.MoveAction, -1, 0, QtCore.QModelIndex())
+    assert not model.dropMimeData(data, QtCore.Qt.DropAction.CopyAction, 1, 0, QtCore.QModelIndex())
+    assert dropped == [([tasks[0].id, tasks[2].id], 3)]
+    # the receiver of tasks_dropped moves the tasks, not the model
+    assert _fetched(model) == ["Task 0", "Task 1", "Task 2"]
@@ -0,0 +1,167 @@
+import asyncio
+import json
+
+import pytest
+
+import task_server
+from task_manager import TaskManager
+from task_store import BACKEND_MMAP, BACKENDS
+
+
+def _request(method: str, target: str, body=None, headers: str = "") -> bytes:
+    data = json.dumps(body).encode() if body is not None else b""
+    return f"{method} {target} HTTP/1.1\r\nContent-Length: {len(data)}\r\n{headers}\r\n".encode() + data
+
+
+async def _read_answer(reader: asyncio.StreamReader) -> tuple[int, object]:
+    head = (await reader.readuntil(b"\r\n\r\n")).decode()
+    status = int(head.split(" ", 2)[1])
+    headers = dict(line.lower().split(": ", 1) for line in head.split("\r\n")[1:] if line)
+    if headers.get("transfer-encoding") == "chunked":
+        body = b""
+        while size := int((await reader.readline()).strip(), 16):
+            body += await reader.readexactly(size + 2)
+            body = body[:-2]
+        await reader.readline()
+        return status, [json.loads(line) for line in body.decode().splitlines()]
+    body = await reader.readexactly(int(headers.get("content-length", "0")))
+    return status, json.loads(body) if body else None
+
+
+def _exchange(manager: TaskManager, socket_path, *requests: bytes) -> list[tuple[int, object]]:
+    # sends the requests pipelined on one connection and reads every answer
+    async def run():
+        started = asyncio.Event()
+        server = asyncio.create_task(task_server.serve(manager, unix_path=socket_path, started=started))
+        await started.wait()
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(b"".join(requests))
+        answers = [await _read_answer(reader) for _ in requests]
+        writer.close()
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+        return answers
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def manager(tasks_path):
+    manager = TaskManager(tasks_path)
+    manager.load()
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return tmp_path / "tasks.sock"
+
+
+def test_tasks_are_added_changed_and_deleted(manager, socket_path, tasks_path):
+    (status, milk), (status_2, rent) = _exchange(manager, socket_path,
+                                                 _request("POST", "/tasks", {"title": "buy milk"}),
+                                                 _request("POST", "/tasks", {"title": "Pay rent", "is_completed": True}))
+    assert (status, status_2) == (201, 201)
+    assert milk["title"] == "Buy milk" and rent["is_completed"]
+
+    answers = _exchange(manager, socket_path,
+                        _request("POST", f"/tasks/{milk['id']}/toggle"),
+                        _request("PATCH", f"/tasks/{rent['id']}", {"title": "pay the rent", "is_completed": False}),
+                        _request("GET", f"/tasks/{rent['id']}"),
+                        _request("DELETE", f"/tasks/{milk['id']}"),
+                        _request("GET", f"/tasks/{milk['id']}"))
+    assert [status for status, _ in answers] == [200, 200, 200, 204, 404]
+    assert answers[0][1]["is_completed"]
+    assert answers[2][1] == {"id": rent["id"], "title": "Pay the rent", "is_completed": False,
+                             "position": answers[2][1]["position"]}
+
+    reloaded = TaskManager(tasks_path)
+    reloaded.load()
+    assert [task.title for task in reloaded.tasks()] == ["Pay the rent"]
+    reloaded.close()
+
+
+def test_lists_are_paged_filtered_and_streamed(manager, socket_path):
+    for number in range(5):
+        manager.add(f"Task {number}", number == 4)
+    manager.add("Buy milk")
+
+    answers = _exchange(manager, socket_path,
+                        _request("GET", "/tasks?status=pending&limit=2&offset=1"),
+                        _request("GET", "/tasks?q=mil"),
+                        _request("GET", "/tasks?status=completed&stream=1"))
+    page, found, streamed = (body for _, body in answers)
+    assert [task["title"] for task in page["tasks"]] == ["Task 1", "Task 2"]
+    assert (page["total"], page["next_offset"]) == (5, 3)
+    assert [task["title"] for task in found["tasks"]] == ["Buy milk"]
+    assert [task["title"] for task in streamed] == ["Task 4"]
+
+
+def test_patch_before_reorders(manager, socket_path):
+    first, second, third = (manager.add(title) for title in ("First", "Second", "Third"))
+    answers = _exchange(manager, socket_path,
+                        _request("PATCH", f"/tasks/{third.id}", {"before": first.id}),
+                        _request("PATCH", f"/tasks/{first.id}", {"before": None, "is_completed": True}),
+                        _request("PATCH", f"/tasks/{second.id}", {"title": "Renamed", "before": "nothing"}),
+                        _request("GET", "/tasks"))
+    assert [status for status, _ in answers] == [200, 200, 400, 200]
+    assert [(task["title"], task["is_completed"]) for task in answers[3][1]["tasks"]] == [
+        ("Third", False), ("Second", False), ("First", True)]
+
+
+def test_refused_patches_change_nothing(tasks_path, socket_path):
+    manager = TaskManager(tasks_path, BACKEND_MMAP)
+    manager.load()
+    first, second = manager.add("First"), manager.add("Second")
+    answers = _exchange(manager, socket_path,
+                        _request("PATCH", f"/tasks/{second.id}", {"title": "Renamed", "before": first.id}),
+                        _request("PATCH", f"/tasks/{second.id}", {"title": "first", "is_completed": True}))
+    assert [status for status, _ in answers] == [400, 409]
+    manager.close()
+
+    reloaded = TaskManager(tasks_path, BACKEND_MMAP)
+    reloaded.load()
+    assert [(task.title, task.is_completed) for task in reloaded.tasks()] == [("First", False), ("Second", False)]
+    reloaded.close()
+
+
+def test_bad_requests_are_answered_and_the_connection_kept(manager, socket_path):
+    manager.add("Taken")
+    answers = _exchange(manager, socket_path,
+                        _request("POST", "/tasks", {"title": "taken"}),
+                        _request("POST", "/tasks", {"title": "  "}),
+                        _request("POST", "/tasks", {"title": 3}),
+                        _request("GET", "/tasks?limit=x"),
+                        _request("PUT", "/tasks"),
+                        _request("GET", "/nothing"),
+                        _request("GET", "/tasks"))
+    assert [status for status, _ in answers] == [409, 400, 400, 400, 405, 404, 200]
+    assert answers[0][1] == {"error": "Cannot have two tasks with the same title"}
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_streams_are_sent_in_chunks(tasks_path, socket_path, backend, monkeypatch):
+    monkeypatch.setattr(task_server, "STREAM_CHUNK_SIZE", 2)
+    manager = TaskManager(tasks_path, backend)
+    manager.load()
+    for number in range(5):
+        manager.add(f"Task {number}", number % 2 == 1)
+    answers = _exchange(manager, socket_path,
+                        _request("GET", "/tasks?stream=1"),
+                        _request("GET", "/tasks?stream=1&q=task+3"))
+    assert [task["title"] for task in answers[0][1]] == ["Task 0", "Task 2", "Task 4", "Task 1", "Task 3"]
+    assert [task["title"] for task in answers[1][1]] == ["Task 3"]
+    manager.close()
+
+
+def test_unexpected_errors_are_answered_and_the_connection_kept(manager, socket_path, monkeypatch):
+    task = manager.add("Buy milk")
+
+    def rename(task, title):
+        raise RuntimeError("disk on fire")
+    monkeypatch.setattr(manager, "rename", rename)
+    answers = _exchange(manager, socket_path,
+                        _request("PATCH", f"/tasks/{task.id}", {"title": "Buy bread"}),
+                        _request("GET", f"/tasks/{task.id}"))
+    assert answers[0] == (500, {"error": "Internal error: disk on fire"})
+    assert answers[1][0] == 200 and answers[1][1]["title"] == "Buy milk"
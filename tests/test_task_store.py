@@ -0,0 +1,359 @@
+import json
+
+import pytest
+
+import task_store
+from task import Task, TaskError
+from task_codec import FORMATS, detect_format, read_tasks
+from task_store import TaskStore
+
+
+def _titles(store: TaskStore) -> list[str]:
+    return [task.title for task in store.tasks]
+
+
+def _loaded(tasks_path, file_format: str = "json") -> TaskStore:
+    store = TaskStore(tasks_path, file_format)
+    store.load()
+    return store
+
+
+def _status(store: TaskStore) -> tuple[list[str], list[str]]:
+    return [task.title for task in store.pending], [task.title for task in store.completed]
+
+
+def test_journal_replays_every_change(tasks_path):
+    store = _loaded(tasks_path)
+    milk, rent, plants = Task("Buy milk"), Task("Pay rent"), Task("Water plants")
+    for task in (milk, rent, plants):
+        store.add(task)
+    store.flush()
+    store.set_completed(milk.id, True)
+    store.rename(rent.id, "pay the rent")
+    store.delete(plants.id)
+    store.flush()
+    # crash: nothing closes the store
+
+    store = _loaded(tasks_path)
+    assert _status(store) == (["Pay the rent"], ["Buy milk"])
+    assert store.get(rent.id).title == "Pay the rent"
+    assert store.get_by_title("Pay rent") is None
+
+
+def test_journal_is_compacted_once_it_is_long(tasks_path):
+    store = _loaded(tasks_path)
+    task = Task("Toggled")
+    store.add(task)
+    store.compact()
+    for number in range(TaskStore.COMPACT_THRESHOLD):
+        store.set_completed(task.id, number % 2 == 0)
+        store.flush()
+
+    lines = store.journal_path.read_text().splitlines()
+    assert [json.loads(line)["op"] for line in lines] == ["snapshot"]
+    last_status = (TaskStore.COMPACT_THRESHOLD - 1) % 2 == 0
+    assert _status(_loaded(tasks_path)) == (([], ["Toggled"]) if last_status else (["Toggled"], []))
+
+
+@pytest.mark.parametrize("file_format", FORMATS)
+def test_snapshot_keeps_order_and_status(tasks_path, file_format):
+    store = _loaded(tasks_path, file_format)
+    store.add_many([Task(f"Task {number}", number % 3 == 0) for number in range(10)])
+    store.close()
+    with open(tasks_path, "rb") as tasks_file:
+        assert detect_format(tasks_file) == file_format
+
+    store = _loaded(tasks_path)
+    assert _status(store) == ([f"Task {number}" for number in range(10) if number % 3],
+                              [f"Task {number}" for number in range(0, 10, 3)])
+
+
+def test_a_change_made_while_the_snapshot_is_copied_is_in_it(tasks_path, monkeypatch):
+    store = _loaded(tasks_path)
+    milk = Task("Buy milk")
+    store.add(milk)
+    from_tasks = task_store.TaskTable.from_tasks
+
+    def copy_and_rename(tasks):
+        table = from_tasks(tasks)
+        if table.title(0) == "Buy milk":
+            store.rename(milk.id, "Buy bread")
+        return table
+    monkeypatch.setattr(task_store.TaskTable, "from_tasks", copy_and_rename)
+    store.compact()
+
+    with open(tasks_path, "rb") as tasks_file:
+        assert [title for _, title, _, _ in read_tasks(tasks_file)] == ["Buy bread"]
+
+
+def test_files_without_ids_or_positions_are_upgraded(tasks_path):
+    tasks_path.write_text(json.dumps([{"title": "First", "is_completed": False},
+                                      {"title": "Second", "is_completed": True},
+                                      {"title": "Third", "is_completed": False}]))
+    store = _loaded(tasks_path)
+    ids = [task.id for task in store.tasks]
+    assert _status(store) == (["First", "Third"], ["Second"])
+
+    items = json.loads(tasks_path.read_text())
+    assert [item["id"] for item in items] == ids
+    assert all("position" in item for item in items)
+    assert [task.id for task in _loaded(tasks_path).tasks] == ids
+
+
+def test_corrupt_file_is_moved_aside(tasks_path):
+    tasks_path.write_text('[{"title": "A"}, {"ti')
+    store = _loaded(tasks_path)
+    assert store.tasks == []
+    assert tasks_path.with_suffix(".json.corrupt").exists()
+
+
+def test_json_laid_out_like_a_compact_file_is_not_moved_aside(tasks_path):
+    tasks_path.write_text('[\n{"id": "00000000000000aa",\n "title": "A", "is_completed": false, "position": 1}\n]')
+    assert _titles(_loaded(tasks_path)) == ["A"]
+    assert not tasks_path.with_suffix(".json.corrupt").exists()
+
+
+def test_tasks_sharing_an_id_or_a_title_are_told_apart(tasks_path):
+    tasks_path.write_text(json.dumps([{"id": "00000000000000aa", "title": "a", "is_completed": False, "position": 1},
+                                      {"id": "00000000000000bb", "title": "A", "is_completed": True, "position": 2},
+                                      {"id": "00000000000000aa", "title": "B", "is_completed": False, "position": 3}]))
+    store = _loaded(tasks_path)
+    assert _status(store) == (["A", "B"], [])
+    first, second = store.pending
+    assert first.id == "00000000000000aa" and second.id != first.id
+    store.delete_tasks([first.id, second.id])
+    assert store.tasks == [] and not store.contains_title("A")
+    store.close()
+
+    items = json.loads(tasks_path.read_text())
+    assert [(item["id"], item["title"]) for item in items] == [(first.id, "A"), (second.id, "B")]
+
+
+@pytest.mark.parametrize("title", (None, 3))
+def test_tasks_without_a_title_make_the_file_corrupt(tasks_path, title):
+    tasks_path.write_text(json.dumps([{"title": "Kept", "is_completed": False}, {"title": title}]))
+    assert _loaded(tasks_path).tasks == []
+    assert tasks_path.with_suffix(".json.corrupt").exists()
+
+
+def test_reorder_moves_one_record_and_persists(tasks_path):
+    store = _loaded(tasks_path)
+    tasks = [Task(title) for title in "ABCD"]
+    store.add_many(tasks)
+    store.flush()
+    positions = [task.position for task in tasks]
+
+    store.reorder([tasks[3].id], False, tasks[1].id)
+    store.reorder([tasks[0].id], True)
+    store.flush()
+    assert _status(store) == (["D", "B", "C"], ["A"])
+    assert [task.position for task in tasks[1:3]] == positions[1:3]
+    records = store.journal_path.read_text().splitlines()[1:]
+    assert [json.loads(line)["op"] for line in records] == ["reorder", "reorder"]
+
+    assert _status(_loaded(tasks_path)) == (["D", "B", "C"], ["A"])
+
+
+def test_reorder_above_a_moved_task_or_across_lists_is_refused(tasks_path):
+    store = _loaded(tasks_path)
+    pending, done = Task("Pending"), Task("Done", True)
+    store.add(pending)
+    store.add(done)
+    with pytest.raises(ValueError):
+        store.reorder([pending.id], False, pending.id)
+    with pytest.raises(ValueError):
+        store.reorder([pending.id], False, done.id)
+
+
+def test_list_is_renumbered_when_positions_get_too_close(tasks_path):
+    store = _loaded(tasks_path)
+    first, last, moved = Task("First"), Task("Last"), Task("Moved")
+    for task in (first, last, moved):
+        store.add(task)
+    for _ in range(80):
+        # always between the first two: halves the gap every time
+        store.reorder([moved.id], False, last.id)
+        store.reorder([last.id], False, moved.id)
+    store.flush()
+    assert _titles(store) == ["First", "Last", "Moved"]
+    positions = [task.position for task in store.pending]
+    assert positions == sorted(positions) and len(set(positions)) == 3
+
+    assert _titles(_loaded(tasks_path)) == ["First", "Last", "Moved"]
+
+
+def test_renumbering_changes_only_the_tasks_around_the_row(tasks_path):
+    store = _loaded(tasks_path)
+    tasks = [Task(f"Task {number}") for number in range(100)]
+    store.add_many(tasks)
+    store.flush()
+    positions = [task.position for task in tasks]
+    moved, above = tasks[50], tasks[51]
+    for _ in range(80):
+        store.reorder([moved.id], False, above.id)
+        store.reorder([above.id], False, moved.id)
+    assert not store._snapshot_due
+    store.flush()
+
+    changed = {task.id for task, position in zip(tasks, positions) if task.position != position}
+    records = {json.loads(line)["id"] for line in store.journal_path.read_text().splitlines()[1:]}
+    assert changed <= records <= {task.id for task in tasks[40:60]}
+    assert _titles(_loaded(tasks_path)) == _titles(store)
+
+
+def test_changes_of_another_program_are_merged(tasks_path):
+    store = _loaded(tasks_path)
+    milk, rent = Task("Buy milk"), Task("Pay rent")
+    store.add(milk)
+    store.add(rent)
+    store.flush()
+
+    other = _loaded(tasks_path)
+    other.add(Task("Call plumber"))
+    other.set_completed(milk.id, True)
+    other.rename(rent.id, "Pay the rent")
+    other.flush()
+
+    assert store.changed_on_disk()
+    changes = store.read_changes()
+    assert [task.title for task in changes.added] == ["Call plumber"]
+    assert changes.moved == [milk]
+    assert store.apply_changes(changes)
+    assert _status(store) == (["Pay the rent", "Call plumber"], ["Buy milk"])
+    assert store.read_changes() is None
+
+
+def test_changes_made_meanwhile_are_not_overwritten(tasks_path):
+    store = _loaded(tasks_path)
+    store.add(Task("Mine"))
+    store.flush()
+    other = _loaded(tasks_path)
+    other.add(Task("Theirs"))
+    other.flush()
+
+    store.add(Task("Mine too"))
+    store.flush()
+    changes = store.read_changes()
+    # a change was made here after the files were read: the caller reads them again
+    store.add(Task("Latest"))
+    assert not store.apply_changes(changes)
+    assert store.apply_changes(store.read_changes())
+    store.close()
+
+    assert sorted(_titles(_loaded(tasks_path))) == ["Latest", "Mine", "Mine too", "Theirs"]
+
+
+def test_a_snapshot_of_another_program_is_read_whole(tasks_path):
+    store = _loaded(tasks_path)
+    kept, removed = Task("Kept"), Task("Removed")
+    store.add(kept)
+    store.add(removed)
+    store.flush()
+
+    other = _loaded(tasks_path)
+    other.delete(removed.id)
+    other.add_many([Task("Imported")])
+    other.flush()
+
+    changes = store.read_changes()
+    assert changes.removed == [removed]
+    assert [task.title for task in changes.added] == ["Imported"]
+    assert store.apply_changes(changes)
+    assert _titles(store) == ["Kept", "Imported"]
+
+
+def test_records_without_versions_or_positions_replay(tasks_path):
+    store = _loaded(tasks_path)
+    first, second = Task("First"), Task("Second")
+    store.add(first)
+    store.add(second)
+    store.compact()
+    with open(store.journal_path, "a") as journal_file:
+        journal_file.write(json.dumps({"op": "set_completed", "id": first.id, "title": "First",
+                                       "is_completed": True}) + "\n")
+        journal_file.write(json.dumps({"op": "add", "id": "00000000000000aa", "title": "Third",
+                                       "is_completed": True}) + "\n")
+    assert _status(_loaded(tasks_path)) == (["Second"], ["First", "Third"])
+
+
+def test_torn_journal_tail_does_not_swallow_the_next_record(tasks_path):
+    store = TaskStore(tasks_path)
+    store.load()
+    store.add(Task("A"))
+    store.flush()
+    store._close_journal()
+    with open(store.journal_path, "a") as journal_file:
+        # a record cut short by a crash
+        journal_file.write('{"op": "add", "id": "torn", "ti')
+
+    store = TaskStore(tasks_path)
+    store.load()
+    store.add(Task("B"))
+    store.add(Task("C"))
+    store.flush()
+    # crash: nothing closes the store
+
+    store = TaskStore(tasks_path)
+    store.load()
+    assert _titles(store) == ["A", "B", "C"]
+
+
+def test_torn_journal_tail_is_cut_on_catch_up(tasks_path):
+    store = TaskStore(tasks_path)
+    store.load()
+    store.add(Task("A"))
+    store.flush()
+    other = TaskStore(tasks_path)
+    other.load()
+    with open(store.journal_path, "a") as journal_file:
+        journal_file.write('{"op": "add", "id": "torn", "ti')
+
+    store.add(Task("B"))
+    store.flush()
+    other.apply_changes(other.read_changes())
+    assert _titles(other) == ["A", "B"]
+    assert store.journal_path.read_bytes().endswith(b"\n")
+
+
+def test_close_appends_to_the_journal_without_a_snapshot(tasks_path):
+    store = TaskStore(tasks_path)
+    store.load()
+    store.add_many([Task(f"Task {number}") for number in range(100)])
+    store.flush()
+    snapshot = tasks_path.read_bytes()
+
+    store.add(Task("One more"))
+    store.close()
+    assert tasks_path.read_bytes() == snapshot
+
+    store = TaskStore(tasks_path)
+    store.load()
+    assert _titles(store)[-1] == "One more"
+
+
+def test_ids_given_twice_are_changed_once(tasks_path):
+    store = TaskStore(tasks_path)
+    store.load()
+    first, second, third = Task("A"), Task("B"), Task("C")
+    for task in (first, second, third):
+        store.add(task)
+
+    assert len(store.move_tasks([first.id, first.id], True)) == 1
+    store.reorder([third.id, third.id], False, second.id)
+    store.delete_tasks([second.id, second.id])
+    store.close()
+
+    store = TaskStore(tasks_path)
+    store.load()
+    assert [task.title for task in store.pending] == ["C"]
+    assert [task.title for task in store.completed] == ["A"]
+
+
+def test_a_task_missing_from_its_list_is_a_task_error(tasks_path):
+    store = TaskStore(tasks_path)
+    store.load()
+    store.add(Task("A"))
+    with pytest.raises(TaskError):
+        store._index_of(store.pending, Task("B", position=store.pending[0].position))
+    with pytest.raises(TaskError):
+        store._index_of(store.pending, Task("C", position=100.0))
@@ -0,0 +1,53 @@
+import pytest
+
+import task_table
+from task import Task
+from task_codec import FORMATS
+from task_table import TaskTable
+
+ROWS = [
+    ("0000000000000001", "Buy milk", False, 1.0),
+    ("legacy-id", "Pay rent", True, 2.5),
+    ("not hex ✓ and long enough to overflow 64 bits", "Ünïcödé ✓ title", False, -1.0),
+    ("", "Empty id", True, 4.0),
+]
+
+
+def _table(rows) -> TaskTable:
+    table = TaskTable()
+    for task_id, title, is_completed, position in rows:
+        table.append(title, is_completed, task_id or None, position)
+    return table
+
+
+def test_rows_keep_any_id():
+    tasks = [Task(title, is_completed, task_id, position) for task_id, title, is_completed, position in ROWS]
+    for table in (_table(ROWS[:3]), TaskTable.from_tasks(tasks[:3])):
+        assert list(table.rows()) == ROWS[:3]
+        assert [table.task_id(index) for index in range(3)] == [row[0] for row in ROWS[:3]]
+        assert table[-1].id == ROWS[2][0] and table[-1].title == ROWS[2][1]
+    # an empty id is replaced, as Task does
+    assert len(_table(ROWS).task_id(3)) == 16
+    assert TaskTable.from_tasks(tasks).task_id(3) == tasks[3].id
+
+
+def test_completion_bits_toggle_across_bytes(monkeypatch):
+    monkeypatch.setattr(task_table, "ROWS_CHUNK_SIZE", 16)
+    table = TaskTable.from_tasks([Task(f"Task {number}", number % 3 == 0) for number in range(21)])
+    expected = [number % 3 == 0 for number in range(21)]
+    for index in (0, 7, 8, 15, 16, 20):
+        table.set_completed(index, not expected[index])
+        expected[index] = not expected[index]
+    table.set_completed(1, False)
+    assert [table.is_completed(index) for index in range(21)] == expected
+    assert [row[2] for row in table.rows()] == expected
+    assert [task.title for task in table] == [f"Task {number}" for number in range(21)]
+    with pytest.raises(IndexError):
+        table.set_completed(21, True)
+
+
+@pytest.mark.parametrize("file_format", FORMATS)
+def test_tables_are_dumped_and_loaded(tmp_path, file_format):
+    path = tmp_path / "tasks.json"
+    _table(ROWS[:3]).dump(path, file_format)
+    assert list(TaskTable.load(path).rows()) == ROWS[:3]
@@ -0,0 +1,106 @@
+"""
+Contains the app's colours and its stylesheet.
+The stylesheet is set once on the main window; widgets pick their rules by object name,
+and state changes (like an input error) only flip a dynamic property and re-polish.
+"""
+from PySide6 import QtGui, QtWidgets
+
+APP_STYLESHEET = """
+QWidget {
+background-color: #121212;
+font-family: 'Roboto';
+}
+
+QLabel#qlabel_title {
+font-size: 24px;
+font-weight: 700;
+color: #E0E0E0;
+}
+
+QPushButton#btn_add_task {
+background-color: #BB86FC;
+border-radius: 20px;
+font-size: 24px;
+text-align: center;
+color: #E0E0E0;
+}
+
+QLineEdit#le_input_field, QLineEdit#le_search_field, QComboBox#cb_status_filter {
+border-radius: 8px;
+padding: 8px;
+font-size: 16px;
+font-weight: 400;
+color: #E0E0E0;
+background-color: #1E1E1E;
+}
+QLineEdit#le_input_field[error="true"] {
+color: #757575;
+border: 1px solid #FF5252;
+}
+
+QFrame#qframe_list_headers {
+margin-top: 24px;
+}
+QFrame#qframe_list_headers QLabel {
+font-size: 18px;
+font-weight: 700;
+color: #E0E0E0;
+}
+
+QListView {
+background-color: #121212;
+border: 0px solid;
+}
+
+QFrame#qframe_no_tasks {
+background-color: rgba(255, 223, 186, 1);
+border-radius: 10px;
+}
+QLabel#qlabel_no_tasks {
+font-family: 'Quicksand';
+color: rgba(255, 87, 34, 1);
+font-size: 16px;
+}
+"""
+
+# Task cards are painted by TaskCardDelegate; colours are built once, not per paint
+CARD_TEXT = QtGui.QColor("#E0E0E0")
+CARD_BACKGROUND = {False: QtGui.QColor("#1E1E1E"), True: QtGui.QColor("#2A2A2A")}
+CARD_BORDER = {False: QtGui.QColor("#333333"), True: QtGui.QColor("#BB86FC")}
+
+
+def _button_style(text: str, background: str, hover: str, border: str, color: str) -> dict:
+    return {
+        "text": text,
+        "background": QtGui.QColor(background),
+        "hover": QtGui.QColor(hover),
+        "border": QtGui.QColor(border),
+        "color": QtGui.QColor(color),
+    }
+
+
+# (action, is_completed) -> style of the card button
+CARD_BUTTONS = {
+    ("done", False): _button_style("DONE", "#4CAF50", "#388E3C", "#66BB6A", "#FFFFFF"),
+    ("done", True): _button_style("UN-DONE", "transparent", "#2A2A2A", "#66BB6A", "#4CAF50"),
+    ("edit", False): _button_style("EDIT", "#FFC107", "#FFB300", "#FFCA28", "#FFFFFF"),
+    ("edit", True): _button_style("EDIT", "#FFC107", "#FFB300", "#FFCA28", "#FFFFFF"),
+    ("delete", False): _button_style("DELETE", "#D32F2F", "#B71C1C", "#FF5252", "#FFFFFF"),
+    ("delete", True): _button_style("DELETE", "#D32F2F", "#B71C1C", "#FF5252", "#FFFFFF"),
+}
+
+
+def set_style_state(widget: QtWidgets.QWidget, name: str, value: bool):
+    """
+    Changes a dynamic property used by APP_STYLESHEET selectors and re-polishes the widget
+    Args:
+        widget: widget to change
+        name: property name, e.g. "error"
+        value: new state
+
+    """
+    if widget.property(name) == value:
+        return
+    widget.setProperty(name, value)
+    widget.style().unpolish(widget)
+    widget.style().polish(widget)